@@ -1,11 +1,37 @@
 import argparse
-from database import functions as db_func
-from database import seed
-from database.connection import session
+import importlib
 import sys
+import time
+from config.settings import SERVIDOR_HOST, SERVIDOR_PORTA, SERVIDOR_TOKEN, SERVIDOR_TOKEN_ARQUIVO
 
-def main():
-    """Função principal da CLI."""
+# SQLAlchemy, driver e bcrypt são importados só pelo subcomando que precisa
+# deles, para que --help e erros de argumento respondam na hora.
+_tempo_importacao = 0.0
+
+
+def _importar(modulo):
+    """Importa um módulo sob demanda, somando o tempo gasto para o --timing."""
+    global _tempo_importacao
+    inicio = time.perf_counter()
+    carregado = importlib.import_module(modulo)
+    _tempo_importacao += time.perf_counter() - inicio
+    return carregado
+
+
+def _parse_periodo(texto):
+    """Converte 'AAAA' ou 'AAAA-MM' em (ano, mes_inicial, mes_final)."""
+    try:
+        if "-" in texto:
+            ano, mes = (int(parte) for parte in texto.split("-", 1))
+            if not 1 <= mes <= 12:
+                raise ValueError
+            return ano, mes, mes
+        return int(texto), 1, 12
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"período inválido '{texto}' (use AAAA ou AAAA-MM)")
+
+def criar_parser():
+    """Monta o parser da CLI com todos os subcomandos."""
     
 
     parser = argparse.ArgumentParser(
@@ -14,6 +40,18 @@ def main():
     )
     
 
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="Mostra o tempo gasto em importação, conexão e execução do comando."
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Mostra estatísticas por comando SQL (quantidade, p50/p95/p99) ao final."
+    )
+
     subparsers = parser.add_subparsers(dest="command", help="Comandos disponíveis")
 
 
@@ -21,6 +59,10 @@ def main():
         "initdb", 
         help="Inicializa o banco de dados (cria tabelas, procs, triggers e dados iniciais)."
     )
+    parser_initdb.add_argument("--dry-run", action="store_true",
+                               help="Só mostra os objetos do esquema que mudariam (e quanto tempo levou a verificação).")
+    parser_initdb.add_argument("--forcar", action="store_true",
+                               help="Recria procedures e triggers mesmo sem mudança na definição.")
     
 
     parser_adduser = subparsers.add_parser(
@@ -32,6 +74,31 @@ def main():
     parser_adduser.add_argument("senha", type=str, help="Senha de login.")
     
 
+    parser_addaccount = subparsers.add_parser(
+        "addaccount",
+        help="Cria uma nova conta para um usuário."
+    )
+    parser_addaccount.add_argument("id_usuario", type=int, help="ID do usuário dono da conta.")
+    parser_addaccount.add_argument("nome_conta", type=str, help="Nome da conta.")
+    parser_addaccount.add_argument("--tipo", type=str, default="corrente", help="Tipo da conta (padrão: corrente).")
+    parser_addaccount.add_argument("--saldo-inicial", type=float, default=0.0, help="Saldo inicial (padrão: 0).")
+
+
+    parser_addcategory = subparsers.add_parser(
+        "addcategory",
+        help="Cria uma nova categoria de transação."
+    )
+    parser_addcategory.add_argument("nome", type=str, help="Nome da categoria (único).")
+    parser_addcategory.add_argument("tipo", choices=["Receita", "Despesa"], help="Tipo da categoria.")
+
+
+    parser_addinvtype = subparsers.add_parser(
+        "addinvestmenttype",
+        help="Cria um novo tipo de investimento (ex.: Ações, Renda Fixa)."
+    )
+    parser_addinvtype.add_argument("nome", type=str, help="Nome do tipo de investimento (único).")
+
+
     parser_addtrans = subparsers.add_parser(
         "addtransaction", 
         help="Adiciona uma nova transação (receita ou despesa)."
@@ -45,6 +112,35 @@ def main():
         type=str, 
         help="Data da transação (Formato: AAAA-MM-DD). Opcional, usa hoje se omitido."
     )
+    parser_addtrans.add_argument(
+        "--ignorar-repetida",
+        action="store_true",
+        help="Não lança se já existe uma transação com a mesma conta, data, valor e descrição "
+             "(para clientes que repetem o comando ao reenviar)."
+    )
+
+
+    parser_transfer = subparsers.add_parser(
+        "transfer",
+        help="Transfere um valor entre duas contas (débito na origem e crédito no destino)."
+    )
+    parser_transfer.add_argument("id_conta_origem", type=int, help="ID da conta de origem.")
+    parser_transfer.add_argument("id_conta_destino", type=int, help="ID da conta de destino.")
+    parser_transfer.add_argument("valor", type=float, help="Valor transferido (positivo).")
+    parser_transfer.add_argument("descricao", type=str, help="Descrição da transferência.")
+    parser_transfer.add_argument("--data", type=str, help="Data da transferência (Formato: AAAA-MM-DD). Opcional, usa hoje.")
+    parser_transfer.add_argument("--chave", type=str, help="Chave de idempotência: repetir o comando com a mesma chave não lança de novo.")
+
+
+    parser_transferbatch = subparsers.add_parser(
+        "transferbatch",
+        help="Registra em lotes as transferências de um CSV (origem, destino, valor, descricao[, data])."
+    )
+    parser_transferbatch.add_argument("arquivo", type=str, help="Caminho do arquivo CSV.")
+    parser_transferbatch.add_argument("--chave", type=str, help="Chave de idempotência do arquivo: reenviar só grava os lotes que faltam.")
+    parser_transferbatch.add_argument("-l", "--lote", type=int, help="Transferências gravadas por transação (padrão em config/settings.py).")
+    parser_transferbatch.add_argument("--delimitador", type=str, default=",", help="Delimitador do CSV (padrão: ',').")
+    parser_transferbatch.add_argument("--encoding", type=str, default="utf-8", help="Codificação do arquivo (padrão: utf-8).")
 
 
     parser_getbalance = subparsers.add_parser(
@@ -52,48 +148,715 @@ def main():
         help="Calcula e exibe o balanço total de um usuário."
     )
     parser_getbalance.add_argument("id_usuario", type=int, help="ID do usuário para calcular o balanço.")
+    parser_getbalance.add_argument("--em", type=str, help="Saldo ao fim deste dia (Formato: AAAA-MM-DD). Opcional.")
 
-    if len(sys.argv) == 1:
-        parser.print_help(sys.stderr)
-        return
 
-    args = parser.parse_args()
+    parser_rebuild = subparsers.add_parser(
+        "rebuildbalances",
+        help="Recalcula saldos das contas, resumos mensais e checkpoints a partir das transações e relata divergências."
+    )
+    parser_rebuild.add_argument(
+        "--verificar",
+        action="store_true",
+        help="Apenas relata as divergências, sem corrigir."
+    )
+
+    parser_dedupe = subparsers.add_parser(
+        "dedupe",
+        help="Encontra transações duplicadas (mesma conta, data, valor e descrição) pelo índice de impressão digital."
+    )
+    parser_dedupe.add_argument(
+        "--mesclar",
+        action="store_true",
+        help="Mantém a transação mais antiga de cada grupo (com as tags de todas) e apaga as demais."
+    )
+
+    parser_archive = subparsers.add_parser(
+        "archive",
+        help="Move as transações dos anos fechados para tabelas de arquivo por ano (transacoes_<ano>)."
+    )
+    parser_archive.add_argument(
+        "--ate", type=int,
+        help="Último ano a arquivar (padrão: o mais recente fora dos ARQUIVO_ANOS_ABERTOS anos abertos)."
+    )
+
+
+    parser_history = subparsers.add_parser(
+        "balancehistory",
+        help="Mostra a evolução do saldo de uma conta ou de um usuário, dia a dia ou mês a mês."
+    )
+    alvo_history = parser_history.add_mutually_exclusive_group(required=True)
+    alvo_history.add_argument("-c", "--conta", type=int, help="ID da conta.")
+    alvo_history.add_argument("-u", "--usuario", type=int, help="ID do usuário (soma de todas as contas).")
+    parser_history.add_argument("--de", type=str, help="Data inicial (Formato: AAAA-MM-DD). Opcional.")
+    parser_history.add_argument("--ate", type=str, help="Data final, inclusiva (Formato: AAAA-MM-DD). Opcional, usa hoje.")
+    parser_history.add_argument("--mensal", action="store_true", help="Um ponto por fim de mês em vez de por dia.")
+
+
+    parser_list = subparsers.add_parser(
+        "listtransactions",
+        help="Lista as transações de uma conta em páginas, da mais recente para a mais antiga."
+    )
+    parser_list.add_argument("id_conta", type=int, help="ID da conta.")
+    parser_list.add_argument("--cursor", type=str, help="Cursor da próxima página, exibido ao fim da página anterior.")
+    parser_list.add_argument("-n", "--limite", type=int, default=50, help="Transações por página (padrão: 50).")
+    parser_list.add_argument("--categoria", type=int, help="Filtra pelo ID da categoria.")
+    parser_list.add_argument("--tag", type=str, help="Filtra pelo nome da tag.")
+    parser_list.add_argument("--de", type=str, help="Data inicial (Formato: AAAA-MM-DD).")
+    parser_list.add_argument("--ate", type=str, help="Data final, inclusiva (Formato: AAAA-MM-DD).")
+
+    parser_search = subparsers.add_parser(
+        "search",
+        help="Busca transações pelas palavras da descrição (índice de texto), com filtros e resultados por relevância."
+    )
+    parser_search.add_argument("termos", type=str, nargs="+", help="Palavras buscadas (todas precisam aparecer; aceita prefixos).")
+    parser_search.add_argument("-u", "--usuario", type=int, help="Só as contas deste usuário.")
+    parser_search.add_argument("-c", "--conta", type=int, help="Só esta conta.")
+    parser_search.add_argument("--tag", type=str, action="append", help="Filtra pelo nome da tag (repita para exigir várias).")
+    parser_search.add_argument("--de", type=str, help="Data inicial (Formato: AAAA-MM-DD).")
+    parser_search.add_argument("--ate", type=str, help="Data final, inclusiva (Formato: AAAA-MM-DD).")
+    parser_search.add_argument("-p", "--pagina", type=int, default=1, help="Página de resultados (padrão: 1).")
+    parser_search.add_argument("-n", "--por-pagina", type=int, default=20, help="Resultados por página (padrão: 20).")
+
+
+    parser_export = subparsers.add_parser(
+        "exporttransactions",
+        help="Exporta transações para CSV ou JSONL em streaming."
+    )
+    parser_export.add_argument("arquivo", type=str, help="Caminho do arquivo de saída (.gz compacta).")
+    parser_export.add_argument("-f", "--formato", choices=["csv", "jsonl"], default="csv", help="Formato de saída (padrão: csv).")
+    parser_export.add_argument("-u", "--usuario", type=int, help="Exporta só as contas deste usuário.")
+    parser_export.add_argument("-c", "--conta", type=int, help="Exporta só esta conta.")
+    parser_export.add_argument("--de", type=str, help="Data inicial (Formato: AAAA-MM-DD).")
+    parser_export.add_argument("--ate", type=str, help="Data final, inclusiva (Formato: AAAA-MM-DD).")
+    parser_export.add_argument("-z", "--gzip", action="store_true", help="Compacta a saída com gzip.")
+
+
+    parser_trade = subparsers.add_parser(
+        "trade",
+        help="Registra uma compra ou venda de ativo e atualiza a posição e o preço médio da conta."
+    )
+    parser_trade.add_argument("id_conta", type=int, help="ID da conta da posição.")
+    parser_trade.add_argument("simbolo", type=str, help="Símbolo do ativo (ex.: PETR4).")
+    parser_trade.add_argument("operacao", choices=["compra", "venda"], help="Tipo da operação.")
+    parser_trade.add_argument("quantidade", type=float, help="Quantidade negociada.")
+    parser_trade.add_argument("preco", type=float, help="Preço unitário.")
+    parser_trade.add_argument("--tipo", type=str, help="Tipo de investimento (obrigatório na primeira compra do ativo).")
+    parser_trade.add_argument("--data", type=str, help="Data da operação (Formato: AAAA-MM-DD). Opcional, usa hoje.")
+
+    parser_prices = subparsers.add_parser(
+        "importprices",
+        help="Importa cotações de ativos de um CSV local (colunas simbolo, data, preco)."
+    )
+    parser_prices.add_argument("arquivo", type=str, help="Caminho do CSV de cotações.")
+    parser_prices.add_argument("--lote", type=int, help="Linhas por transação (padrão em config/settings.py).")
+    parser_prices.add_argument("--delimitador", type=str, default=",", help="Delimitador do CSV (padrão: ',').")
+    parser_prices.add_argument("--encoding", type=str, default="utf-8", help="Codificação do arquivo (padrão: utf-8).")
+
+    parser_portfolio = subparsers.add_parser(
+        "portfolio",
+        help="Avalia as posições de investimento a preço de mercado, por conta, usuário, tipo ou ativo."
+    )
+    parser_portfolio.add_argument("-u", "--usuario", type=int, help="Só as posições deste usuário.")
+    parser_portfolio.add_argument("-c", "--conta", type=int, help="Só as posições desta conta.")
+    parser_portfolio.add_argument("--por", choices=["conta", "usuario", "tipo", "ativo"], default="conta", help="Agrupamento (padrão: conta).")
+    parser_portfolio.add_argument("--em", type=str, help="Avalia com as cotações até este dia (Formato: AAAA-MM-DD). Opcional, usa hoje.")
+
+
+    parser_addrecurring = subparsers.add_parser(
+        "addrecurring",
+        help="Cria uma transação recorrente (aluguel, salário, assinaturas), lançada pelo 'runschedule'."
+    )
+    parser_addrecurring.add_argument("id_conta", type=int, help="ID da conta.")
+    parser_addrecurring.add_argument("id_categoria", type=int, help="ID da categoria.")
+    parser_addrecurring.add_argument("valor", type=float, help="Valor de cada ocorrência.")
+    parser_addrecurring.add_argument("descricao", type=str, help="Descrição das transações.")
+    parser_addrecurring.add_argument("frequencia", choices=["diaria", "semanal", "mensal", "anual"], help="Frequência.")
+    parser_addrecurring.add_argument("--intervalo", type=int, default=1, help="A cada N dias/semanas/meses/anos (padrão: 1).")
+    parser_addrecurring.add_argument("--inicio", type=str, help="Primeira ocorrência (Formato: AAAA-MM-DD). Opcional, usa hoje.")
+    parser_addrecurring.add_argument("--fim", type=str, help="Última data possível (Formato: AAAA-MM-DD). Opcional.")
+
+    parser_runschedule = subparsers.add_parser(
+        "runschedule",
+        help="Lança em lote todas as ocorrências vencidas das transações recorrentes, sem repetir as já lançadas."
+    )
+    parser_runschedule.add_argument("--ate", type=str, help="Lança as ocorrências até este dia (Formato: AAAA-MM-DD). Opcional, usa hoje.")
+    parser_runschedule.add_argument("--lote", type=int, help="Regras por transação (padrão em config/settings.py).")
+
+
+    parser_addgoal = subparsers.add_parser(
+        "addgoal",
+        help="Cria uma meta de economia para um usuário."
+    )
+    parser_addgoal.add_argument("id_usuario", type=int, help="ID do usuário.")
+    parser_addgoal.add_argument("nome", type=str, help="Nome da meta.")
+    parser_addgoal.add_argument("valor_objetivo", type=float, help="Valor a alcançar.")
+    parser_addgoal.add_argument("--limite", type=str, help="Prazo da meta (Formato: AAAA-MM-DD). Opcional.")
+
+    parser_goalrule = subparsers.add_parser(
+        "addgoalrule",
+        help="Cria uma regra de aporte mensal para uma meta (valor fixo ou percentual da receita de uma categoria)."
+    )
+    parser_goalrule.add_argument("id_meta", type=int, help="ID da meta.")
+    parser_goalrule.add_argument("tipo", choices=["fixo", "percentual"], help="Tipo da regra.")
+    parser_goalrule.add_argument("valor", type=float, help="Valor em reais (fixo) ou percentual (0-100).")
+    parser_goalrule.add_argument("--categoria", type=int, help="ID da categoria de Receita (regra percentual).")
+
+    parser_applygoals = subparsers.add_parser(
+        "applygoals",
+        help="Aplica os aportes mensais de todas as metas, em lote e sem repetir meses já aplicados."
+    )
+    parser_applygoals.add_argument("--mes", type=_parse_periodo, help="Mês dos aportes (Formato: AAAA-MM). Opcional, usa o mês anterior.")
+    parser_applygoals.add_argument("--lote", type=int, help="Regras por transação (padrão em config/settings.py).")
 
+    parser_goals = subparsers.add_parser(
+        "goals",
+        help="Mostra o progresso das metas e a data prevista de conclusão pelo ritmo dos aportes."
+    )
+    parser_goals.add_argument("-u", "--usuario", type=int, help="Só as metas deste usuário.")
+    parser_goals.add_argument("--meses", type=int, help="Meses fechados usados no ritmo (padrão em config/settings.py).")
+
+
+    parser_statements = subparsers.add_parser(
+        "statements",
+        help="Gera o extrato mensal de todos os usuários, um arquivo por usuário, em paralelo."
+    )
+    parser_statements.add_argument("--mes", type=_parse_periodo, help="Mês do extrato (Formato: AAAA-MM). Opcional, usa o mês anterior.")
+    parser_statements.add_argument("-d", "--diretorio", type=str, default="extratos", help="Diretório de saída (padrão: extratos).")
+    parser_statements.add_argument("-f", "--formato", choices=["txt", "json"], default="txt", help="Formato dos arquivos (padrão: txt).")
+    parser_statements.add_argument("-w", "--trabalhadores", type=int, help="Threads trabalhadoras. Opcional, usa EXTRATO_TRABALHADORES.")
+    parser_statements.add_argument("--faixa", type=int, help="Usuários por faixa de IDs. Opcional, usa EXTRATO_USUARIOS_POR_FAIXA.")
+
+
+    parser_budget = subparsers.add_parser(
+        "budgetreport",
+        help="Compara orçamento planejado e gastos realizados por categoria."
+    )
+    parser_budget.add_argument("id_usuario", type=int, help="ID do usuário.")
+    parser_budget.add_argument("periodo", type=_parse_periodo, help="Período inicial (Formato: AAAA ou AAAA-MM).")
+    parser_budget.add_argument(
+        "--ate",
+        type=_parse_periodo,
+        help="Período final (Formato: AAAA ou AAAA-MM). Opcional, usa o período inicial se omitido."
+    )
+
+
+    parser_explain = subparsers.add_parser(
+        "explain",
+        help="Mostra o plano de execução (EXPLAIN) de cada relatório embutido."
+    )
+    parser_explain.add_argument("id_usuario", type=int, help="ID do usuário usado nos parâmetros das consultas.")
+    parser_explain.add_argument("-c", "--conta", type=int, help="ID da conta. Opcional, usa a primeira conta do usuário.")
+    parser_explain.add_argument("--categoria", type=int, default=1, help="ID da categoria (padrão: 1).")
+    parser_explain.add_argument(
+        "-p", "--periodo",
+        type=_parse_periodo,
+        help="Mês analisado (Formato: AAAA-MM). Opcional, usa o mês atual se omitido."
+    )
+
+
+    parser_import = subparsers.add_parser(
+        "importtransactions",
+        help="Importa transações em lote a partir de um arquivo CSV ou OFX."
+    )
+    parser_import.add_argument("arquivo", type=str, help="Caminho do arquivo CSV ou OFX.")
+    parser_import.add_argument(
+        "-f", "--formato",
+        choices=["csv", "ofx"],
+        help="Formato do arquivo. Opcional, deduzido pela extensão se omitido."
+    )
+    parser_import.add_argument("-c", "--conta", type=int, help="ID da conta usada quando o arquivo não informa.")
+    parser_import.add_argument("--categoria", type=int, help="ID da categoria usada quando o arquivo não informa.")
+    parser_import.add_argument("-l", "--lote", type=int, help="Linhas gravadas por transação (padrão em config/settings.py).")
+    parser_import.add_argument("--delimitador", type=str, default=",", help="Delimitador do CSV (padrão: ',').")
+    parser_import.add_argument("--encoding", type=str, default="utf-8", help="Codificação do arquivo (padrão: utf-8).")
+    parser_import.add_argument("--permitir-duplicadas", action="store_true",
+                               help="Grava também as linhas que já estão no banco (mesma conta, data, valor e descrição).")
+
+    parser_importusers = subparsers.add_parser(
+        "importusers",
+        help="Cadastra usuários em lote a partir de um CSV (colunas nome, email, senha)."
+    )
+    parser_importusers.add_argument("arquivo", type=str, help="Caminho do arquivo CSV.")
+    parser_importusers.add_argument("-l", "--lote", type=int, help="Usuários gravados por transação (padrão em config/settings.py).")
+    parser_importusers.add_argument("-p", "--processos", type=int, help="Processos usados no bcrypt. Opcional, usa todos os núcleos se omitido.")
+    parser_importusers.add_argument("--delimitador", type=str, default=",", help="Delimitador do CSV (padrão: ',').")
+    parser_importusers.add_argument("--encoding", type=str, default="utf-8", help="Codificação do arquivo (padrão: utf-8).")
+
+    parser_bench = subparsers.add_parser(
+        "benchmark",
+        help="Gera dados sintéticos e mede latência e vazão das operações principais."
+    )
+    parser_bench.add_argument("--usuarios", type=int, default=100, help="Usuários sintéticos (padrão: 100).")
+    parser_bench.add_argument("--contas", type=int, default=3, help="Contas por usuário (padrão: 3).")
+    parser_bench.add_argument("--transacoes", type=int, default=100000, help="Transações sintéticas (padrão: 100000).")
+    parser_bench.add_argument("--anos", type=int, default=3, help="Anos de histórico gerados (padrão: 3).")
+    parser_bench.add_argument("-r", "--repeticoes", type=int, default=200, help="Repetições por operação (padrão: 200).")
+    parser_bench.add_argument("--sem-gerar", action="store_true", help="Reaproveita os dados sintéticos já existentes.")
+    parser_bench.add_argument("-o", "--saida", type=str, help="Salva os resultados neste arquivo JSON.")
+    parser_bench.add_argument("--comparar", type=str, help="JSON de uma execução anterior para comparar.")
+    parser_bench.add_argument("--semente", type=int, default=42, help="Semente dos dados aleatórios (padrão: 42).")
+
+    parser_analytics = subparsers.add_parser(
+        "analytics",
+        help="Relatórios em memória (NumPy) sobre todas as transações de um usuário."
+    )
+    parser_analytics.add_argument("id_usuario", type=int, help="ID do usuário.")
+    parser_analytics.add_argument(
+        "--por",
+        choices=["mes", "categoria", "conta", "tag", "saldo"],
+        default="categoria",
+        help="Agrupamento do relatório (padrão: categoria)."
+    )
+    parser_analytics.add_argument(
+        "-p", "--periodo",
+        type=_parse_periodo,
+        help="Filtra pelo ano ou mês (Formato: AAAA ou AAAA-MM). Opcional."
+    )
+    parser_analytics.add_argument("--top", type=int, default=0, help="Mostra as N maiores despesas do período.")
+    parser_analytics.add_argument("--conferir", action="store_true", help="Confere os totais com as consultas SQL.")
+
+    parser_batch = subparsers.add_parser(
+        "batch",
+        help="Executa muitos comandos (adduser, addaccount, addcategory, addtransaction, trade) com commits agrupados."
+    )
+    parser_batch.add_argument("arquivo", type=str, nargs="?", default="-",
+                              help="Arquivo com um comando por linha, na sintaxe da CLI ou em JSON. Opcional, usa a entrada padrão.")
+    parser_batch.add_argument("-n", "--grupo", type=int, help="Operações por commit (padrão em config/settings.py).")
+    parser_batch.add_argument("-t", "--intervalo-ms", type=int, help="Tempo máximo de um grupo antes do commit (padrão em config/settings.py).")
+    parser_batch.add_argument("-v", "--detalhado", action="store_true", help="Mostra a saída de cada comando.")
+
+    parser_refresh = subparsers.add_parser(
+        "refreshcache",
+        help="Relê do banco o cache de categorias e tipos de investimento (útil com 'serve')."
+    )
+
+    parser_stats = subparsers.add_parser(
+        "stats",
+        help="Mostra as estatísticas por comando SQL deste processo (útil com 'serve --profile')."
+    )
+    parser_stats.add_argument("-n", "--limite", type=int, default=20, help="Quantidade de comandos exibidos (padrão: 20).")
+    parser_stats.add_argument("--zerar", action="store_true", help="Zera as estatísticas depois de exibir.")
+
+    parser_serve = subparsers.add_parser(
+        "serve",
+        help="Mantém o banco conectado e atende comandos enviados pelo cliente.py."
+    )
+    parser_serve.add_argument("--host", type=str, default=SERVIDOR_HOST,
+                              help=f"Endereço de escuta (padrão: {SERVIDOR_HOST}; fora do loopback, exige o token "
+                                   "em JULIUS_SERVIDOR_TOKEN).")
+    parser_serve.add_argument("--porta", type=int, default=SERVIDOR_PORTA, help=f"Porta de escuta (padrão: {SERVIDOR_PORTA}).")
+
+    return parser
+
+
+def executar(args, parser):
+    """Executa o subcomando já interpretado em `args`."""
+    global _tempo_importacao
+    _tempo_importacao = 0.0
+    inicio = time.perf_counter()
+
+    if args.profile:
+        _importar("database.instrumentacao").ativar_perfil()
  
     try:
         if args.command == "initdb":
             print("Executando comando 'initdb'...")
-            seed.seed_database()
+            seed = _importar("database.seed")
+            seed.seed_database(dry_run=args.dry_run, forcar=args.forcar)
             
         elif args.command == "adduser":
             print(f"Executando 'adduser' para: {args.email}...")
+            db_func = _importar("database.functions")
             db_func.criar_usuario(args.nome, args.email, args.senha)
             
+        elif args.command == "addaccount":
+            print(f"Executando 'addaccount' para usuário {args.id_usuario}...")
+            db_func = _importar("database.functions")
+            db_func.criar_conta(args.id_usuario, args.nome_conta, args.tipo, args.saldo_inicial)
+            
+        elif args.command == "addcategory":
+            print(f"Executando 'addcategory' para: {args.nome}...")
+            db_func = _importar("database.functions")
+            db_func.criar_categoria(args.nome, args.tipo)
+            
+        elif args.command == "addinvestmenttype":
+            print(f"Executando 'addinvestmenttype' para: {args.nome}...")
+            db_func = _importar("database.functions")
+            db_func.criar_tipo_investimento(args.nome)
+
         elif args.command == "addtransaction":
             print(f"Executando 'addtransaction' de R${args.valor}...")
+            db_func = _importar("database.functions")
             db_func.adicionar_transacao(
                 id_conta=args.id_conta,
                 id_categoria=args.id_categoria,
                 valor=args.valor,
                 descricao=args.descricao,
-                data_str=args.data 
+                data_str=args.data,
+                ignorar_repetida=args.ignorar_repetida
+            )
+            
+        elif args.command == "transfer":
+            print(f"Executando 'transfer' de R${args.valor} da conta {args.id_conta_origem} "
+                  f"para a conta {args.id_conta_destino}...")
+            transferencias = _importar("database.transferencias")
+            transferencias.registrar_transferencia(
+                id_conta_origem=args.id_conta_origem,
+                id_conta_destino=args.id_conta_destino,
+                valor=args.valor,
+                descricao=args.descricao,
+                data_str=args.data,
+                chave_idempotencia=args.chave
+            )
+
+        elif args.command == "transferbatch":
+            print(f"Executando 'transferbatch' de: {args.arquivo}...")
+            transferencias = _importar("database.transferencias")
+            transferencias.importar_transferencias(
+                caminho=args.arquivo,
+                chave_idempotencia=args.chave,
+                tamanho_lote=args.lote,
+                delimitador=args.delimitador,
+                encoding=args.encoding
             )
             
         elif args.command == "getbalance":
             print(f"Executando 'getbalance' para usuário {args.id_usuario}...")
-            db_func.calcular_balanco_usuario(args.id_usuario)
+            if args.em:
+                historico = _importar("database.historico")
+                historico.saldo_na_data(args.em, id_usuario=args.id_usuario)
+            else:
+                db_func = _importar("database.functions")
+                db_func.calcular_balanco_usuario(args.id_usuario)
+
+        elif args.command == "rebuildbalances":
+            print("Executando 'rebuildbalances'...")
+            db_func = _importar("database.functions")
+            db_func.recalcular_saldos(apenas_verificar=args.verificar)
+            db_func.recalcular_resumos(apenas_verificar=args.verificar)
+            historico = _importar("database.historico")
+            historico.recalcular_checkpoints(apenas_verificar=args.verificar)
+
+        elif args.command == "dedupe":
+            print("Executando 'dedupe'...")
+            duplicatas = _importar("database.duplicatas")
+            duplicatas.deduplicar(mesclar=args.mesclar)
+
+        elif args.command == "archive":
+            print("Executando 'archive'...")
+            arquivo = _importar("database.arquivo")
+            arquivo.arquivar(args.ate)
+
+        elif args.command == "balancehistory":
+            print("Executando 'balancehistory'...")
+            historico = _importar("database.historico")
+            historico.historico_saldo(
+                id_conta=args.conta,
+                id_usuario=args.usuario,
+                data_inicio=args.de,
+                data_fim=args.ate,
+                mensal=args.mensal
+            )
+
+        elif args.command == "search":
+            termos = " ".join(args.termos)
+            print(f"Executando 'search' de '{termos}'...")
+            busca = _importar("database.busca")
+            busca.buscar_transacoes(
+                termos,
+                id_usuario=args.usuario,
+                id_conta=args.conta,
+                tags=args.tag,
+                data_inicio=args.de,
+                data_fim=args.ate,
+                pagina=args.pagina,
+                por_pagina=args.por_pagina
+            )
+
+        elif args.command == "listtransactions":
+            print(f"Executando 'listtransactions' para conta {args.id_conta}...")
+            db_func = _importar("database.functions")
+            db_func.listar_transacoes(
+                id_conta=args.id_conta,
+                cursor=args.cursor,
+                limite=args.limite,
+                id_categoria=args.categoria,
+                tag=args.tag,
+                data_inicio=args.de,
+                data_fim=args.ate
+            )
+
+        elif args.command == "exporttransactions":
+            print(f"Executando 'exporttransactions' para: {args.arquivo}...")
+            exportacao = _importar("database.exportacao")
+            exportacao.exportar_transacoes(
+                caminho=args.arquivo,
+                formato=args.formato,
+                id_usuario=args.usuario,
+                id_conta=args.conta,
+                data_inicio=args.de,
+                data_fim=args.ate,
+                compactar=args.gzip
+            )
+
+        elif args.command == "trade":
+            print(f"Executando 'trade' de {args.simbolo} na conta {args.id_conta}...")
+            carteira = _importar("database.carteira")
+            carteira.registrar_operacao(
+                id_conta=args.id_conta,
+                simbolo=args.simbolo,
+                tipo=args.operacao,
+                quantidade=args.quantidade,
+                preco=args.preco,
+                tipo_investimento=args.tipo,
+                data_str=args.data
+            )
+
+        elif args.command == "importprices":
+            print(f"Executando 'importprices' de: {args.arquivo}...")
+            carteira = _importar("database.carteira")
+            carteira.importar_precos(
+                caminho=args.arquivo,
+                tamanho_lote=args.lote,
+                delimitador=args.delimitador,
+                encoding=args.encoding
+            )
+
+        elif args.command == "portfolio":
+            print("Executando 'portfolio'...")
+            carteira = _importar("database.carteira")
+            carteira.carteira(
+                id_usuario=args.usuario,
+                id_conta=args.conta,
+                por=args.por,
+                data_str=args.em
+            )
+
+        elif args.command == "addrecurring":
+            print(f"Executando 'addrecurring' de R${args.valor}...")
+            recorrentes = _importar("database.recorrentes")
+            recorrentes.criar_recorrente(
+                id_conta=args.id_conta,
+                id_categoria=args.id_categoria,
+                valor=args.valor,
+                descricao=args.descricao,
+                frequencia=args.frequencia,
+                intervalo=args.intervalo,
+                data_inicio_str=args.inicio,
+                data_fim_str=args.fim
+            )
+
+        elif args.command == "runschedule":
+            print("Executando 'runschedule'...")
+            recorrentes = _importar("database.recorrentes")
+            recorrentes.executar_agenda(data_str=args.ate, tamanho_lote=args.lote)
+
+        elif args.command == "addgoal":
+            print(f"Executando 'addgoal' para usuário {args.id_usuario}...")
+            metas = _importar("database.metas")
+            metas.criar_meta(args.id_usuario, args.nome, args.valor_objetivo, args.limite)
+
+        elif args.command == "addgoalrule":
+            print(f"Executando 'addgoalrule' para a meta {args.id_meta}...")
+            metas = _importar("database.metas")
+            metas.criar_regra(args.id_meta, args.tipo, args.valor, args.categoria)
+
+        elif args.command == "applygoals":
+            print("Executando 'applygoals'...")
+            metas = _importar("database.metas")
+            if args.mes and args.mes[1] != args.mes[2]:
+                print("Erro: informe o mês dos aportes (Formato: AAAA-MM).")
+            else:
+                ano, mes, _ = args.mes or (None, None, None)
+                metas.aplicar_aportes(ano=ano, mes=mes, tamanho_lote=args.lote)
+
+        elif args.command == "goals":
+            print("Executando 'goals'...")
+            metas = _importar("database.metas")
+            metas.progresso_metas(id_usuario=args.usuario, meses=args.meses)
+
+        elif args.command == "statements":
+            print(f"Executando 'statements' em: {args.diretorio}...")
+            extratos = _importar("database.extratos")
+            if args.mes and args.mes[1] != args.mes[2]:
+                print("Erro: informe o mês do extrato (Formato: AAAA-MM).")
+            else:
+                ano, mes, _ = args.mes or (None, None, None)
+                extratos.gerar_extratos(
+                    ano=ano,
+                    mes=mes,
+                    diretorio=args.diretorio,
+                    trabalhadores=args.trabalhadores,
+                    usuarios_por_faixa=args.faixa,
+                    formato=args.formato
+                )
+
+        elif args.command == "budgetreport":
+            print(f"Executando 'budgetreport' para usuário {args.id_usuario}...")
+            db_func = _importar("database.functions")
+            ano_inicio, mes_inicio, _ = args.periodo
+            ano_fim, _, mes_fim = args.ate or args.periodo
+            db_func.relatorio_orcamento(args.id_usuario, ano_inicio, mes_inicio, ano_fim, mes_fim)
+
+        elif args.command == "explain":
+            print(f"Executando 'explain' para usuário {args.id_usuario}...")
+            diagnostico = _importar("database.diagnostico")
+            ano, mes, _ = args.periodo or (None, None, None)
+            diagnostico.explicar_relatorios(
+                id_usuario=args.id_usuario,
+                id_conta=args.conta,
+                id_categoria=args.categoria,
+                ano=ano,
+                mes=mes
+            )
+
+        elif args.command == "importtransactions":
+            print(f"Executando 'importtransactions' de: {args.arquivo}...")
+            importacao = _importar("database.importacao")
+            importacao.importar_transacoes(
+                caminho=args.arquivo,
+                formato=args.formato,
+                id_conta=args.conta,
+                id_categoria=args.categoria,
+                tamanho_lote=args.lote,
+                delimitador=args.delimitador,
+                encoding=args.encoding,
+                permitir_duplicadas=args.permitir_duplicadas
+            )
+
+
+        elif args.command == "importusers":
+            print(f"Executando 'importusers' de: {args.arquivo}...")
+            importacao = _importar("database.importacao")
+            importacao.importar_usuarios(
+                caminho=args.arquivo,
+                tamanho_lote=args.lote,
+                processos=args.processos,
+                delimitador=args.delimitador,
+                encoding=args.encoding
+            )
+
+
+        elif args.command == "benchmark":
+            print("Executando 'benchmark'...")
+            benchmark = _importar("database.benchmark")
+            benchmark.executar_benchmark(
+                usuarios=args.usuarios,
+                contas_por_usuario=args.contas,
+                transacoes=args.transacoes,
+                anos=args.anos,
+                repeticoes=args.repeticoes,
+                gerar=not args.sem_gerar,
+                caminho_saida=args.saida,
+                caminho_comparacao=args.comparar,
+                semente=args.semente
+            )
+
+
+        elif args.command == "analytics":
+            print(f"Executando 'analytics' para usuário {args.id_usuario}...")
+            analitico = _importar("database.analitico")
+            ano, mes_inicio, mes_fim = args.periodo or (None, None, None)
+            analitico.relatorio_analitico(
+                id_usuario=args.id_usuario,
+                agrupamento=args.por,
+                ano=ano,
+                mes=mes_inicio if mes_inicio == mes_fim else None,
+                top=args.top,
+                verificar=args.conferir
+            )
+
+
+        elif args.command == "batch":
+            print(f"Executando 'batch' de: {'entrada padrão' if args.arquivo == '-' else args.arquivo}...")
+            lote = _importar("database.lote")
+            lote.executar_lote(
+                caminho=args.arquivo,
+                parser=parser,
+                tamanho_grupo=args.grupo,
+                intervalo_ms=args.intervalo_ms,
+                detalhado=args.detalhado
+            )
+
+
+        elif args.command == "refreshcache":
+            print("Executando 'refreshcache'...")
+            referencias = _importar("database.referencias")
+            referencias.invalidar()
+            dados = referencias.obter()
+            print(f"Cache de referência recarregado (versão {dados.versao}): {len(dados.categorias)} categoria(s), "
+                  f"{len(dados.tipos_investimento)} tipo(s) de investimento.")
+
+
+        elif args.command == "stats":
+            instrumentacao = _importar("database.instrumentacao")
+            instrumentacao.imprimir_estatisticas(args.limite)
+            if args.zerar:
+                instrumentacao.zerar_estatisticas()
             
         else:
             parser.print_help(sys.stderr)
             
     except Exception as e:
         print(f"\nOcorreu um erro durante a execução: {e}")
-        session.rollback() 
+        if "database.connection" in sys.modules:
+            sys.modules["database.connection"].session.rollback() 
     finally:
 
-        db_func.fechar_sessao()
-        print("Sessão do banco fechada.")
+        # Só há sessão para fechar se o comando chegou a carregar o banco
+        if "database.connection" in sys.modules:
+            sys.modules["database.connection"].session.remove()
+            print("Sessão do banco fechada.")
+
+        if args.profile:
+            sys.modules["database.instrumentacao"].imprimir_estatisticas()
+
+        if args.timing:
+            _mostrar_tempos(time.perf_counter() - inicio)
+
+
+def _mostrar_tempos(total):
+    """Imprime em stderr as fases do comando (opção --timing)."""
+    conexao = 0.0
+    if "database.connection" in sys.modules:
+        estatisticas = sys.modules["database.connection"].ESTATISTICAS_CONEXAO
+        conexao = estatisticas["engine"] + estatisticas["conexao"]
+        estatisticas["engine"] = estatisticas["conexao"] = 0.0
+    execucao = max(total - _tempo_importacao - conexao, 0.0)
+    print(f"[timing] importação: {_tempo_importacao * 1000:.1f} ms | "
+          f"conexão: {conexao * 1000:.1f} ms | execução: {execucao * 1000:.1f} ms | "
+          f"total: {total * 1000:.1f} ms", file=sys.stderr)
+
+
+def executar_argv(argv):
+    """Interpreta e executa uma linha de comando (usado pelo modo servidor)."""
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        print("O comando 'serve' não pode ser enviado ao servidor.")
+        return
+    executar(args, parser)
+
+
+def main(argv=None):
+    """Função principal da CLI."""
+    parser = criar_parser()
+    argv = sys.argv[1:] if argv is None else argv
+
+    if not argv:
+        parser.print_help(sys.stderr)
+        return
+
+    args = parser.parse_args(argv)
 
+    if args.command == "serve":
+        if args.profile:
+            _importar("database.instrumentacao").ativar_perfil()
+        servidor = _importar("servidor")
+        servidor.servir(args.host, args.porta, executar_argv, SERVIDOR_TOKEN, SERVIDOR_TOKEN_ARQUIVO)
+    else:
+        executar(args, parser)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+# cliente.py
+#
+# Cliente leve do modo servidor: envia o comando para um 'app.py serve' já
+# em execução em vez de carregar SQLAlchemy e conectar ao banco a cada vez.
+# Uso: python cliente.py getbalance 1
+
+import json
+import sys
+import urllib.error
+import urllib.request
+from config.settings import SERVIDOR_HOST, SERVIDOR_PORTA, SERVIDOR_TOKEN, SERVIDOR_TOKEN_ARQUIVO
+
+
+def ler_token(caminho=SERVIDOR_TOKEN_ARQUIVO):
+    """JULIUS_SERVIDOR_TOKEN ou, sem ele, o token que o 'serve' gravou ao iniciar."""
+    if SERVIDOR_TOKEN:
+        return SERVIDOR_TOKEN
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return arquivo.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def enviar_comando(argv, host=SERVIDOR_HOST, porta=SERVIDOR_PORTA, token=None):
+    """Envia os argumentos ao servidor e devolve (codigo, saida)."""
+    if token is None:
+        token = ler_token()
+    corpo = json.dumps({"argv": argv}).encode("utf-8")
+    cabecalhos = {"Content-Type": "application/json"}
+    if token:
+        cabecalhos["Authorization"] = f"Bearer {token}"
+    requisicao = urllib.request.Request(
+        f"http://{host}:{porta}/",
+        data=corpo,
+        headers=cabecalhos,
+    )
+    try:
+        with urllib.request.urlopen(requisicao) as resposta:
+            resultado = json.loads(resposta.read())
+    except urllib.error.HTTPError as e:
+        # Recusas do servidor (401, 403, 415) trazem a mensagem no corpo, no mesmo formato
+        try:
+            resultado = json.loads(e.read())
+        except ValueError:
+            raise e from None
+    return resultado["codigo"], resultado["saida"]
+
+
+def main():
+    try:
+        codigo, saida = enviar_comando(sys.argv[1:])
+    except urllib.error.URLError as e:
+        print(f"Não foi possível falar com o servidor em {SERVIDOR_HOST}:{SERVIDOR_PORTA}: {e.reason}", file=sys.stderr)
+        print("Inicie-o com: python app.py serve", file=sys.stderr)
+        sys.exit(1)
+
+    sys.stdout.write(saida)
+    sys.exit(codigo)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,4 +9,68 @@ DB_PASS = "Sua_Senha" #Deve colocar a sua senha do Banco de Dados
 
 DB_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
 
-LOG_FILE = os.path.join(BASE_DIR, 'logs', 'app.log')
\ No newline at end of file
+# Banco usado pela aplicação: "mysql" (DB_URL acima) ou "sqlite" (arquivo local, sem servidor)
+DB_BACKEND = "mysql"
+
+SQLITE_PATH = os.path.join(BASE_DIR, 'julius_finance.db')
+
+# PRAGMAs aplicados a cada conexão SQLite: WAL deixa leituras e a escrita
+# andarem juntas e synchronous=NORMAL evita um fsync por commit
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": 5000,
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+}
+
+LOG_FILE = os.path.join(BASE_DIR, 'logs', 'app.log')
+
+# Quantidade de linhas gravadas por transação em 'importtransactions' e 'importusers'
+IMPORT_TAMANHO_LOTE = 1000
+
+# Transações lidas por consulta (página por id_transacao) no comando 'exporttransactions'
+EXPORT_TAMANHO_LOTE = 5000
+
+# Endereço do modo servidor ('app.py serve') usado pelo cliente.py
+SERVIDOR_HOST = "127.0.0.1"
+SERVIDOR_PORTA = 8765
+
+# Segredo compartilhado do modo servidor, enviado pelo cliente.py no cabeçalho
+# Authorization. Sem ele, o 'serve' só aceita escutar em loopback e sorteia um
+# token a cada início, gravado (modo 0600) em SERVIDOR_TOKEN_ARQUIVO
+SERVIDOR_TOKEN = os.environ.get("JULIUS_SERVIDOR_TOKEN")
+SERVIDOR_TOKEN_ARQUIVO = os.path.join(os.path.expanduser("~"), ".julius_servidor_token")
+
+# Custo (log2 das rodadas) do bcrypt usado em hash_senha; 12 é o padrão da biblioteca
+BCRYPT_CUSTO = 12
+
+# Comandos SQL acima deste tempo (ms) são gravados em LOG_FILE; None desliga o slow query log
+SLOW_QUERY_MS = 200
+
+# Tamanho, em meses, do período entre dois checkpoints de saldo por conta (1 = mensal)
+CHECKPOINT_MESES = 1
+
+# Segundos até o cache de categorias e tipos de investimento ser relido do banco
+REFERENCIA_TTL_SEGUNDOS = 300
+
+# Comando 'batch': commit a cada N operações ou T milissegundos, o que vier primeiro
+BATCH_TAMANHO_GRUPO = 100
+BATCH_INTERVALO_MS = 200
+
+# Anos mais recentes que o 'archive' mantém em transacoes (2 = o atual e o anterior)
+ARQUIVO_ANOS_ABERTOS = 2
+
+# Comando 'statements': threads trabalhadoras (cada uma com a sua sessão) e usuários por faixa de IDs
+EXTRATO_TRABALHADORES = 4
+EXTRATO_USUARIOS_POR_FAIXA = 500
+
+# Comando 'applygoals': regras de aporte aplicadas por transação (um INSERT ... SELECT e um UPDATE cada)
+METAS_TAMANHO_LOTE = 1000
+
+# Comando 'goals': meses fechados cuja média de aportes projeta a conclusão das metas
+METAS_MESES_RITMO = 3
+
+# Comando 'runschedule': transações recorrentes vencidas processadas por transação
+RECORRENCIA_TAMANHO_LOTE = 1000
@@ -0,0 +1,269 @@
+# database/analitico.py
+
+import datetime
+import threading
+from sqlalchemy import select, func
+from .connection import session
+from .models import Conta, Tag, SaldoConta
+from . import referencias
+from . import arquivo
+
+try:
+    import numpy as np
+except ImportError:  # numpy só é necessário para este módulo
+    np = None
+
+# Ordinal (date.toordinal) de 1970-01-01, base do datetime64 do NumPy
+_ORDINAL_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+class TransacoesColunares:
+    """
+    Transações de um usuário em arrays NumPy compactos, ordenadas por
+    (data, id_transacao): valores em centavos (int64), datas como dias desde
+    1970-01-01 (int32) e IDs de conta/categoria (int32). As tags ficam em
+    dois arrays paralelos (posição da transação, id da tag).
+    """
+
+    def __init__(self, id_usuario, versao, linhas, pares_tags, contas, categorias, tags):
+        self.id_usuario = id_usuario
+        self.versao = versao
+
+        self.ids = np.fromiter((l[0] for l in linhas), dtype=np.int64, count=len(linhas))
+        self.dias = np.fromiter((l[1].toordinal() - _ORDINAL_EPOCH for l in linhas), dtype=np.int32, count=len(linhas))
+        self.centavos = np.rint(np.fromiter((l[2] for l in linhas), dtype=np.float64, count=len(linhas)) * 100)\
+                          .astype(np.int64)
+        self.contas = np.fromiter((l[3] for l in linhas), dtype=np.int32, count=len(linhas))
+        self.categorias = np.fromiter((l[4] for l in linhas), dtype=np.int32, count=len(linhas))
+
+        # Chave ano*12 + (mês-1), usada nos filtros e agrupamentos por período
+        self.meses = self.dias.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) + 1970 * 12
+
+        ordem = np.argsort(self.ids)
+        ids_com_tag = np.array([p[0] for p in pares_tags], dtype=np.int64)
+        self.tag_posicoes = ordem[np.searchsorted(self.ids[ordem], ids_com_tag)]
+        self.tag_ids = np.array([p[1] for p in pares_tags], dtype=np.int32)
+
+        self.nomes_contas = {id_conta: nome for id_conta, nome, _ in contas}
+        self.saldo_inicial_centavos = int(round(sum(saldo or 0.0 for _, _, saldo in contas) * 100))
+        self.nomes_categorias = {id_cat: nome for id_cat, nome, _ in categorias}
+        self.tipos_categorias = {id_cat: tipo for id_cat, _, tipo in categorias}
+        self.nomes_tags = dict(tags)
+
+        ids_despesa = [id_cat for id_cat, tipo in self.tipos_categorias.items() if tipo == 'Despesa']
+        self.eh_despesa = np.isin(self.categorias, ids_despesa)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _filtro_periodo(self, ano=None, mes=None):
+        if ano is None:
+            return np.ones(len(self), dtype=bool)
+        if mes is None:
+            return (self.meses // 12) == ano
+        return self.meses == ano * 12 + (mes - 1)
+
+    def balanco_total(self):
+        """Mesmo número que calcular_balanco_usuario."""
+        return (self.saldo_inicial_centavos + int(self.centavos.sum())) / 100
+
+    def gastos_categoria(self, id_categoria, mes, ano):
+        """Mesmo número que sp_calcular_gastos_categoria (None se não houver gasto)."""
+        filtro = (self.categorias == id_categoria) & self.eh_despesa & self._filtro_periodo(ano, mes)
+        if not filtro.any():
+            return None
+        return int(self.centavos[filtro].sum()) / 100
+
+    def _agrupar(self, chaves, filtro):
+        """Soma e contagem por chave, vetorizado com np.unique + bincount."""
+        unicas, indices = np.unique(chaves[filtro], return_inverse=True)
+        somas = np.bincount(indices, weights=self.centavos[filtro], minlength=len(unicas))
+        contagens = np.bincount(indices, minlength=len(unicas))
+        return [(int(chave), round(soma) / 100, int(qtd)) for chave, soma, qtd in zip(unicas, somas, contagens)]
+
+    def por_mes(self, ano=None):
+        grupos = self._agrupar(self.meses, self._filtro_periodo(ano))
+        return [(f"{chave // 12}-{chave % 12 + 1:02d}", total, qtd) for chave, total, qtd in grupos]
+
+    def por_categoria(self, ano=None, mes=None):
+        grupos = self._agrupar(self.categorias, self._filtro_periodo(ano, mes))
+        return [(self.nomes_categorias.get(chave, chave), total, qtd) for chave, total, qtd in grupos]
+
+    def por_conta(self, ano=None, mes=None):
+        grupos = self._agrupar(self.contas, self._filtro_periodo(ano, mes))
+        return [(self.nomes_contas.get(chave, chave), total, qtd) for chave, total, qtd in grupos]
+
+    def por_tag(self, ano=None, mes=None):
+        filtro = self._filtro_periodo(ano, mes)[self.tag_posicoes]
+        posicoes = self.tag_posicoes[filtro]
+        tags = self.tag_ids[filtro]
+        unicas, indices = np.unique(tags, return_inverse=True)
+        somas = np.bincount(indices, weights=self.centavos[posicoes], minlength=len(unicas))
+        contagens = np.bincount(indices, minlength=len(unicas))
+        return [(self.nomes_tags.get(int(chave), chave), round(soma) / 100, int(qtd))
+                for chave, soma, qtd in zip(unicas, somas, contagens)]
+
+    def saldo_diario(self):
+        """Saldo ao fim de cada dia com movimento: lista de (data, saldo)."""
+        if len(self) == 0:
+            return []
+        acumulado = np.cumsum(self.centavos) + self.saldo_inicial_centavos
+        # Como as transações estão ordenadas por data, o último índice de cada dia é o saldo do dia
+        ultimos = np.flatnonzero(np.diff(self.dias, append=np.iinfo(np.int32).max) != 0)
+        return [(datetime.date.fromordinal(int(dia) + _ORDINAL_EPOCH), int(saldo) / 100)
+                for dia, saldo in zip(self.dias[ultimos], acumulado[ultimos])]
+
+    def maiores_despesas(self, n=10, ano=None, mes=None):
+        """Top-N despesas (as mais negativas), como (id_transacao, data, valor)."""
+        candidatas = np.flatnonzero(self.eh_despesa & self._filtro_periodo(ano, mes))
+        if len(candidatas) == 0:
+            return []
+        n = min(n, len(candidatas))
+        escolhidas = candidatas[np.argpartition(self.centavos[candidatas], n - 1)[:n]]
+        escolhidas = escolhidas[np.argsort(self.centavos[escolhidas])]
+        return [(int(self.ids[i]), datetime.date.fromordinal(int(self.dias[i]) + _ORDINAL_EPOCH),
+                 int(self.centavos[i]) / 100) for i in escolhidas]
+
+
+_cache = {}
+_trava = threading.Lock()
+
+
+def _versao_usuario(id_usuario):
+    """
+    Versão dos dados do usuário numa única consulta: a soma dos contadores
+    de saldos_conta.versao (incrementados pelos triggers a cada escrita em
+    transacoes e transacao_tag, inclusive mudança de categoria ou data) e o
+    número e saldo inicial das contas.
+    """
+    return tuple(session.execute(
+        select(func.count(Conta.id_conta), func.coalesce(func.sum(Conta.saldo_inicial), 0.0),
+               func.coalesce(func.sum(SaldoConta.versao), 0))
+        .outerjoin(SaldoConta, SaldoConta.id_conta == Conta.id_conta)
+        .where(Conta.id_usuario == id_usuario)
+    ).one())
+
+
+def invalidar(id_usuario=None):
+    """Descarta o cache de um usuário (ou de todos)."""
+    with _trava:
+        if id_usuario is None:
+            _cache.clear()
+        else:
+            _cache.pop(id_usuario, None)
+
+
+def carregar(id_usuario):
+    """
+    Devolve as transações do usuário em formato colunar, reaproveitando o
+    cache enquanto a versão do usuário não mudar.
+    """
+    if np is None:
+        raise RuntimeError("O módulo analítico precisa do NumPy (pip install numpy).")
+
+    versao = _versao_usuario(id_usuario)
+    with _trava:
+        em_cache = _cache.get(id_usuario)
+    if em_cache is not None and em_cache.versao == versao:
+        return em_cache
+
+    # Histórico completo: transacoes e as tabelas de arquivo, cada uma com a sua tabela de tags
+    contas_do_usuario = select(Conta.id_conta).where(Conta.id_usuario == id_usuario)
+    T = arquivo.transacoes_no_periodo(condicoes=lambda T: [T.c.id_conta.in_(contas_do_usuario)])
+    linhas = session.execute(
+        select(T.c.id_transacao, T.c.data, T.c.valor, T.c.id_conta, T.c.id_categoria)
+        .order_by(T.c.data, T.c.id_transacao)
+    ).all()
+    pares_tags = session.execute(arquivo.unir([
+        select(tags.c.transacao_id, tags.c.tag_id)
+        .join(tabela, tabela.c.id_transacao == tags.c.transacao_id)
+        .where(tabela.c.id_conta.in_(contas_do_usuario))
+        for tabela, tags in arquivo.segmentos()
+    ], "tags").select()).all()
+    contas = session.execute(
+        select(Conta.id_conta, Conta.nome_conta, Conta.saldo_inicial).where(Conta.id_usuario == id_usuario)
+    ).all()
+    categorias = [(id_categoria, nome, tipo) for id_categoria, (nome, tipo) in referencias.obter().categorias.items()]
+    tags = session.execute(select(Tag.id_tag, Tag.nome)).all()
+
+    dados = TransacoesColunares(id_usuario, versao, linhas, pares_tags, contas, categorias, tags)
+    with _trava:
+        _cache[id_usuario] = dados
+    return dados
+
+
+def conferir(id_usuario, tolerancia=0.005):
+    """
+    Compara o motor colunar com o banco: balanço total (calcular_balanco_usuario)
+    e gasto por categoria em cada mês (a soma de sp_calcular_gastos_categoria,
+    também nos anos arquivados).
+    Devolve a lista de divergências.
+    """
+    from .functions import consulta_balanco_usuario
+
+    dados = carregar(id_usuario)
+    divergencias = []
+    contas_do_usuario = select(Conta.id_conta).where(Conta.id_usuario == id_usuario)
+
+    no_banco = session.execute(consulta_balanco_usuario(id_usuario)).scalar() or 0.0
+    if abs(no_banco - dados.balanco_total()) > tolerancia:
+        divergencias.append(("balanço", no_banco, dados.balanco_total()))
+
+    meses = np.unique(dados.meses[dados.eh_despesa])
+    for chave in meses:
+        ano, mes = int(chave) // 12, int(chave) % 12 + 1
+        inicio = datetime.date(ano, mes, 1)
+        fim = datetime.date(ano + mes // 12, mes % 12 + 1, 1)
+        for id_categoria in np.unique(dados.categorias[dados.eh_despesa & (dados.meses == chave)]):
+            T = arquivo.transacoes_no_periodo(inicio, fim - datetime.timedelta(days=1), lambda T: [
+                T.c.id_categoria == int(id_categoria), T.c.id_conta.in_(contas_do_usuario)])
+            no_banco = session.execute(select(func.sum(T.c.valor))).scalar()
+            calculado = dados.gastos_categoria(int(id_categoria), mes, ano)
+            if (no_banco is None) != (calculado is None) or \
+                    (no_banco is not None and abs(no_banco - calculado) > tolerancia):
+                divergencias.append((f"gastos categoria {id_categoria} em {mes:02d}/{ano}", no_banco, calculado))
+
+    return divergencias
+
+
+def relatorio_analitico(id_usuario, agrupamento="categoria", ano=None, mes=None, top=0, verificar=False):
+    """Imprime um agrupamento (mes, categoria, conta, tag ou saldo), top-N despesas e a conferência com o banco."""
+    try:
+        dados = carregar(id_usuario)
+        print(f"{len(dados)} transações carregadas para o Usuário ID {id_usuario}. "
+              f"Balanço: R${dados.balanco_total():.2f}")
+
+        if agrupamento == "mes":
+            grupos = dados.por_mes(ano)
+        elif agrupamento == "conta":
+            grupos = dados.por_conta(ano, mes)
+        elif agrupamento == "tag":
+            grupos = dados.por_tag(ano, mes)
+        elif agrupamento == "saldo":
+            grupos = [(data.isoformat(), saldo, None) for data, saldo in dados.saldo_diario()
+                      if (ano is None or data.year == ano) and (mes is None or data.month == mes)]
+        else:
+            grupos = dados.por_categoria(ano, mes)
+
+        print(f"\nPor {agrupamento}:")
+        for chave, total, qtd in grupos:
+            sufixo = f"  ({qtd} transação(ões))" if qtd is not None else ""
+            print(f"  {str(chave):<25} R${total:>12.2f}{sufixo}")
+
+        if top:
+            print(f"\nMaiores {top} despesas:")
+            for id_transacao, data, valor in dados.maiores_despesas(top, ano, mes):
+                print(f"  [{id_transacao}] {data}  R${valor:.2f}")
+
+        if verificar:
+            divergencias = conferir(id_usuario)
+            if divergencias:
+                for descricao, no_banco, calculado in divergencias:
+                    print(f"  DIVERGÊNCIA {descricao}: banco {no_banco}, colunar {calculado}")
+            else:
+                print("\nConferência com o banco: todos os números batem.")
+        return dados
+
+    except Exception as e:
+        print(f"Erro no relatório analítico: {e}")
+        return None
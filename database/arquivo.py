@@ -0,0 +1,300 @@
+# database/arquivo.py
+
+import contextlib
+import datetime
+import time
+from sqlalchemy import (MetaData, Table, Column, Index, select, insert, delete, update, text, func,
+                        extract, inspect, and_, or_, union_all, bindparam)
+from .connection import get_engine, session
+from .esquema import adicionar_colunas
+from .procedures_triggers import SQLITE_CREATE_FTS_ARQUIVO
+from .models import (Transacao, Transferencia, SaldoConta, ArquivoTransacoes, Conta, ResumoMensalCategoria,
+                     CheckpointSaldo, transacao_tag_association, transacao_tag_arquivo, transferencias_arquivo)
+from config import settings
+
+# Anos fechados ficam em tabelas transacoes_<ano>, com as mesmas colunas de
+# transacoes. O particionamento nativo do MySQL não serve aqui: tabelas
+# particionadas do InnoDB não aceitam chaves estrangeiras, e transacoes é
+# referenciada por transacao_tag e transferencias.
+_metadata_arquivo = MetaData()
+
+COLUNAS = ["id_transacao", "descricao", "valor", "data", "id_conta", "id_categoria", "impressao_digital"]
+
+
+def tabela_arquivo(ano):
+    """Tabela transacoes_<ano> (criada no banco pelo 'archive')."""
+    nome = f"transacoes_{int(ano)}"
+    if nome in _metadata_arquivo.tables:
+        return _metadata_arquivo.tables[nome]
+    colunas = [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, autoincrement=False)
+               for c in Transacao.__table__.columns]
+    return Table(nome, _metadata_arquivo, *colunas,
+                 Index(f"ix_{nome}_conta_data", "id_conta", "data"),
+                 Index(f"ix_{nome}_categoria_data", "id_categoria", "data"),
+                 Index(f"ix_{nome}_impressao_digital", "impressao_digital"),
+                 Index(f"ix_{nome}_descricao_texto", "descricao", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"))
+
+
+def indexar_texto(engine, tabela):
+    """
+    No SQLite, (re)constrói o índice FTS5 do arquivo a partir da tabela; no
+    MySQL o FULLTEXT de tabela_arquivo já é mantido pelo próprio banco.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conexao:
+        conexao.execute(text(SQLITE_CREATE_FTS_ARQUIVO.format(tabela=tabela.name)))
+        conexao.execute(text(f"INSERT INTO {tabela.name}_fts ({tabela.name}_fts) VALUES ('rebuild')"))
+
+
+def sincronizar_arquivos(engine=None):
+    """Leva às tabelas de arquivo existentes as colunas e índices novos de transacoes."""
+    engine = engine or get_engine()
+    with engine.connect() as conexao:
+        anos = anos_arquivados(conexao)
+    for ano in anos:
+        tabela = tabela_arquivo(ano)
+        adicionadas = adicionar_colunas(engine, tabela)
+        for indice in tabela.indexes:
+            indice.create(engine, checkfirst=True)
+        if engine.dialect.name == "sqlite" and not inspect(engine).has_table(f"{tabela.name}_fts"):
+            indexar_texto(engine, tabela)
+        if adicionadas:
+            print(f"Tabela '{tabela.name}': coluna(s) {', '.join(adicionadas)} adicionada(s).")
+
+
+def ajustar_sequencias(engine=None):
+    """
+    No SQLite, leva o sqlite_sequence de transacoes e transferencias para
+    além dos IDs que já estão no arquivo, para que nenhum deles seja
+    reaproveitado (necessário quando a tabela acabou de ganhar AUTOINCREMENT).
+    """
+    engine = engine or get_engine()
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conexao:
+        ids_arquivados = [select(func.max(tabela_arquivo(ano).c.id_transacao)) for ano in anos_arquivados(conexao)]
+        maiores = {
+            Transacao.__tablename__: max((conexao.execute(consulta).scalar() or 0 for consulta in ids_arquivados),
+                                         default=0),
+            Transferencia.__tablename__: conexao.execute(
+                select(func.max(transferencias_arquivo.c.id_transferencia))).scalar() or 0,
+        }
+        for nome, maior in maiores.items():
+            if not maior:
+                continue
+            parametros = {"nome": nome, "maior": maior}
+            conexao.execute(text("UPDATE sqlite_sequence SET seq = :maior WHERE name = :nome AND seq < :maior"),
+                            parametros)
+            conexao.execute(text("INSERT INTO sqlite_sequence (name, seq) SELECT :nome, :maior "
+                                 "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :nome)"), parametros)
+
+
+def anos_arquivados(conexao=None):
+    """Anos já movidos para tabelas de arquivo, em ordem."""
+    consulta = select(ArquivoTransacoes.ano).order_by(ArquivoTransacoes.ano)
+    return list((conexao or session).execute(consulta).scalars())
+
+
+def segmentos(data_inicio=None, data_fim=None, conexao=None):
+    """
+    [(transações, tags)] que podem ter linhas no intervalo: a tabela
+    transacoes sempre (ela pode receber lançamentos retroativos) e só os
+    arquivos dos anos que o intervalo toca. Sem intervalo, todo o histórico.
+    """
+    resultado = [(Transacao.__table__, transacao_tag_association)]
+    for ano in reversed(anos_arquivados(conexao)):
+        if data_inicio is not None and ano < data_inicio.year:
+            continue
+        if data_fim is not None and ano > data_fim.year:
+            continue
+        resultado.append((tabela_arquivo(ano), transacao_tag_arquivo))
+    return resultado
+
+
+def unir(consultas, nome="transacoes"):
+    """Subquery com o UNION ALL das consultas (sem UNION quando há uma só)."""
+    if len(consultas) == 1:
+        return consultas[0].subquery(nome)
+    return union_all(*consultas).subquery(nome)
+
+
+def transacoes_no_periodo(data_inicio=None, data_fim=None, condicoes=None, conexao=None):
+    """
+    Subquery 'transacoes' com as colunas de Transacao e só as tabelas que o
+    intervalo toca. O filtro de data e as `condicoes(tabela)` opcionais são
+    aplicados dentro de cada ramo do UNION, onde os índices são usados.
+    """
+    consultas = []
+    for tabela, _ in segmentos(data_inicio, data_fim, conexao):
+        filtros = list(condicoes(tabela)) if condicoes else []
+        if data_inicio is not None:
+            filtros.append(tabela.c.data >= data_inicio)
+        if data_fim is not None:
+            filtros.append(tabela.c.data <= data_fim)
+        consultas.append(select(*(tabela.c[coluna] for coluna in COLUNAS)).where(*filtros))
+    return unir(consultas)
+
+
+def apagar(conexao, tabela, ids):
+    """
+    Apaga transações de uma tabela de arquivo, que não tem triggers: faz à
+    mão o que os triggers de DELETE de transacoes fariam (saldo, resumo
+    mensal e checkpoints) e corrige arquivos_transacoes. Roda na transação
+    já aberta em `conexao`; devolve quantas linhas saíram.
+    """
+    linhas = conexao.execute(
+        select(tabela.c.id_transacao, tabela.c.id_conta, tabela.c.id_categoria, tabela.c.data, tabela.c.valor,
+               tabela.c.descricao, Conta.id_usuario)
+        .join(Conta, Conta.id_conta == tabela.c.id_conta)
+        .where(tabela.c.id_transacao.in_(ids))).all()
+    if not linhas:
+        return 0
+
+    S = SaldoConta.__table__
+    R = ResumoMensalCategoria.__table__
+    C = CheckpointSaldo.__table__
+    conexao.execute(update(S).where(S.c.id_conta == bindparam("b_conta"))
+                    .values(saldo=S.c.saldo - bindparam("b_valor"), qtd_transacoes=S.c.qtd_transacoes - 1,
+                            versao=S.c.versao + 1),
+                    [{"b_conta": l.id_conta, "b_valor": l.valor} for l in linhas])
+    conexao.execute(update(R).where(R.c.id_usuario == bindparam("b_usuario"),
+                                    R.c.id_categoria == bindparam("b_categoria"),
+                                    R.c.ano == bindparam("b_ano"), R.c.mes == bindparam("b_mes"))
+                    .values(total=R.c.total - bindparam("b_valor"), qtd_transacoes=R.c.qtd_transacoes - 1),
+                    [{"b_usuario": l.id_usuario, "b_categoria": l.id_categoria, "b_ano": l.data.year,
+                      "b_mes": l.data.month, "b_valor": l.valor} for l in linhas])
+    conexao.execute(delete(C).where(C.c.id_conta == bindparam("b_conta"), C.c.data > bindparam("b_data")),
+                    [{"b_conta": l.id_conta, "b_data": l.data} for l in linhas])
+
+    if conexao.dialect.name == "sqlite" and inspect(conexao).has_table(f"{tabela.name}_fts"):
+        conexao.execute(text(f"INSERT INTO {tabela.name}_fts ({tabela.name}_fts, rowid, descricao) "
+                             f"VALUES ('delete', :id, :descricao)"),
+                        [{"id": l.id_transacao, "descricao": l.descricao} for l in linhas])
+    conexao.execute(delete(transacao_tag_arquivo).where(transacao_tag_arquivo.c.transacao_id.in_(ids)))
+    conexao.execute(delete(tabela).where(tabela.c.id_transacao.in_(ids)))
+
+    A = ArquivoTransacoes.__table__
+    conexao.execute(update(A).where(A.c.ano == linhas[0].data.year)
+                    .values(qtd_transacoes=A.c.qtd_transacoes - len(linhas),
+                            total=A.c.total - sum(l.valor for l in linhas)))
+    return len(linhas)
+
+
+@contextlib.contextmanager
+def _arquivando(conexao):
+    """
+    Desliga os triggers de DELETE de transacoes nesta conexão: as linhas
+    movidas continuam contando em saldos, resumos e checkpoints.
+    """
+    if conexao.dialect.name == "mysql":
+        conexao.execute(text("SET @julius_arquivando = 1"))
+        try:
+            yield
+        finally:
+            conexao.execute(text("SET @julius_arquivando = NULL"))
+    else:
+        conexao.execute(text("INSERT INTO arquivamento_em_andamento (ativo) VALUES (1)"))
+        yield
+        conexao.execute(text("DELETE FROM arquivamento_em_andamento"))
+
+
+def _mover_mes(conexao, tabela, inicio, fim):
+    """Move as transações de [inicio, fim), com tags e transferências, numa única transação."""
+    T = Transacao.__table__
+    periodo = and_(T.c.data >= inicio, T.c.data < fim)
+    ids = select(T.c.id_transacao).where(periodo)
+    tt = transacao_tag_association
+    tr = Transferencia.__table__
+
+    with conexao.begin(), _arquivando(conexao):
+        movidas = conexao.execute(insert(tabela).from_select(
+            COLUNAS, select(*(T.c[coluna] for coluna in COLUNAS)).where(periodo))).rowcount
+
+        conexao.execute(insert(transacao_tag_arquivo).from_select(
+            ["transacao_id", "tag_id"], select(tt.c.transacao_id, tt.c.tag_id).where(tt.c.transacao_id.in_(ids))))
+        conexao.execute(delete(tt).where(tt.c.transacao_id.in_(ids)))
+
+        vinculadas = or_(tr.c.id_transacao_debito.in_(ids), tr.c.id_transacao_credito.in_(ids))
+        conexao.execute(insert(transferencias_arquivo).from_select(
+            ["id_transferencia", "id_transacao_debito", "id_transacao_credito", "chave_lote"],
+            select(tr.c.id_transferencia, tr.c.id_transacao_debito, tr.c.id_transacao_credito, tr.c.chave_lote)
+            .where(vinculadas)))
+        conexao.execute(delete(tr).where(vinculadas))
+
+        # Os triggers de DELETE estão desligados, mas as linhas saem do que o motor analítico lê
+        S = SaldoConta.__table__
+        conexao.execute(update(S).where(S.c.id_conta.in_(select(T.c.id_conta).where(periodo)))
+                        .values(versao=S.c.versao + 1))
+        conexao.execute(delete(T).where(periodo))
+    return movidas
+
+
+def ultimo_ano_arquivavel():
+    return datetime.date.today().year - settings.ARQUIVO_ANOS_ABERTOS
+
+
+def arquivar(ate_ano=None):
+    """
+    Move para transacoes_<ano> as transações de cada ano fechado até
+    `ate_ano`, um mês por transação do banco. O ano é registrado em
+    arquivos_transacoes antes da primeira cópia, então as consultas já o
+    incluem enquanto as linhas migram; repetir o comando depois de uma
+    falha só move o que ficou em transacoes.
+    """
+    limite = ultimo_ano_arquivavel()
+    ate_ano = limite if ate_ano is None else ate_ano
+    if ate_ano > limite:
+        print(f"Erro: só anos até {limite} podem ser arquivados (ARQUIVO_ANOS_ABERTOS = "
+              f"{settings.ARQUIVO_ANOS_ABERTOS}).")
+        return None
+
+    try:
+        engine = get_engine()
+        T = Transacao.__table__
+        with engine.connect() as conexao:
+            anos = list(conexao.execute(
+                select(extract('year', T.c.data)).distinct()
+                .where(T.c.data < datetime.date(ate_ano + 1, 1, 1))).scalars())
+            conexao.rollback()
+        anos = sorted(int(ano) for ano in anos)
+        if not anos:
+            print(f"Nenhuma transação até {ate_ano} para arquivar.")
+            return {}
+
+        movidas_por_ano = {}
+        for ano in anos:
+            inicio = time.perf_counter()
+            tabela = tabela_arquivo(ano)
+            # DDL fora das transações: no MySQL ele confirma a transação aberta
+            if inspect(engine).has_table(tabela.name):
+                adicionar_colunas(engine, tabela)
+            tabela.create(engine, checkfirst=True)
+            with engine.begin() as conexao:
+                if conexao.execute(select(ArquivoTransacoes.ano).where(ArquivoTransacoes.ano == ano)).first() is None:
+                    conexao.execute(insert(ArquivoTransacoes.__table__).values(ano=ano))
+
+            movidas = 0
+            with engine.connect() as conexao:
+                for mes in range(1, 13):
+                    fim = datetime.date(ano + mes // 12, mes % 12 + 1, 1)
+                    movidas += _mover_mes(conexao, tabela, datetime.date(ano, mes, 1), fim)
+
+                with conexao.begin():
+                    qtd, total = conexao.execute(select(func.count(), func.coalesce(func.sum(tabela.c.valor), 0.0))).one()
+                    conexao.execute(update(ArquivoTransacoes.__table__).where(ArquivoTransacoes.ano == ano).values(
+                        qtd_transacoes=qtd, total=total,
+                        data_arquivamento=datetime.datetime.now(datetime.timezone.utc)))
+
+            indexar_texto(engine, tabela)
+            movidas_por_ano[ano] = movidas
+            print(f"  {ano}: {movidas} transação(ões) movida(s) para {tabela.name} "
+                  f"({qtd} no arquivo) em {time.perf_counter() - inicio:.2f}s")
+
+        print(f"Arquivamento concluído: {sum(movidas_por_ano.values())} transação(ões) em "
+              f"{len(movidas_por_ano)} ano(s).")
+        return movidas_por_ano
+
+    except Exception as e:
+        print(f"Erro ao arquivar transações (meses anteriores já foram movidos): {e}")
+        return None
@@ -0,0 +1,249 @@
+# database/benchmark.py
+
+import contextlib
+import datetime
+import io
+import json
+import platform
+import random
+import statistics
+import time
+from sqlalchemy import insert, select, func
+from .connection import get_engine, session
+from .models import Usuario, Conta, Transacao, Tag, Orcamento, transacao_tag_association
+from . import functions as db_func, referencias
+from .procedures import chamar_procedure
+from utils.helpers import hash_senha, agrupar_em_lotes, percentil
+
+DOMINIO_SINTETICO = "sintetico.local"
+
+DESCRICOES = {
+    "Despesa": ["Mercado", "Uber", "iFood", "Aluguel", "Farmácia", "Cinema", "Posto", "Padaria", "Luz", "Internet"],
+    "Receita": ["Salário", "Freelance", "Dividendos", "Reembolso", "Pix recebido"],
+}
+TAGS = ["fixo", "variavel", "cartao", "pix", "viagem", "trabalho", "familia", "lazer"]
+
+
+def gerar_dados_sinteticos(usuarios=100, contas_por_usuario=3, transacoes=100000, anos=3,
+                           tamanho_lote=5000, semente=42):
+    """
+    Popula o banco com usuários, contas, tags, orçamentos e transações
+    aleatórios (mas reproduzíveis pela semente), distribuídos pelos últimos
+    `anos` anos. Os usuários ficam no domínio @sintetico.local.
+    """
+    aleatorio = random.Random(semente)
+    engine = get_engine()
+    inicio = time.perf_counter()
+
+    with engine.begin() as conexao:
+        categorias = [(id_categoria, tipo) for id_categoria, (_, tipo) in referencias.obter().categorias.items()]
+        if not categorias:
+            raise RuntimeError("Nenhuma categoria cadastrada. Rode 'initdb' antes do benchmark.")
+
+        tags_existentes = set(conexao.execute(select(Tag.nome)).scalars())
+        novas_tags = [{"nome": nome} for nome in TAGS if nome not in tags_existentes]
+        if novas_tags:
+            conexao.execute(insert(Tag.__table__), novas_tags)
+        ids_tags = list(conexao.execute(select(Tag.id_tag).where(Tag.nome.in_(TAGS))).scalars())
+
+        # Um único hash para todos: o custo do bcrypt não é o que se quer medir aqui
+        senha_hash = hash_senha("sintetico")
+        prefixo = f"bench{int(time.time())}"
+        agora = datetime.datetime.now(datetime.timezone.utc)
+        conexao.execute(insert(Usuario.__table__), [
+            {"nome": f"Usuário Sintético {i}", "email": f"{prefixo}_{i}@{DOMINIO_SINTETICO}",
+             "senha_hash": senha_hash, "data_criacao": agora}
+            for i in range(usuarios)
+        ])
+        ids_usuarios = list(conexao.execute(
+            select(Usuario.id_usuario).where(Usuario.email.like(f"{prefixo}_%"))
+        ).scalars())
+
+        conexao.execute(insert(Conta.__table__), [
+            {"id_usuario": id_usuario, "nome_conta": f"Conta {n + 1}",
+             "tipo_conta": aleatorio.choice(["corrente", "poupanca", "carteira"]),
+             "saldo_inicial": round(aleatorio.uniform(0, 5000), 2)}
+            for id_usuario in ids_usuarios for n in range(contas_por_usuario)
+        ])
+        ids_contas = list(conexao.execute(
+            select(Conta.id_conta).where(Conta.id_usuario.in_(ids_usuarios))
+        ).scalars())
+
+        hoje = datetime.date.today()
+        despesas = [id_cat for id_cat, tipo in categorias if tipo == "Despesa"]
+        conexao.execute(insert(Orcamento.__table__), [
+            {"id_usuario": id_usuario, "id_categoria": id_categoria, "ano": hoje.year, "mes": mes,
+             "valor_planejado": round(aleatorio.uniform(100, 2000), 2)}
+            for id_usuario in ids_usuarios for id_categoria in despesas[:3] for mes in range(1, 13)
+        ])
+
+    primeiro_dia = hoje.toordinal() - 365 * anos
+
+    def transacoes_aleatorias():
+        for _ in range(transacoes):
+            id_categoria, tipo = aleatorio.choice(categorias)
+            valor = round(aleatorio.lognormvariate(4, 1), 2)
+            yield {
+                "id_conta": aleatorio.choice(ids_contas),
+                "id_categoria": id_categoria,
+                "valor": -valor if tipo == "Despesa" else valor * 5,
+                "descricao": aleatorio.choice(DESCRICOES.get(tipo, DESCRICOES["Despesa"])),
+                "data": datetime.date.fromordinal(aleatorio.randint(primeiro_dia, hoje.toordinal())),
+            }
+
+    inseridas = 0
+    with engine.connect() as conexao:
+        for lote in agrupar_em_lotes(transacoes_aleatorias(), tamanho_lote):
+            with conexao.begin():
+                ultimo_id = conexao.execute(select(func.max(Transacao.id_transacao))).scalar() or 0
+                conexao.execute(insert(Transacao.__table__), lote)
+                novos_ids = conexao.execute(
+                    select(Transacao.id_transacao).where(Transacao.id_transacao > ultimo_id)
+                ).scalars().all()
+                etiquetadas = aleatorio.sample(novos_ids, len(novos_ids) // 5)
+                if etiquetadas and ids_tags:
+                    conexao.execute(insert(transacao_tag_association), [
+                        {"transacao_id": id_transacao, "tag_id": aleatorio.choice(ids_tags)}
+                        for id_transacao in etiquetadas
+                    ])
+            inseridas += len(lote)
+            print(f"  ... {inseridas}/{transacoes} transações sintéticas")
+
+    decorrido = time.perf_counter() - inicio
+    print(f"Dados sintéticos gerados em {decorrido:.1f}s: {len(ids_usuarios)} usuários, "
+          f"{len(ids_contas)} contas, {inseridas} transações.")
+    return ids_usuarios, ids_contas
+
+
+def _amostra_sintetica():
+    """IDs de usuários e contas sintéticos já existentes no banco."""
+    ids_usuarios = list(session.execute(
+        select(Usuario.id_usuario).where(Usuario.email.like(f"%@{DOMINIO_SINTETICO}"))
+    ).scalars())
+    ids_contas = list(session.execute(
+        select(Conta.id_conta).where(Conta.id_usuario.in_(ids_usuarios))
+    ).scalars()) if ids_usuarios else []
+    return ids_usuarios, ids_contas
+
+
+def _medir(nome, operacao, repeticoes):
+    """Executa a operação `repeticoes` vezes e devolve as estatísticas de latência."""
+    latencias = []
+    saida = io.StringIO()
+    with contextlib.redirect_stdout(saida):
+        inicio_total = time.perf_counter()
+        for i in range(repeticoes):
+            inicio = time.perf_counter()
+            operacao(i)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        total = time.perf_counter() - inicio_total
+
+    latencias.sort()
+
+    resultado = {
+        "operacao": nome,
+        "repeticoes": repeticoes,
+        "media_ms": statistics.fmean(latencias),
+        "p50_ms": percentil(latencias, 50),
+        "p95_ms": percentil(latencias, 95),
+        "p99_ms": percentil(latencias, 99),
+        "max_ms": latencias[-1],
+        "ops_por_segundo": repeticoes / total if total else 0.0,
+    }
+    print(f"  {nome:<34} p50 {resultado['p50_ms']:8.2f} ms  p95 {resultado['p95_ms']:8.2f} ms  "
+          f"p99 {resultado['p99_ms']:8.2f} ms  {resultado['ops_por_segundo']:9.1f} ops/s")
+    return resultado
+
+
+def _operacoes(ids_usuarios, ids_contas, aleatorio):
+    """Lista (nome, função) das operações medidas."""
+    hoje = datetime.date.today()
+    categorias = referencias.obter().categorias_por_nome
+    id_despesa = categorias.get("Alimentação") or next(iter(categorias.values()))
+
+    def usuario(_):
+        return aleatorio.choice(ids_usuarios)
+
+    def conta(_):
+        return aleatorio.choice(ids_contas)
+
+    return [
+        ("adicionar_transacao", lambda i: db_func.adicionar_transacao(
+            conta(i), id_despesa, -round(aleatorio.uniform(1, 200), 2), "Benchmark", hoje.isoformat())),
+        ("calcular_balanco_usuario", lambda i: db_func.calcular_balanco_usuario(usuario(i))),
+        ("listar_transacoes (1ª página)", lambda i: db_func.listar_transacoes(conta(i))),
+        ("relatorio_orcamento (ano)", lambda i: db_func.relatorio_orcamento(usuario(i), hoje.year, 1, hoje.year, 12)),
+        # No SQLite as procedures são as funções Python de database/procedures.py
+        ("sp_calcular_gastos_categoria", lambda i: chamar_procedure(
+            "sp_calcular_gastos_categoria", (usuario(i), id_despesa, hoje.month, hoje.year))),
+        ("sp_obter_transacoes_conta", lambda i: chamar_procedure("sp_obter_transacoes_conta", (conta(i),))),
+        ("sp_registrar_transferencia", lambda i: chamar_procedure(
+            "sp_registrar_transferencia", (conta(i), conta(i), round(aleatorio.uniform(1, 100), 2), "Benchmark"))),
+    ]
+
+
+def executar_benchmark(usuarios=100, contas_por_usuario=3, transacoes=100000, anos=3,
+                       repeticoes=200, gerar=True, caminho_saida=None, caminho_comparacao=None, semente=42):
+    """
+    Gera dados sintéticos (opcional), mede latência e vazão das operações
+    principais e salva o resultado em JSON para comparar versões.
+    """
+    try:
+        if gerar:
+            print("Gerando dados sintéticos...")
+            ids_usuarios, ids_contas = gerar_dados_sinteticos(usuarios, contas_por_usuario,
+                                                              transacoes, anos, semente=semente)
+        else:
+            ids_usuarios, ids_contas = _amostra_sintetica()
+        if not ids_contas:
+            print("Não há dados sintéticos no banco. Rode o benchmark sem --sem-gerar.")
+            return None
+
+        print(f"\nMedindo {repeticoes} repetições por operação...")
+        aleatorio = random.Random(semente)
+        resultados = [
+            _medir(nome, operacao, repeticoes)
+            for nome, operacao in _operacoes(ids_usuarios, ids_contas, aleatorio)
+        ]
+
+        relatorio = {
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "backend": get_engine().dialect.name,
+            "python": platform.python_version(),
+            "escala": {
+                "usuarios": len(ids_usuarios),
+                "contas": len(ids_contas),
+                "transacoes": session.execute(select(func.count()).select_from(Transacao)).scalar(),
+            },
+            "resultados": resultados,
+        }
+
+        if caminho_comparacao:
+            _comparar(resultados, caminho_comparacao)
+
+        if caminho_saida:
+            with open(caminho_saida, "w", encoding="utf-8") as arquivo:
+                json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+            print(f"\nResultados salvos em {caminho_saida}.")
+        return relatorio
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro durante o benchmark: {e}")
+        return None
+
+
+def _comparar(resultados, caminho_comparacao):
+    """Mostra a variação do p50 e da vazão em relação a um JSON anterior."""
+    with open(caminho_comparacao, encoding="utf-8") as arquivo:
+        anteriores = {r["operacao"]: r for r in json.load(arquivo)["resultados"]}
+
+    print(f"\nComparação com {caminho_comparacao}:")
+    for atual in resultados:
+        anterior = anteriores.get(atual["operacao"])
+        if not anterior:
+            continue
+        variacao_p50 = (atual["p50_ms"] / anterior["p50_ms"] - 1) * 100 if anterior["p50_ms"] else 0.0
+        variacao_ops = (atual["ops_por_segundo"] / anterior["ops_por_segundo"] - 1) * 100 \
+            if anterior["ops_por_segundo"] else 0.0
+        print(f"  {atual['operacao']:<34} p50 {variacao_p50:+7.1f}%  vazão {variacao_ops:+7.1f}%")
@@ -0,0 +1,138 @@
+# database/busca.py
+
+import datetime
+import math
+import re
+from sqlalchemy import select, func, text, exists, table, column, literal_column, bindparam
+from .connection import get_engine, session
+from .models import Conta, Categoria, Tag
+from . import arquivo
+
+
+def reconstruir_indice():
+    """Reindexa transacoes_fts a partir de transacoes (SQLite; no MySQL o FULLTEXT se mantém sozinho)."""
+    engine = get_engine()
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conexao:
+            conexao.execute(text("INSERT INTO transacoes_fts (transacoes_fts) VALUES ('rebuild')"))
+
+
+def _palavras(termos):
+    return re.findall(r"\w+", termos.lower())
+
+
+def _busca_texto(T, palavras, dialeto):
+    """
+    (junções, condição, relevância) da busca textual na tabela T. Todas as
+    palavras precisam aparecer, como prefixo: 'ube' encontra 'Uber'.
+    """
+    if dialeto == "mysql":
+        # MATCH ... AGAINST usa o índice FULLTEXT de descricao
+        expressao = T.c.descricao.match(" ".join(f"+{p}*" for p in palavras))
+        return [], expressao, expressao
+    if dialeto == "sqlite":
+        nome = f"{T.name}_fts"
+        fts = table(nome, column("rowid"))
+        consulta = bindparam(f"consulta_{T.name}", " ".join(f'"{p}"*' for p in palavras))
+        # bm25() é menor para os melhores resultados
+        return ([(fts, fts.c.rowid == T.c.id_transacao)],
+                literal_column(nome).op("MATCH")(consulta),
+                -func.bm25(literal_column(nome)))
+    raise RuntimeError(f"busca textual não suportada no backend '{dialeto}'")
+
+
+def _ramo(T, tags, palavras, dialeto, id_usuario, id_conta, nomes_tags, data_inicio, data_fim):
+    juncoes, condicao, relevancia = _busca_texto(T, palavras, dialeto)
+    consulta = select(T.c.id_transacao, T.c.data, T.c.valor, T.c.descricao, T.c.id_conta, T.c.id_categoria,
+                      relevancia.label("relevancia")).select_from(T)
+    for alvo, ligacao in juncoes:
+        consulta = consulta.join(alvo, ligacao)
+    consulta = consulta.where(condicao)
+    if id_conta is not None:
+        consulta = consulta.where(T.c.id_conta == id_conta)
+    if id_usuario is not None:
+        consulta = consulta.where(T.c.id_conta.in_(select(Conta.id_conta).where(Conta.id_usuario == id_usuario)))
+    if data_inicio is not None:
+        consulta = consulta.where(T.c.data >= data_inicio)
+    if data_fim is not None:
+        consulta = consulta.where(T.c.data <= data_fim)
+    for nome_tag in nomes_tags or []:
+        consulta = consulta.where(exists().where(
+            tags.c.transacao_id == T.c.id_transacao,
+            tags.c.tag_id == Tag.id_tag,
+            Tag.nome == nome_tag
+        ))
+    return consulta
+
+
+def consultas_busca(termos, id_usuario=None, id_conta=None, tags=None, data_inicio=None, data_fim=None,
+                    pagina=1, por_pagina=20):
+    """
+    SELECTs da busca: (página de resultados, totais). Cada tabela que o
+    período toca (transacoes e arquivos) contribui com os seus melhores
+    pagina * por_pagina resultados, lidos pelo índice de texto.
+    """
+    palavras = _palavras(termos)
+    if not palavras:
+        raise ValueError("informe ao menos uma palavra para buscar")
+    dialeto = get_engine().dialect.name
+
+    ramos = [_ramo(T, tags_T, palavras, dialeto, id_usuario, id_conta, tags, data_inicio, data_fim)
+             for T, tags_T in arquivo.segmentos(data_inicio, data_fim)]
+
+    totais = arquivo.unir(ramos, "resultados")
+    consulta_totais = select(func.count(), func.coalesce(func.sum(totais.c.valor), 0.0))
+
+    ate = pagina * por_pagina
+    paginas = [ramo.order_by(literal_column("relevancia").desc(), ramo.selected_columns.data.desc())
+               .limit(ate) for ramo in ramos]
+    if len(paginas) > 1:
+        # ORDER BY/LIMIT dentro de um UNION precisa de uma subquery no SQLite
+        paginas = [select(p.subquery()) for p in paginas]
+    resultados = arquivo.unir(paginas, "resultados")
+    consulta_pagina = select(resultados.c.id_transacao, resultados.c.data, resultados.c.valor,
+                             resultados.c.descricao, resultados.c.id_conta, Categoria.nome,
+                             resultados.c.relevancia)\
+                      .join(Categoria, Categoria.id_categoria == resultados.c.id_categoria)\
+                      .order_by(resultados.c.relevancia.desc(), resultados.c.data.desc(),
+                                resultados.c.id_transacao.desc())\
+                      .limit(por_pagina).offset(ate - por_pagina)
+    return consulta_pagina, consulta_totais
+
+
+def buscar_transacoes(termos, id_usuario=None, id_conta=None, tags=None, data_inicio=None, data_fim=None,
+                      pagina=1, por_pagina=20):
+    """
+    Busca transações pelas palavras da descrição, usando o índice de texto
+    (FULLTEXT no MySQL, FTS5 no SQLite), com filtros de usuário, conta,
+    tags (todas precisam estar na transação) e período. Devolve
+    (linhas da página, quantidade total, soma dos valores).
+    """
+    try:
+        if data_inicio:
+            data_inicio = datetime.datetime.strptime(data_inicio, '%Y-%m-%d').date()
+        if data_fim:
+            data_fim = datetime.datetime.strptime(data_fim, '%Y-%m-%d').date()
+        if pagina < 1 or por_pagina < 1:
+            print("Erro: página e resultados por página devem ser positivos.")
+            return None
+
+        consulta_pagina, consulta_totais = consultas_busca(termos, id_usuario, id_conta, tags,
+                                                           data_inicio, data_fim, pagina, por_pagina)
+        quantidade, soma = session.execute(consulta_totais).one()
+        linhas = session.execute(consulta_pagina).all() if quantidade else []
+
+        paginas = max(1, math.ceil(quantidade / por_pagina))
+        print(f"{quantidade} transação(ões) encontrada(s) para '{termos}', somando R${soma:.2f} "
+              f"(página {pagina} de {paginas}).")
+        for id_transacao, data, valor, descricao, id_conta_linha, categoria, relevancia in linhas:
+            print(f"  [{id_transacao}] {data}  R${valor:>10.2f}  conta {id_conta_linha:<5} {categoria:<20} "
+                  f"{descricao or ''}  (relevância {relevancia:.2f})")
+        if pagina < paginas:
+            print(f"Próxima página: -p {pagina + 1}")
+        return linhas, quantidade, soma
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao buscar transações: {e}")
+        return None
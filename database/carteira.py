@@ -0,0 +1,330 @@
+# database/carteira.py
+
+import csv
+import datetime
+import threading
+import time
+from sqlalchemy import select, insert, delete, func, tuple_, and_
+from .connection import get_engine, session
+from .models import Conta, Investimento, OperacaoInvestimento, PrecoAtivo
+from .functions import _confirmar, _desfazer
+from .importacao import LinhaInvalida, _parse_data, _parse_valor
+from . import referencias
+from utils.helpers import agrupar_em_lotes
+from config.settings import IMPORT_TAMANHO_LOTE
+
+try:
+    import numpy as np
+except ImportError:  # numpy só é necessário para a avaliação da carteira
+    np = None
+
+# Venda que zera a posição: restos de ponto flutuante abaixo disto contam como zero
+_QUANTIDADE_MINIMA = 1e-9
+
+
+def _normalizar_simbolo(simbolo):
+    return (simbolo or "").strip().upper()
+
+
+def ler_precos_csv(arquivo, delimitador=","):
+    """Gera (linha, simbolo, data, preco) para cada linha do CSV (colunas simbolo, data, preco)."""
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    for linha in leitor:
+        yield leitor.line_num, linha.get("simbolo"), linha.get("data"), linha.get("preco")
+
+
+def _gravar_precos(conexao, lote):
+    """
+    Substitui as cotações do lote: um DELETE pelas chaves (simbolo, data) e
+    um único executemany. A última linha de uma chave repetida no lote vale.
+    """
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    por_chave = {(simbolo, data): preco for simbolo, data, preco in lote}
+    conexao.execute(delete(PrecoAtivo.__table__).where(
+        tuple_(PrecoAtivo.simbolo, PrecoAtivo.data).in_(list(por_chave))))
+    conexao.execute(insert(PrecoAtivo.__table__), [
+        {"simbolo": simbolo, "data": data, "preco": preco, "data_importacao": agora}
+        for (simbolo, data), preco in por_chave.items()
+    ])
+    return len(por_chave)
+
+
+def importar_precos(caminho, tamanho_lote=None, delimitador=",", encoding="utf-8"):
+    """
+    Importa cotações de um CSV local (simbolo, data, preco) em lotes, uma
+    transação por lote. Cotações já gravadas para o mesmo ativo e dia são
+    substituídas, então reimportar um arquivo corrigido é seguro.
+    """
+    tamanho_lote = tamanho_lote or IMPORT_TAMANHO_LOTE
+    lidas = gravadas = rejeitadas = 0
+    inicio = time.perf_counter()
+
+    def precos_validos(registros):
+        nonlocal lidas, rejeitadas
+        for numero, simbolo, data, preco in registros:
+            lidas += 1
+            try:
+                simbolo = _normalizar_simbolo(simbolo)
+                if not simbolo or len(simbolo) > 20:
+                    raise LinhaInvalida(f"símbolo inválido '{simbolo}'")
+                if not data or not preco:
+                    raise LinhaInvalida("data e preço são obrigatórios")
+                valor = _parse_valor(preco)
+                if valor < 0:
+                    raise LinhaInvalida(f"preço negativo '{preco}'")
+                yield simbolo, _parse_data(data), valor
+            except LinhaInvalida as e:
+                rejeitadas += 1
+                print(f"  Linha {numero} ignorada: {e}")
+
+    try:
+        with get_engine().connect() as conexao, \
+                open(caminho, newline="", encoding=encoding, errors="replace") as arquivo:
+            for lote in agrupar_em_lotes(precos_validos(ler_precos_csv(arquivo, delimitador)), tamanho_lote):
+                with conexao.begin():
+                    gravadas += _gravar_precos(conexao, lote)
+
+    except Exception as e:
+        print(f"Erro ao importar cotações: {e}")
+        print(f"Lotes já gravados permanecem no banco ({gravadas} cotações).")
+        return None
+
+    decorrido = time.perf_counter() - inicio
+    print(f"Importação concluída: {lidas} lidas, {gravadas} cotação(ões) gravada(s), {rejeitadas} rejeitada(s).")
+    print(f"Tempo: {decorrido:.2f}s ({gravadas / decorrido if decorrido else 0:.0f} cotações/s)")
+    return gravadas
+
+
+def registrar_operacao(id_conta, simbolo, tipo, quantidade, preco, tipo_investimento=None, data_str=None):
+    """
+    Registra uma compra ou venda e atualiza a posição da conta no ativo de
+    forma incremental, na mesma transação: a compra recalcula o preço
+    médio ponderado, a venda só reduz a quantidade (e zera o preço médio
+    quando a posição acaba). A primeira compra de um ativo cria a posição
+    e exige o tipo de investimento.
+    """
+    try:
+        simbolo = _normalizar_simbolo(simbolo)
+        if tipo not in ("compra", "venda"):
+            print(f"Erro: operação '{tipo}' inválida (use compra ou venda).")
+            return None
+        if not simbolo or quantidade <= 0 or preco < 0:
+            print("Erro: informe o símbolo, uma quantidade positiva e um preço não negativo.")
+            return None
+        data = datetime.datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else datetime.date.today()
+
+        if session.get(Conta, id_conta) is None:
+            print(f"Erro: Conta ID {id_conta} não existe.")
+            return None
+
+        # FOR UPDATE: duas operações simultâneas no mesmo ativo não perdem atualização no MySQL
+        posicao = session.scalars(
+            select(Investimento).where(Investimento.id_conta == id_conta, Investimento.simbolo == simbolo)
+            .order_by(Investimento.id_investimento).limit(1).with_for_update()
+        ).first()
+
+        if posicao is None:
+            if tipo == "venda":
+                print(f"Erro: a conta {id_conta} não tem posição em {simbolo}.")
+                return None
+            id_tipo = referencias.id_tipo_investimento(tipo_investimento) if tipo_investimento else None
+            if id_tipo is None:
+                tipos = ", ".join(sorted(referencias.obter().tipos_investimento_por_nome)) or "nenhum cadastrado"
+                print(f"Erro: informe um tipo de investimento válido para a primeira compra de {simbolo} "
+                      f"({tipos}).")
+                return None
+            posicao = Investimento(id_conta=id_conta, simbolo=simbolo, quantidade=0.0, preco_medio=0.0,
+                                   id_tipo_investimento=id_tipo)
+            session.add(posicao)
+
+        atual = posicao.quantidade or 0.0
+        if tipo == "compra":
+            posicao.preco_medio = (atual * (posicao.preco_medio or 0.0) + quantidade * preco) / (atual + quantidade)
+            posicao.quantidade = atual + quantidade
+        else:
+            if quantidade > atual + _QUANTIDADE_MINIMA:
+                print(f"Erro: venda de {quantidade:g} {simbolo}, mas a conta {id_conta} tem {atual:g}.")
+                return None
+            posicao.quantidade = atual - quantidade
+            if posicao.quantidade <= _QUANTIDADE_MINIMA:
+                posicao.quantidade = 0.0
+                posicao.preco_medio = 0.0
+
+        operacao = OperacaoInvestimento(investimento=posicao, tipo=tipo, quantidade=quantidade, preco=preco, data=data)
+        session.add(operacao)
+        _confirmar(flush=True)
+        print(f"{tipo.capitalize()} de {quantidade:g} {simbolo} a R${preco:.2f} registrada. Posição: "
+              f"{posicao.quantidade:g} a preço médio R${posicao.preco_medio:.2f}.")
+        return operacao
+    except Exception as e:
+        _desfazer()
+        print(f"Erro ao registrar operação: {e}")
+        return None
+
+
+class PosicoesColunares:
+    """
+    Posições abertas (quantidade diferente de zero) em arrays NumPy:
+    IDs de conta, usuário e tipo (int64), o código do símbolo (índice em
+    `simbolos`), quantidade e preço médio (float64).
+    """
+
+    def __init__(self, versao, linhas):
+        self.versao = versao
+        self.contas = np.fromiter((l[0] for l in linhas), dtype=np.int64, count=len(linhas))
+        self.usuarios = np.fromiter((l[1] for l in linhas), dtype=np.int64, count=len(linhas))
+        self.tipos = np.fromiter((l[2] for l in linhas), dtype=np.int64, count=len(linhas))
+        self.simbolos, self.codigos = np.unique(np.array([l[3] or "" for l in linhas], dtype=object),
+                                                return_inverse=True)
+        self.quantidades = np.fromiter((l[4] or 0.0 for l in linhas), dtype=np.float64, count=len(linhas))
+        self.precos_medios = np.fromiter((l[5] or 0.0 for l in linhas), dtype=np.float64, count=len(linhas))
+        self.custos = self.quantidades * self.precos_medios
+
+    def __len__(self):
+        return len(self.contas)
+
+
+class Avaliacao:
+    """Valor de mercado de cada posição; sem cotação, a posição é avaliada pelo preço médio."""
+
+    def __init__(self, posicoes, cotacoes, versao):
+        self.posicoes = posicoes
+        self.versao = versao
+        por_simbolo = np.array([cotacoes.get(simbolo, np.nan) for simbolo in posicoes.simbolos], dtype=np.float64)
+        precos = por_simbolo[posicoes.codigos] if len(posicoes) else np.empty(0)
+        self.sem_cotacao = np.isnan(precos)
+        self.precos = np.where(self.sem_cotacao, posicoes.precos_medios, precos)
+        self.valores = posicoes.quantidades * self.precos
+
+    def agrupar(self, por, filtro):
+        """[(chave, custo, valor, posições, sem cotação)] por conta, usuário, tipo ou ativo."""
+        chaves = {"conta": self.posicoes.contas, "usuario": self.posicoes.usuarios,
+                  "tipo": self.posicoes.tipos, "ativo": self.posicoes.codigos}[por][filtro]
+        unicas, indices = np.unique(chaves, return_inverse=True)
+        custos = np.bincount(indices, weights=self.posicoes.custos[filtro], minlength=len(unicas))
+        valores = np.bincount(indices, weights=self.valores[filtro], minlength=len(unicas))
+        contagens = np.bincount(indices, minlength=len(unicas))
+        sem_cotacao = np.bincount(indices, weights=self.sem_cotacao[filtro], minlength=len(unicas))
+        return list(zip(unicas.tolist(), custos.tolist(), valores.tolist(), contagens.tolist(),
+                        sem_cotacao.astype(np.int64).tolist()))
+
+
+_cache = {}
+_trava = threading.Lock()
+
+
+def _versao_posicoes():
+    """Assinatura das posições: muda a cada operação registrada ou posição alterada."""
+    return tuple(session.execute(
+        select(func.count(), func.coalesce(func.max(Investimento.id_investimento), 0),
+               func.coalesce(func.sum(Investimento.quantidade), 0.0),
+               func.coalesce(func.sum(Investimento.quantidade * Investimento.preco_medio), 0.0),
+               select(func.coalesce(func.max(OperacaoInvestimento.id_operacao), 0)).scalar_subquery())
+    ).one())
+
+
+def _versao_precos(em):
+    """Assinatura das cotações até `em`: muda a cada importação (data_importacao é regravada)."""
+    return tuple(session.execute(
+        select(func.count(), func.max(PrecoAtivo.data_importacao)).where(PrecoAtivo.data <= em)
+    ).one())
+
+
+def _cotacoes(em):
+    """{simbolo: preço} com a cotação mais recente de cada ativo até `em`."""
+    ultima = select(PrecoAtivo.simbolo, func.max(PrecoAtivo.data).label("data"))\
+             .where(PrecoAtivo.data <= em).group_by(PrecoAtivo.simbolo).subquery()
+    return dict(session.execute(
+        select(PrecoAtivo.simbolo, PrecoAtivo.preco)
+        .join(ultima, and_(PrecoAtivo.simbolo == ultima.c.simbolo, PrecoAtivo.data == ultima.c.data))
+    ).all())
+
+
+def avaliar(em=None):
+    """
+    Avaliação de todas as posições abertas na data `em` (padrão: hoje). As
+    posições ficam em cache até uma nova operação; as cotações, até uma
+    nova importação. Com uma das duas mudando, só ela é relida e o cálculo
+    vetorizado é refeito. Devolve (avaliação, se veio do cache).
+    """
+    if np is None:
+        raise RuntimeError("A avaliação da carteira precisa do NumPy (pip install numpy).")
+    em = em or datetime.date.today()
+
+    versao_posicoes = _versao_posicoes()
+    versao_precos = _versao_precos(em)
+    versao = (versao_posicoes, versao_precos, em)
+    with _trava:
+        avaliacao = _cache.get("avaliacao")
+        posicoes = _cache.get("posicoes")
+    if avaliacao is not None and avaliacao.versao == versao:
+        return avaliacao, True
+
+    if posicoes is None or posicoes.versao != versao_posicoes:
+        posicoes = PosicoesColunares(versao_posicoes, session.execute(
+            select(Investimento.id_conta, Conta.id_usuario, Investimento.id_tipo_investimento,
+                   Investimento.simbolo, Investimento.quantidade, Investimento.preco_medio)
+            .join(Conta, Conta.id_conta == Investimento.id_conta)
+            .where(Investimento.quantidade != 0)
+        ).all())
+    avaliacao = Avaliacao(posicoes, _cotacoes(em), versao)
+    with _trava:
+        _cache["posicoes"] = posicoes
+        _cache["avaliacao"] = avaliacao
+    return avaliacao, False
+
+
+def invalidar():
+    """Descarta posições e avaliação em cache."""
+    with _trava:
+        _cache.clear()
+
+
+def carteira(id_usuario=None, id_conta=None, por="conta", data_str=None):
+    """
+    Mostra custo, valor de mercado e resultado das posições, agrupados por
+    conta, usuário, tipo de investimento ou ativo, com filtro opcional de
+    usuário ou conta.
+    """
+    try:
+        em = datetime.datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else None
+        inicio = time.perf_counter()
+        avaliacao, do_cache = avaliar(em)
+        posicoes = avaliacao.posicoes
+
+        filtro = np.ones(len(posicoes), dtype=bool)
+        if id_usuario is not None:
+            filtro &= posicoes.usuarios == id_usuario
+        if id_conta is not None:
+            filtro &= posicoes.contas == id_conta
+        grupos = avaliacao.agrupar(por, filtro)
+        decorrido = (time.perf_counter() - inicio) * 1000
+
+        tipos = referencias.obter().tipos_investimento
+        rotulos = {
+            "conta": lambda chave: f"Conta {chave}",
+            "usuario": lambda chave: f"Usuário {chave}",
+            "tipo": lambda chave: tipos.get(chave, f"Tipo {chave}"),
+            "ativo": lambda chave: posicoes.simbolos[chave] or "?",
+        }[por]
+
+        print(f"{int(filtro.sum())} posição(ões) avaliada(s) em {em or datetime.date.today()} "
+              f"({decorrido:.1f} ms{', cache' if do_cache else ''}).")
+        print(f"  {por.capitalize():<25} {'Posições':>8} {'Custo':>15} {'Valor':>15} {'Resultado':>15} {'%':>8}")
+        total_custo = total_valor = 0.0
+        for chave, custo, valor, qtd, sem_cotacao in grupos:
+            percentual = (valor / custo - 1) * 100 if custo else 0.0
+            aviso = f"  ({sem_cotacao} sem cotação)" if sem_cotacao else ""
+            print(f"  {rotulos(chave):<25} {qtd:>8} {custo:>15.2f} {valor:>15.2f} {valor - custo:>15.2f} "
+                  f"{percentual:>7.2f}%{aviso}")
+            total_custo += custo
+            total_valor += valor
+        percentual = (total_valor / total_custo - 1) * 100 if total_custo else 0.0
+        print(f"  {'Total':<25} {'':>8} {total_custo:>15.2f} {total_valor:>15.2f} "
+              f"{total_valor - total_custo:>15.2f} {percentual:>7.2f}%")
+        return grupos
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao avaliar a carteira: {e}")
+        return None
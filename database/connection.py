@@ -1,15 +1,77 @@
 # database/connection.py
 
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from config.settings import DB_URL  
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from config import settings
+from . import instrumentacao
 
 
-engine = create_engine(DB_URL, echo=False)
-
 Base = declarative_base()
 
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Tempo gasto criando o engine (inclui importar o driver) e abrindo conexões,
+# exibido pela opção --timing da CLI.
+ESTATISTICAS_CONEXAO = {"engine": 0.0, "conexao": 0.0}
+
+_engine = None
+
+
+def url_banco():
+    """URL do banco conforme settings.DB_BACKEND."""
+    if settings.DB_BACKEND == "sqlite":
+        return f"sqlite:///{settings.SQLITE_PATH}"
+    return settings.DB_URL
+
+
+def get_engine():
+    """
+    Cria o engine na primeira chamada. Comandos que não tocam no banco
+    (como --help) não pagam pela importação do driver nem pela conexão.
+    """
+    global _engine
+    if _engine is None:
+        inicio = time.perf_counter()
+        _engine = create_engine(url_banco(), echo=False)
+        ESTATISTICAS_CONEXAO["engine"] += time.perf_counter() - inicio
+
+        instrumentacao.instalar(_engine)
+
+        if _engine.dialect.name == "sqlite":
+            @event.listens_for(_engine, "connect")
+            def _aplicar_pragmas(dbapi_connection, conn_rec):
+                cursor = dbapi_connection.cursor()
+                for nome, valor in settings.SQLITE_PRAGMAS.items():
+                    cursor.execute(f"PRAGMA {nome}={valor}")
+                cursor.close()
+
+        @event.listens_for(_engine, "do_connect")
+        def _antes_de_conectar(dialect, conn_rec, cargs, cparams):
+            conn_rec.info["inicio_conexao"] = time.perf_counter()
+
+        @event.listens_for(_engine, "connect")
+        def _depois_de_conectar(dbapi_connection, conn_rec):
+            inicio_conexao = conn_rec.info.pop("inicio_conexao", None)
+            if inicio_conexao is not None:
+                ESTATISTICAS_CONEXAO["conexao"] += time.perf_counter() - inicio_conexao
+
+    return _engine
+
+
+def __getattr__(nome):
+    # Compatibilidade com 'from database.connection import engine'
+    if nome == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+class _SessaoEngineTardio(Session):
+    """Sessão que só pede o engine quando precisa executar algo."""
+
+    def get_bind(self, mapper=None, **kw):
+        return get_engine()
+
+
+SessionLocal = sessionmaker(class_=_SessaoEngineTardio, autocommit=False, autoflush=False)
 
-session = scoped_session(SessionLocal)
\ No newline at end of file
+session = scoped_session(SessionLocal)
@@ -0,0 +1,66 @@
+# database/diagnostico.py
+
+import datetime
+from sqlalchemy import text, select
+from .connection import get_engine
+from .models import Conta
+from .functions import consulta_balanco_usuario, consultas_orcamento, consulta_listar_transacoes
+from .procedures_triggers import SQL_SELECT_GASTOS_CATEGORIA, SQL_SELECT_TRANSACOES_CONTA
+
+
+def _prefixo_explain():
+    if get_engine().dialect.name == "sqlite":
+        return "EXPLAIN QUERY PLAN "
+    return "EXPLAIN "
+
+
+def _compilar(consulta):
+    """Converte um select do SQLAlchemy em SQL com os valores já embutidos."""
+    return str(consulta.compile(dialect=get_engine().dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _relatorios(conexao, id_usuario, id_conta, id_categoria, ano, mes):
+    """Lista (nome, sql, parametros) de cada relatório embutido na aplicação."""
+    if id_conta is None:
+        id_conta = conexao.execute(
+            select(Conta.id_conta).where(Conta.id_usuario == id_usuario).limit(1)
+        ).scalar()
+
+    inicio = datetime.date(ano, mes, 1)
+    fim = datetime.date(ano + mes // 12, mes % 12 + 1, 1)
+
+    com_orcamento, sem_orcamento = consultas_orcamento(id_usuario, ano, mes, ano, mes)
+
+    return [
+        ("getbalance", _compilar(consulta_balanco_usuario(id_usuario)), {}),
+        ("budgetreport (com orçamento)", _compilar(com_orcamento), {}),
+        ("budgetreport (sem orçamento)", _compilar(sem_orcamento), {}),
+        ("sp_calcular_gastos_categoria", SQL_SELECT_GASTOS_CATEGORIA, {
+            "p_id_usuario": id_usuario, "p_id_categoria": id_categoria,
+            "v_inicio": inicio, "v_fim": fim,
+        }),
+        ("sp_obter_transacoes_conta", SQL_SELECT_TRANSACOES_CONTA, {"p_id_conta": id_conta}),
+        ("listtransactions (página seguinte)",
+         _compilar(consulta_listar_transacoes(id_conta, 51, posicao=(fim, 2**31 - 1))), {}),
+    ]
+
+
+def explicar_relatorios(id_usuario, id_conta=None, id_categoria=1, ano=None, mes=None):
+    """
+    Imprime o plano de execução (EXPLAIN) de cada relatório embutido, para
+    conferir se os índices estão sendo usados com os dados reais.
+    """
+    hoje = datetime.date.today()
+    ano = ano or hoje.year
+    mes = mes or hoje.month
+
+    try:
+        with get_engine().connect() as conexao:
+            for nome, sql, parametros in _relatorios(conexao, id_usuario, id_conta, id_categoria, ano, mes):
+                print(f"\n== {nome} ==")
+                resultado = conexao.execute(text(_prefixo_explain() + sql), parametros)
+                for linha in resultado.mappings():
+                    print("  " + ", ".join(f"{coluna}={valor}" for coluna, valor in linha.items()
+                                           if valor is not None))
+    except Exception as e:
+        print(f"Erro ao explicar consultas: {e}")
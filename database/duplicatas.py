@@ -0,0 +1,219 @@
+# database/duplicatas.py
+
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from sqlalchemy import select, update, delete, insert, func, bindparam, exists, or_
+from .connection import get_engine
+from .models import Transacao, Transferencia, transacao_tag_association, transferencias_arquivo
+from . import arquivo
+from utils.helpers import agrupar_em_lotes
+from config.settings import IMPORT_TAMANHO_LOTE
+
+
+def normalizar_descricao(descricao):
+    """Minúsculas, sem acentos e com espaços simples: 'PADARIA  São João' == 'padaria sao joao'."""
+    texto = unicodedata.normalize("NFKD", descricao or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto).strip().lower()
+
+
+def impressao_digital(id_conta, data, valor, descricao):
+    """SHA-256 de (conta, data, valor com sinal em centavos, descrição normalizada)."""
+    texto = f"{int(id_conta)}|{data.isoformat()}|{round(valor * 100):d}|{normalizar_descricao(descricao)}"
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def contar_existentes(conexao, impressoes, data_inicio, data_fim):
+    """
+    {impressão: quantidade já gravada} numa única consulta pelo índice de
+    impressao_digital, só nas tabelas (transacoes e arquivos) que o
+    intervalo de datas do lote toca.
+    """
+    if not impressoes:
+        return Counter()
+    T = arquivo.transacoes_no_periodo(data_inicio, data_fim,
+                                      lambda T: [T.c.impressao_digital.in_(set(impressoes))], conexao)
+    return Counter(dict(conexao.execute(
+        select(T.c.impressao_digital, func.count()).group_by(T.c.impressao_digital)).all()))
+
+
+def descartar_duplicadas(conexao, linhas, ja_gravadas=None):
+    """
+    Separa as linhas (dicionários prontos para o INSERT, com a impressão
+    digital calculada se ainda não tiverem) em (novas, duplicadas). Uma
+    linha repetida N vezes no lote só é duplicada além das ocorrências que
+    já estão no banco: dois cafés iguais no mesmo dia continuam sendo dois
+    lançamentos.
+    `ja_gravadas` conta as impressões gravadas pela mesma importação em
+    lotes anteriores, que não devem contar como já existentes.
+    """
+    for linha in linhas:
+        if linha.get("impressao_digital") is None:
+            linha["impressao_digital"] = impressao_digital(linha["id_conta"], linha["data"], linha["valor"],
+                                                           linha["descricao"])
+    if not linhas:
+        return [], []
+    existentes = contar_existentes(conexao, [l["impressao_digital"] for l in linhas],
+                                   min(l["data"] for l in linhas), max(l["data"] for l in linhas))
+    if ja_gravadas:
+        existentes.subtract(ja_gravadas)
+
+    novas, duplicadas = [], []
+    for linha in linhas:
+        if existentes[linha["impressao_digital"]] > 0:
+            existentes[linha["impressao_digital"]] -= 1
+            duplicadas.append(linha)
+        else:
+            novas.append(linha)
+    return novas, duplicadas
+
+
+def preencher_impressoes(tamanho_lote=None):
+    """
+    Calcula a impressão digital das transações gravadas antes da coluna
+    existir (ou por procedures e triggers), em transacoes e nos arquivos.
+    Cada lote é lido pelo índice (impressao_digital IS NULL) e gravado com
+    um único executemany.
+    """
+    tamanho_lote = tamanho_lote or IMPORT_TAMANHO_LOTE
+    preenchidas = 0
+    engine = get_engine()
+    with engine.connect() as conexao:
+        tabelas = [tabela for tabela, _ in arquivo.segmentos(conexao=conexao)]
+        conexao.rollback()
+        for T in tabelas:
+            atualizar = update(T).where(T.c.id_transacao == bindparam("b_id"))\
+                        .values(impressao_digital=bindparam("b_impressao"))
+            while True:
+                with conexao.begin():
+                    linhas = conexao.execute(
+                        select(T.c.id_transacao, T.c.id_conta, T.c.data, T.c.valor, T.c.descricao)
+                        .where(T.c.impressao_digital.is_(None)).limit(tamanho_lote)).all()
+                    if not linhas:
+                        break
+                    conexao.execute(atualizar, [
+                        {"b_id": id_transacao, "b_impressao": impressao_digital(id_conta, data, valor, descricao)}
+                        for id_transacao, id_conta, data, valor, descricao in linhas
+                    ])
+                preenchidas += len(linhas)
+    return preenchidas
+
+
+def _grupos_duplicados(conexao):
+    """
+    [(impressão, [ids])] das impressões repetidas em transacoes e nos
+    arquivos: uma linha reimportada depois do 'archive' repete uma que já
+    foi arquivada. Cada ramo do UNION percorre o índice de impressao_digital
+    da sua tabela; as pernas de transferências ficam de fora (a chave do
+    lote já as protege).
+    """
+    tr = Transferencia.__table__
+    tra = transferencias_arquivo
+
+    def impressoes(T):
+        nao_transferencia = ~exists().where(or_(tr.c.id_transacao_debito == T.c.id_transacao,
+                                                tr.c.id_transacao_credito == T.c.id_transacao)) & \
+                            ~exists().where(or_(tra.c.id_transacao_debito == T.c.id_transacao,
+                                                tra.c.id_transacao_credito == T.c.id_transacao))
+        return select(T.c.impressao_digital, T.c.id_transacao)\
+               .where(T.c.impressao_digital.is_not(None), nao_transferencia)
+
+    todas = arquivo.unir([impressoes(T) for T, _ in arquivo.segmentos(conexao=conexao)], "impressoes")
+    repetidas = select(todas.c.impressao_digital)\
+                .group_by(todas.c.impressao_digital).having(func.count() > 1)\
+                .subquery()
+    grupos = {}
+    for impressao, id_transacao in conexao.execute(
+        select(todas.c.impressao_digital, todas.c.id_transacao)
+        .where(todas.c.impressao_digital.in_(select(repetidas.c.impressao_digital)))
+        .order_by(todas.c.impressao_digital, todas.c.id_transacao)
+    ):
+        grupos.setdefault(impressao, []).append(id_transacao)
+    return [(impressao, ids) for impressao, ids in grupos.items() if len(ids) > 1]
+
+
+def _mesclar(conexao, grupos):
+    """
+    Mantém a transação mais antiga (menor ID) de cada grupo, com a união
+    das tags, e apaga as demais. Em transacoes os triggers de DELETE
+    corrigem saldos, resumos e checkpoints; nos arquivos, arquivo.apagar.
+    """
+    ids = [id_transacao for _, grupo in grupos for id_transacao in grupo]
+    removidas = []
+    with conexao.begin():
+        # Tabela (e tabela de tags) de cada transação dos grupos
+        origem = {}
+        for T, tags in arquivo.segmentos(conexao=conexao):
+            for lote in agrupar_em_lotes(ids, IMPORT_TAMANHO_LOTE):
+                for id_transacao in conexao.execute(
+                        select(T.c.id_transacao).where(T.c.id_transacao.in_(lote))).scalars():
+                    origem[id_transacao] = (T, tags)
+
+        for _, (manter, *remover) in grupos:
+            tags_manter = origem[manter][1]
+            tags_mantidas = set(conexao.execute(
+                select(tags_manter.c.tag_id).where(tags_manter.c.transacao_id == manter)).scalars())
+            tags_novas = set()
+            for id_transacao in remover:
+                tags = origem[id_transacao][1]
+                tags_novas.update(conexao.execute(
+                    select(tags.c.tag_id).where(tags.c.transacao_id == id_transacao)).scalars())
+            if tags_novas - tags_mantidas:
+                conexao.execute(insert(tags_manter), [{"transacao_id": manter, "tag_id": id_tag}
+                                                      for id_tag in sorted(tags_novas - tags_mantidas)])
+            removidas.extend(remover)
+
+        tt = transacao_tag_association
+        por_tabela = {}
+        for id_transacao in removidas:
+            por_tabela.setdefault(origem[id_transacao][0], []).append(id_transacao)
+        for T, ids_tabela in por_tabela.items():
+            for lote in agrupar_em_lotes(ids_tabela, IMPORT_TAMANHO_LOTE):
+                if T is Transacao.__table__:
+                    conexao.execute(delete(tt).where(tt.c.transacao_id.in_(lote)))
+                    conexao.execute(delete(T).where(T.c.id_transacao.in_(lote)))
+                else:
+                    arquivo.apagar(conexao, T, lote)
+    return len(removidas)
+
+
+def deduplicar(mesclar=False, limite_exibicao=20):
+    """
+    Encontra transações duplicadas (mesma conta, data, valor e descrição
+    normalizada) pelo índice de impressao_digital. Com mesclar=True, mantém
+    uma de cada grupo e apaga as outras numa única transação.
+    """
+    try:
+        preenchidas = preencher_impressoes()
+        if preenchidas:
+            print(f"{preenchidas} impressão(ões) digital(is) calculada(s) para transações antigas.")
+
+        with get_engine().connect() as conexao:
+            grupos = _grupos_duplicados(conexao)
+            excedentes = sum(len(ids) - 1 for _, ids in grupos)
+            print(f"{len(grupos)} grupo(s) de transações duplicadas, {excedentes} transação(ões) a mais.")
+
+            ids_exibidos = [ids for _, ids in grupos[:limite_exibicao]]
+            if ids_exibidos:
+                T = arquivo.transacoes_no_periodo(
+                    condicoes=lambda T: [T.c.id_transacao.in_([ids[0] for ids in ids_exibidos])], conexao=conexao)
+                detalhes = {linha.id_transacao: linha for linha in conexao.execute(
+                    select(T.c.id_transacao, T.c.id_conta, T.c.data, T.c.valor, T.c.descricao))}
+                for ids in ids_exibidos:
+                    linha = detalhes[ids[0]]
+                    print(f"  Conta {linha.id_conta}  {linha.data}  R${linha.valor:>10.2f}  {linha.descricao or ''}"
+                          f"  -> IDs {', '.join(map(str, ids))}")
+                if len(grupos) > limite_exibicao:
+                    print(f"  ... e mais {len(grupos) - limite_exibicao} grupo(s).")
+            conexao.rollback()
+
+            if mesclar and grupos:
+                removidas = _mesclar(conexao, grupos)
+                print(f"{removidas} transação(ões) duplicada(s) removida(s); a mais antiga de cada grupo foi mantida.")
+        return grupos
+
+    except Exception as e:
+        print(f"Erro ao procurar transações duplicadas: {e}")
+        return None
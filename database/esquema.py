@@ -0,0 +1,310 @@
+# database/esquema.py
+
+import datetime
+import hashlib
+import re
+import time
+from collections import namedtuple
+from sqlalchemy import inspect, select, delete, insert, text
+from sqlalchemy.schema import CreateTable, CreateIndex, CreateColumn
+from .connection import get_engine, Base
+from .models import VersaoEsquema
+from .procedures_triggers import comandos_do_dialeto, nome_objeto, criar_procedures_e_triggers
+
+# Estados de um objeto no plano
+NOVO = "novo"              # não existe no banco
+ALTERADO = "alterado"      # existe, com definição diferente da registrada
+IGUAL = "igual"            # definição igual à registrada: não é tocado
+EXISTENTE = "existente"    # tabela criada antes do controle de versões: completa colunas e registra
+OBSOLETO = "obsoleto"      # registrado, mas não existe mais no código
+
+ItemPlano = namedtuple("ItemPlano", ["nome", "tipo", "estado", "hash", "objeto"])
+
+
+def _hash(definicao):
+    """SHA-256 da definição, sem diferenças de espaços e quebras de linha."""
+    return hashlib.sha256(re.sub(r"\s+", " ", definicao).strip().encode("utf-8")).hexdigest()
+
+
+def _do_dialeto(indice, dialeto):
+    """False para índices restritos a outro dialeto com .ddl_if(dialect=...)."""
+    condicao = getattr(indice, "_ddl_if", None)
+    if condicao is None or condicao.dialect is None:
+        return True
+    dialetos = [condicao.dialect] if isinstance(condicao.dialect, str) else condicao.dialect
+    return dialeto in dialetos
+
+
+def _definicoes(engine):
+    """
+    (nome, tipo, definição, objeto) de tudo o que o initdb cria: tabelas e
+    índices do models.py, compilados para o dialeto, e as tabelas de log,
+    procedures e triggers de procedures_triggers.py.
+    """
+    dialeto = engine.dialect
+    for tabela in Base.metadata.sorted_tables:
+        yield tabela.name, "tabela", str(CreateTable(tabela).compile(dialect=dialeto)), tabela
+    for tabela in Base.metadata.sorted_tables:
+        for indice in sorted(tabela.indexes, key=lambda i: i.name):
+            if not _do_dialeto(indice, dialeto.name):
+                continue
+            yield indice.name, "indice", str(CreateIndex(indice).compile(dialect=dialeto)), indice
+    for sql in comandos_do_dialeto(dialeto.name):
+        tipo, nome = nome_objeto(sql)
+        yield nome, tipo, sql, sql
+
+
+def _registrados(conexao, tabelas_existentes):
+    """{nome: (tipo, hash)} gravado no último initdb (vazio na primeira vez)."""
+    if VersaoEsquema.__tablename__ not in tabelas_existentes:
+        return {}
+    return {
+        nome: (tipo, hash_registrado)
+        for nome, tipo, hash_registrado in conexao.execute(
+            select(VersaoEsquema.nome, VersaoEsquema.tipo, VersaoEsquema.hash))
+    }
+
+
+def _sql_tabelas(conexao):
+    """{nome: CREATE TABLE} das tabelas do SQLite (vazio nos outros bancos)."""
+    if conexao.dialect.name != "sqlite":
+        return {}
+    return dict(conexao.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'table'")).all())
+
+
+def _triggers_e_procedures(conexao):
+    """{nome: tipo} dos triggers e procedures que existem de fato no banco."""
+    if conexao.dialect.name == "sqlite":
+        return {nome: "trigger" for nome in conexao.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars()}
+    existentes = {nome: "trigger" for nome in conexao.execute(
+        text("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()")).scalars()}
+    existentes.update({nome: "procedure" for nome in conexao.execute(
+        text("SELECT ROUTINE_NAME FROM information_schema.ROUTINES "
+             "WHERE ROUTINE_SCHEMA = DATABASE() AND ROUTINE_TYPE = 'PROCEDURE'")).scalars()})
+    return existentes
+
+
+def planejar(forcar=False):
+    """
+    Compara a impressão digital de cada objeto com a registrada em
+    versoes_esquema e devolve (itens do plano, milissegundos gastos). O
+    registro não basta: tabelas com colunas do modelo faltando no banco (ou
+    sem o AUTOINCREMENT do modelo, no SQLite) ficam ALTERADO e índices, triggers, procedures e tabelas de log
+    registrados que não existem mais no banco voltam a ser NOVO. Consulta o
+    catálogo (colunas e índices de todas as tabelas de uma vez), a lista de
+    triggers e procedures e a tabela de versões.
+    Com forcar=True, procedures e triggers são recriados mesmo sem mudança.
+    """
+    inicio = time.perf_counter()
+    engine = get_engine()
+    with engine.connect() as conexao:
+        inspetor = inspect(conexao)
+        tabelas_existentes = set(inspetor.get_table_names())
+        colunas_existentes = {tabela: {coluna["name"] for coluna in colunas}
+                              for (_, tabela), colunas in inspetor.get_multi_columns().items()}
+        objetos_existentes = _triggers_e_procedures(conexao)
+        sql_tabelas = _sql_tabelas(conexao)
+        indices_existentes = {indice["name"] for indices in inspetor.get_multi_indexes().values()
+                              for indice in indices}
+        registrados = _registrados(conexao, tabelas_existentes)
+
+    itens = []
+    nomes_atuais = set()
+    for nome, tipo, definicao, objeto in _definicoes(engine):
+        nomes_atuais.add(nome)
+        atual = _hash(definicao)
+        _, anterior = registrados.get(nome, (None, None))
+
+        if tipo == "tabela" and not isinstance(objeto, str):
+            if nome not in tabelas_existentes:
+                estado = NOVO
+            elif anterior is None:
+                estado = EXISTENTE
+            elif (anterior != atual or {c.name for c in objeto.columns} - colunas_existentes.get(nome, set())
+                  or _falta_autoincremento(engine, objeto, sql_tabelas)):
+                estado = ALTERADO
+            else:
+                estado = IGUAL
+        elif anterior is None:
+            estado = NOVO
+        elif tipo == "indice" and nome not in indices_existentes:
+            estado = NOVO
+        elif tipo in ("procedure", "trigger") and objetos_existentes.get(nome) != tipo:
+            estado = NOVO   # registrado, mas removido do banco (ex.: DROP TRIGGER manual)
+        elif tipo == "tabela" and nome not in tabelas_existentes:
+            estado = NOVO
+        elif anterior != atual or (forcar and tipo in ("procedure", "trigger")):
+            estado = ALTERADO
+        else:
+            estado = IGUAL
+        itens.append(ItemPlano(nome, tipo, estado, atual, objeto))
+
+    for nome, (tipo, anterior) in sorted(registrados.items()):
+        if nome not in nomes_atuais:
+            itens.append(ItemPlano(nome, tipo, OBSOLETO, anterior, None))
+
+    return itens, (time.perf_counter() - inicio) * 1000
+
+
+def imprimir_plano(itens, milissegundos):
+    mudancas = [item for item in itens if item.estado != IGUAL]
+    print(f"Esquema verificado em {milissegundos:.1f} ms: {len(itens) - len(mudancas)} objeto(s) sem mudança, "
+          f"{len(mudancas)} a tocar.")
+    for item in mudancas:
+        observacao = ""
+        if item.estado == ALTERADO and item.tipo == "tabela":
+            observacao = " (colunas novas são adicionadas; outras mudanças exigem migração manual)"
+        elif item.estado == EXISTENTE:
+            observacao = " (já existe; adiciona colunas que faltam e registra a versão)"
+        print(f"  {item.estado:<9} {item.tipo:<9} {item.nome}{observacao}")
+
+
+def adicionar_colunas(engine, tabela):
+    """
+    ALTER TABLE ADD COLUMN para as colunas do modelo que ainda não existem
+    na tabela (consultadas pelo inspector). Devolve os nomes adicionados.
+    """
+    existentes = {coluna["name"] for coluna in inspect(engine).get_columns(tabela.name)}
+    novas = [coluna for coluna in tabela.columns if coluna.name not in existentes]
+    with engine.begin() as conexao:
+        for coluna in novas:
+            if not coluna.nullable and coluna.server_default is None:
+                raise ValueError(f"coluna {tabela.name}.{coluna.name} é NOT NULL sem valor padrão")
+            definicao = CreateColumn(coluna).compile(dialect=engine.dialect)
+            conexao.execute(text(f"ALTER TABLE {tabela.name} ADD COLUMN {definicao}"))
+    return [coluna.name for coluna in novas]
+
+
+def _falta_autoincremento(engine, tabela, sql_tabelas=None):
+    """
+    True se o modelo pede sqlite_autoincrement e a tabela no SQLite foi
+    criada sem ele. `sql_tabelas` evita a consulta quando o catálogo já foi lido.
+    """
+    if engine.dialect.name != "sqlite" or not tabela.dialect_options["sqlite"]["autoincrement"]:
+        return False
+    if sql_tabelas is None:
+        with engine.connect() as conexao:
+            sql_tabelas = _sql_tabelas(conexao)
+    sql = sql_tabelas.get(tabela.name)
+    return sql is not None and "AUTOINCREMENT" not in sql.upper()
+
+
+def recriar_com_autoincremento(engine, tabela):
+    """
+    No SQLite, AUTOINCREMENT só pode ser declarado no CREATE TABLE: recria
+    a tabela com ele e copia as linhas, mantendo os IDs. As chaves
+    estrangeiras ficam desligadas durante a troca, para que o DROP não
+    apague em cascata as linhas que apontam para a tabela. Índices e
+    triggers da tabela somem com o DROP; aplicar() os recria.
+    """
+    nova = f"{tabela.name}_nova"
+    criar = str(CreateTable(tabela).compile(dialect=engine.dialect))\
+        .replace(f"CREATE TABLE {tabela.name} ", f"CREATE TABLE {nova} ", 1)
+    colunas = ", ".join(coluna.name for coluna in tabela.columns)
+    with engine.connect() as conexao:
+        # O script precisa de BEGIN/COMMIT explícitos: o PRAGMA foreign_keys não vale dentro de uma transação
+        bruta = conexao.connection.driver_connection
+        chaves_estrangeiras = bruta.execute("PRAGMA foreign_keys").fetchone()[0]
+        try:
+            bruta.executescript(f"""
+                PRAGMA foreign_keys = OFF;
+                PRAGMA legacy_alter_table = ON;
+                BEGIN;
+                {criar};
+                INSERT INTO {nova} ({colunas}) SELECT {colunas} FROM {tabela.name};
+                DROP TABLE {tabela.name};
+                ALTER TABLE {nova} RENAME TO {tabela.name};
+                COMMIT;
+            """)
+        except Exception:
+            if bruta.in_transaction:
+                bruta.rollback()
+            raise
+        finally:
+            bruta.executescript(f"PRAGMA legacy_alter_table = OFF; PRAGMA foreign_keys = {chaves_estrangeiras};")
+
+
+_PADRAO_TABELA_DO_TRIGGER = re.compile(r"\b(?:INSERT|UPDATE|DELETE)\s+(?:OF\s+[\w\s,]+?\s+)?ON\s+(\w+)",
+                                       re.IGNORECASE)
+
+
+def _da_tabela(sql, tabelas):
+    """True se o SQL cria um trigger de uma das tabelas."""
+    encontrado = _PADRAO_TABELA_DO_TRIGGER.search(sql)
+    return encontrado is not None and encontrado.group(1) in tabelas
+
+
+def aplicar(itens):
+    """
+    Executa o plano: cria tabelas novas, recria índices, procedures e
+    triggers novos ou alterados, remove procedures e triggers obsoletos e
+    grava as novas impressões digitais. Objetos iguais não são tocados,
+    então um initdb sem mudanças não faz DROP/CREATE TRIGGER nenhum.
+    Devolve os itens efetivamente aplicados.
+    """
+    engine = get_engine()
+    aplicados = []
+
+    tabelas_novas = [item.objeto for item in itens if item.tipo == "tabela" and item.estado == NOVO
+                     and not isinstance(item.objeto, str)]
+    if tabelas_novas:
+        Base.metadata.create_all(engine, tables=tabelas_novas)
+        print(f"{len(tabelas_novas)} tabela(s) criada(s).")
+    recriadas = set()
+    for item in itens:
+        if item.tipo == "tabela" and not isinstance(item.objeto, str) and item.estado == NOVO:
+            aplicados.append(item)
+        elif item.tipo == "tabela" and not isinstance(item.objeto, str) and item.estado in (EXISTENTE, ALTERADO):
+            # Banco anterior ao controle de versões: pode faltar coluna que os índices abaixo usam
+            adicionadas = adicionar_colunas(engine, item.objeto)
+            if adicionadas:
+                print(f"Tabela '{item.nome}': coluna(s) {', '.join(adicionadas)} adicionada(s).")
+            if _falta_autoincremento(engine, item.objeto):
+                recriar_com_autoincremento(engine, item.objeto)
+                recriadas.add(item.nome)
+                print(f"Tabela '{item.nome}' recriada com AUTOINCREMENT (IDs arquivados não são reaproveitados).")
+            if item.estado == EXISTENTE or adicionadas or item.nome in recriadas:
+                aplicados.append(item)
+            else:
+                print(f"Aviso: a definição da tabela '{item.nome}' mudou; aplique a migração manualmente.")
+
+    # Índices e triggers das tabelas recriadas foram junto com o DROP
+    indices = [item for item in itens if item.tipo == "indice"
+               and (item.estado in (NOVO, ALTERADO) or item.objeto.table.name in recriadas)]
+    for item in indices:
+        if item.estado == ALTERADO:
+            item.objeto.drop(engine, checkfirst=True)
+        # checkfirst: o índice pode existir de um initdb anterior ao controle de versões
+        item.objeto.create(engine, checkfirst=True)
+        aplicados.append(item)
+    if indices:
+        print(f"{len(indices)} índice(s) criado(s) ou recriado(s).")
+
+    sql = [item for item in itens if isinstance(item.objeto, str)
+           and (item.estado in (NOVO, ALTERADO) or _da_tabela(item.objeto, recriadas))]
+    if sql and criar_procedures_e_triggers([item.objeto for item in sql]):
+        aplicados.extend(sql)
+
+    obsoletos = [item for item in itens if item.estado == OBSOLETO]
+    with engine.begin() as conexao:
+        for item in obsoletos:
+            if item.tipo in ("procedure", "trigger"):
+                if item.tipo == "procedure" and engine.dialect.name != "mysql":
+                    continue
+                conexao.execute(text(f"DROP {item.tipo.upper()} IF EXISTS {item.nome}"))
+                print(f"{item.tipo.capitalize()} obsoleto '{item.nome}' removido.")
+            else:
+                print(f"Aviso: {item.tipo} '{item.nome}' não existe mais no código; remova-o manualmente.")
+
+        gravar = aplicados + obsoletos
+        if gravar:
+            conexao.execute(delete(VersaoEsquema.__table__)
+                            .where(VersaoEsquema.nome.in_([item.nome for item in gravar])))
+        if aplicados:
+            agora = datetime.datetime.now(datetime.timezone.utc)
+            conexao.execute(insert(VersaoEsquema.__table__), [
+                {"nome": item.nome, "tipo": item.tipo, "hash": item.hash, "data_atualizacao": agora}
+                for item in aplicados
+            ])
+    return aplicados
@@ -0,0 +1,141 @@
+# database/exportacao.py
+
+import csv
+import datetime
+import gzip
+import itertools
+import json
+import time
+from sqlalchemy import select
+from .connection import get_engine
+from .models import Conta, Categoria, Tag
+from . import arquivo
+from config.settings import EXPORT_TAMANHO_LOTE
+
+COLUNAS = ["id_transacao", "data", "valor", "descricao", "id_conta", "id_categoria", "categoria", "tags"]
+
+
+def consulta_exportacao(id_usuario=None, id_conta=None, data_inicio=None, data_fim=None,
+                        apos_id=None, limite=EXPORT_TAMANHO_LOTE):
+    """
+    SELECT de uma página de transações com categoria e tags, de transacoes e
+    dos anos arquivados que o intervalo toca. A paginação é por chave
+    (id_transacao > apos_id): cada tabela contribui com no máximo `limite`
+    transações lidas pela chave primária, e só então as tags são juntadas.
+    Uma transação com várias tags vem em várias linhas consecutivas, que
+    são juntadas em _agrupar_tags sem precisar de GROUP BY no banco.
+    """
+    ramos = []
+    for T, tags in arquivo.segmentos(data_inicio, data_fim):
+        pagina = select(T.c.id_transacao, T.c.data, T.c.valor, T.c.descricao, T.c.id_conta, T.c.id_categoria)
+        if id_usuario is not None:
+            pagina = pagina.where(T.c.id_conta.in_(select(Conta.id_conta).where(Conta.id_usuario == id_usuario)))
+        if id_conta is not None:
+            pagina = pagina.where(T.c.id_conta == id_conta)
+        if data_inicio is not None:
+            pagina = pagina.where(T.c.data >= data_inicio)
+        if data_fim is not None:
+            pagina = pagina.where(T.c.data <= data_fim)
+        if apos_id is not None:
+            pagina = pagina.where(T.c.id_transacao > apos_id)
+        pagina = pagina.order_by(T.c.id_transacao).limit(limite).subquery()
+        ramos.append(select(pagina, tags.c.tag_id)
+                     .outerjoin(tags, tags.c.transacao_id == pagina.c.id_transacao))
+
+    transacoes = arquivo.unir(ramos)
+    return select(transacoes.c.id_transacao, transacoes.c.data, transacoes.c.valor, transacoes.c.descricao,
+                  transacoes.c.id_conta, transacoes.c.id_categoria, Categoria.nome, Tag.nome)\
+           .join(Categoria, Categoria.id_categoria == transacoes.c.id_categoria)\
+           .outerjoin(Tag, Tag.id_tag == transacoes.c.tag_id)\
+           .order_by(transacoes.c.id_transacao)
+
+
+def _paginas(conexao, filtros, limite):
+    """
+    Gera as transações página por página, uma consulta por `limite`
+    transações. Com arquivos, a consulta pode trazer mais que `limite`
+    transações (cada tabela contribui com até `limite`); só as primeiras
+    são exportadas e a próxima página começa depois da última delas.
+    """
+    apos_id = None
+    while True:
+        resultado = conexao.execute(consulta_exportacao(*filtros, apos_id=apos_id, limite=limite))
+        pagina = list(itertools.islice(_agrupar_tags(resultado), limite))
+        resultado.close()
+        yield from pagina
+        if len(pagina) < limite:
+            return
+        apos_id = pagina[-1]["id_transacao"]
+
+
+def _agrupar_tags(resultado):
+    """Gera um dicionário por transação, juntando as tags das linhas repetidas."""
+    atual = None
+    for id_transacao, data, valor, descricao, id_conta, id_categoria, categoria, tag in resultado:
+        if atual is not None and atual["id_transacao"] != id_transacao:
+            yield atual
+            atual = None
+        if atual is None:
+            atual = {
+                "id_transacao": id_transacao,
+                "data": data.isoformat(),
+                "valor": valor,
+                "descricao": descricao,
+                "id_conta": id_conta,
+                "id_categoria": id_categoria,
+                "categoria": categoria,
+                "tags": [],
+            }
+        if tag is not None:
+            atual["tags"].append(tag)
+    if atual is not None:
+        yield atual
+
+
+def _abrir_saida(caminho, compactar):
+    if compactar or caminho.endswith(".gz"):
+        return gzip.open(caminho, "wt", encoding="utf-8", newline="")
+    return open(caminho, "w", encoding="utf-8", newline="")
+
+
+def exportar_transacoes(caminho, formato="csv", id_usuario=None, id_conta=None,
+                        data_inicio=None, data_fim=None, compactar=False):
+    """
+    Exporta transações para CSV ou JSONL em streaming: as linhas vêm do
+    banco em páginas de EXPORT_TAMANHO_LOTE transações (paginação por
+    chave, que funciona com qualquer driver) e são escritas à medida que
+    chegam, então a memória usada não depende do total exportado.
+    """
+    try:
+        if data_inicio:
+            data_inicio = datetime.datetime.strptime(data_inicio, '%Y-%m-%d').date()
+        if data_fim:
+            data_fim = datetime.datetime.strptime(data_fim, '%Y-%m-%d').date()
+
+        filtros = (id_usuario, id_conta, data_inicio, data_fim)
+        exportadas = 0
+        inicio = time.perf_counter()
+
+        with get_engine().connect() as conexao, _abrir_saida(caminho, compactar) as saida:
+            transacoes = _paginas(conexao, filtros, EXPORT_TAMANHO_LOTE)
+
+            if formato == "jsonl":
+                for transacao in transacoes:
+                    saida.write(json.dumps(transacao, ensure_ascii=False) + "\n")
+                    exportadas += 1
+            else:
+                escritor = csv.writer(saida)
+                escritor.writerow(COLUNAS)
+                for transacao in transacoes:
+                    transacao["tags"] = ";".join(transacao["tags"])
+                    escritor.writerow([transacao[coluna] for coluna in COLUNAS])
+                    exportadas += 1
+
+        decorrido = time.perf_counter() - inicio
+        print(f"Exportação concluída: {exportadas} transações em {decorrido:.2f}s "
+              f"({exportadas / decorrido if decorrido else 0:.0f} transações/s).")
+        return exportadas
+
+    except Exception as e:
+        print(f"Erro ao exportar transações: {e}")
+        return None
@@ -0,0 +1,236 @@
+# database/extratos.py
+
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, func, case
+from .connection import get_engine, SessionLocal
+from .models import (Usuario, Conta, SaldoConta, ResumoMensalCategoria, Meta, Investimento,
+                     TipoInvestimento)
+from . import referencias, arquivo
+from utils.helpers import agrupar_em_lotes
+from config.settings import EXTRATO_TRABALHADORES, EXTRATO_USUARIOS_POR_FAIXA
+
+
+def _periodo(ano, mes):
+    inicio = datetime.date(ano, mes, 1)
+    fim = datetime.date(ano + mes // 12, mes % 12 + 1, 1) - datetime.timedelta(days=1)
+    return inicio, fim
+
+
+def _dados_da_faixa(sessao, primeiro, ultimo, inicio, fim):
+    """
+    Tudo o que os extratos dos usuários de IDs [primeiro, ultimo] precisam,
+    em seis consultas por faixa (nenhum lazy load por usuário ou conta).
+    """
+    na_faixa = Usuario.id_usuario.between(primeiro, ultimo)
+    contas_da_faixa = select(Conta.id_conta).where(Conta.id_usuario.between(primeiro, ultimo))
+
+    usuarios = {
+        id_usuario: {"id_usuario": id_usuario, "nome": nome, "email": email, "contas": [],
+                     "gastos_por_categoria": [], "metas": [], "investimentos": []}
+        for id_usuario, nome, email in sessao.execute(
+            select(Usuario.id_usuario, Usuario.nome, Usuario.email).where(na_faixa).order_by(Usuario.id_usuario))
+    }
+
+    # Movimento do mês e tudo o que veio depois dele, que sai do saldo mantido
+    # pelos triggers para chegar ao saldo de fechamento
+    T = arquivo.transacoes_no_periodo(inicio, None, lambda T: [T.c.id_conta.in_(contas_da_faixa)], sessao)
+    no_mes = T.c.data <= fim
+    movimentos = {
+        id_conta: (entradas or 0.0, saidas or 0.0, posteriores or 0.0, qtd or 0)
+        for id_conta, entradas, saidas, posteriores, qtd in sessao.execute(
+            select(T.c.id_conta,
+                   func.sum(case((no_mes & (T.c.valor > 0), T.c.valor), else_=0.0)),
+                   func.sum(case((no_mes & (T.c.valor < 0), T.c.valor), else_=0.0)),
+                   func.sum(case((~no_mes, T.c.valor), else_=0.0)),
+                   func.sum(case((no_mes, 1), else_=0)))
+            .group_by(T.c.id_conta))
+    }
+
+    for id_conta, id_usuario, nome_conta, tipo_conta, saldo_inicial, saldo in sessao.execute(
+        select(Conta.id_conta, Conta.id_usuario, Conta.nome_conta, Conta.tipo_conta, Conta.saldo_inicial,
+               func.coalesce(SaldoConta.saldo, 0.0))
+        .outerjoin(SaldoConta, SaldoConta.id_conta == Conta.id_conta)
+        .where(Conta.id_usuario.between(primeiro, ultimo))
+        .order_by(Conta.id_conta)
+    ):
+        entradas, saidas, posteriores, qtd = movimentos.get(id_conta, (0.0, 0.0, 0.0, 0))
+        fechamento = (saldo_inicial or 0.0) + saldo - posteriores
+        usuarios[id_usuario]["contas"].append({
+            "id_conta": id_conta, "nome": nome_conta, "tipo": tipo_conta,
+            "saldo_abertura": round(fechamento - entradas - saidas, 2), "entradas": round(entradas, 2),
+            "saidas": round(saidas, 2), "saldo_fechamento": round(fechamento, 2), "transacoes": qtd,
+        })
+
+    categorias = referencias.obter().categorias
+    R = ResumoMensalCategoria
+    for id_usuario, id_categoria, total, qtd in sessao.execute(
+        select(R.id_usuario, R.id_categoria, R.total, R.qtd_transacoes)
+        .where(R.id_usuario.between(primeiro, ultimo), R.ano == inicio.year, R.mes == inicio.month,
+               R.qtd_transacoes > 0)
+        .order_by(R.id_usuario, R.total)
+    ):
+        nome, tipo = categorias.get(id_categoria, (f"Categoria {id_categoria}", None))
+        if tipo == "Despesa" and id_usuario in usuarios:
+            usuarios[id_usuario]["gastos_por_categoria"].append(
+                {"categoria": nome, "total": round(-total, 2), "transacoes": qtd})
+
+    for id_usuario, nome, objetivo, atual, data_limite in sessao.execute(
+        select(Meta.id_usuario, Meta.nome, Meta.valor_objetivo, Meta.valor_atual, Meta.data_limite)
+        .where(Meta.id_usuario.between(primeiro, ultimo)).order_by(Meta.id_usuario, Meta.id_meta)
+    ):
+        if id_usuario in usuarios:
+            usuarios[id_usuario]["metas"].append({
+                "nome": nome, "objetivo": objetivo, "atual": atual or 0.0,
+                "progresso": round((atual or 0.0) / objetivo * 100, 1) if objetivo else 0.0,
+                "data_limite": data_limite.isoformat() if data_limite else None,
+            })
+
+    for id_usuario, simbolo, tipo, quantidade, preco_medio in sessao.execute(
+        select(Conta.id_usuario, Investimento.simbolo, TipoInvestimento.nome,
+               Investimento.quantidade, Investimento.preco_medio)
+        .join(Conta, Conta.id_conta == Investimento.id_conta)
+        .join(TipoInvestimento, TipoInvestimento.id_tipo_investimento == Investimento.id_tipo_investimento)
+        .where(Conta.id_usuario.between(primeiro, ultimo))
+        .order_by(Conta.id_usuario, Investimento.simbolo)
+    ):
+        if id_usuario in usuarios:
+            usuarios[id_usuario]["investimentos"].append({
+                "simbolo": simbolo, "tipo": tipo, "quantidade": quantidade or 0.0,
+                "preco_medio": preco_medio or 0.0,
+                "custo": round((quantidade or 0.0) * (preco_medio or 0.0), 2),
+            })
+
+    return list(usuarios.values())
+
+
+def _texto_extrato(extrato, inicio, fim):
+    linhas = [f"Extrato de {inicio:%m/%Y} ({inicio.isoformat()} a {fim.isoformat()})",
+              f"{extrato['nome']} <{extrato['email']}> - Usuário ID {extrato['id_usuario']}", ""]
+
+    linhas.append("Contas:")
+    for conta in extrato["contas"]:
+        linhas.append(f"  {conta['nome']:<25} abertura R${conta['saldo_abertura']:>12.2f}  "
+                      f"entradas R${conta['entradas']:>10.2f}  saídas R${conta['saidas']:>10.2f}  "
+                      f"fechamento R${conta['saldo_fechamento']:>12.2f}")
+    total = sum(conta["saldo_fechamento"] for conta in extrato["contas"])
+    linhas.append(f"  {'Saldo total':<25} R${total:.2f}")
+
+    linhas.append("")
+    linhas.append("Gastos por categoria:")
+    for gasto in extrato["gastos_por_categoria"] or []:
+        linhas.append(f"  {gasto['categoria']:<25} R${gasto['total']:>10.2f}  ({gasto['transacoes']} transação(ões))")
+    if not extrato["gastos_por_categoria"]:
+        linhas.append("  Nenhum gasto no mês.")
+
+    if extrato["metas"]:
+        linhas.append("")
+        linhas.append("Metas:")
+        for meta in extrato["metas"]:
+            limite = f", até {meta['data_limite']}" if meta["data_limite"] else ""
+            linhas.append(f"  {meta['nome']:<25} R${meta['atual']:.2f} de R${meta['objetivo']:.2f} "
+                          f"({meta['progresso']:.1f}%{limite})")
+
+    if extrato["investimentos"]:
+        linhas.append("")
+        linhas.append("Investimentos:")
+        for posicao in extrato["investimentos"]:
+            linhas.append(f"  {posicao['simbolo'] or '?':<10} {posicao['tipo']:<20} {posicao['quantidade']:>12.4f} "
+                          f"x R${posicao['preco_medio']:.2f} = R${posicao['custo']:.2f}")
+    return "\n".join(linhas) + "\n"
+
+
+def _escrever(extrato, diretorio, formato, inicio, fim):
+    caminho = os.path.join(diretorio, f"extrato_{inicio:%Y-%m}_usuario_{extrato['id_usuario']}.{formato}")
+    with open(caminho, "w", encoding="utf-8") as saida:
+        if formato == "json":
+            json.dump({"periodo": [inicio.isoformat(), fim.isoformat()], **extrato}, saida, ensure_ascii=False,
+                      indent=2)
+        else:
+            saida.write(_texto_extrato(extrato, inicio, fim))
+
+
+def gerar_extratos(ano=None, mes=None, diretorio="extratos", trabalhadores=None, usuarios_por_faixa=None,
+                   formato="txt"):
+    """
+    Gera o extrato mensal de todos os usuários, um arquivo por usuário. Os
+    IDs são divididos em faixas contíguas, processadas por um pool de
+    threads em que cada trabalhador tem a sua própria sessão (a sessão
+    global da CLI não é compartilhada entre threads). Cada faixa custa seis
+    consultas agregadas, independentemente de quantos usuários tem.
+    """
+    trabalhadores = trabalhadores or EXTRATO_TRABALHADORES
+    usuarios_por_faixa = usuarios_por_faixa or EXTRATO_USUARIOS_POR_FAIXA
+    try:
+        if ano is None:
+            # Fechamento do mês anterior
+            anterior = datetime.date.today().replace(day=1) - datetime.timedelta(days=1)
+            ano, mes = anterior.year, anterior.month
+        inicio, fim = _periodo(ano, mes)
+        os.makedirs(diretorio, exist_ok=True)
+
+        engine = get_engine()
+        referencias.obter()
+        with engine.connect() as conexao:
+            ids = list(conexao.execute(select(Usuario.id_usuario).order_by(Usuario.id_usuario)).scalars())
+        faixas = [(lote[0], lote[-1]) for lote in agrupar_em_lotes(ids, usuarios_por_faixa)]
+        if not faixas:
+            print("Nenhum usuário cadastrado.")
+            return {}
+
+        local = threading.local()
+        sessoes = []
+        estatisticas = {}
+        trava = threading.Lock()
+
+        def processar(faixa):
+            sessao = getattr(local, "sessao", None)
+            if sessao is None:
+                sessao = local.sessao = SessionLocal(bind=engine)
+                with trava:
+                    sessoes.append(sessao)
+            inicio_consulta = time.perf_counter()
+            try:
+                extratos = _dados_da_faixa(sessao, faixa[0], faixa[1], inicio, fim)
+            finally:
+                sessao.rollback()
+            inicio_escrita = time.perf_counter()
+            for extrato in extratos:
+                _escrever(extrato, diretorio, formato, inicio, fim)
+            termino = time.perf_counter()
+
+            nome = threading.current_thread().name
+            with trava:
+                stats = estatisticas.setdefault(nome, {"faixas": 0, "usuarios": 0, "consulta": 0.0, "escrita": 0.0})
+                stats["faixas"] += 1
+                stats["usuarios"] += len(extratos)
+                stats["consulta"] += inicio_escrita - inicio_consulta
+                stats["escrita"] += termino - inicio_escrita
+            return len(extratos)
+
+        print(f"Gerando extratos de {inicio:%m/%Y} para {len(ids)} usuário(s) em {len(faixas)} faixa(s) "
+              f"com {trabalhadores} trabalhador(es)...")
+        comeco = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="extratos") as pool:
+                gerados = sum(pool.map(processar, faixas))
+        finally:
+            for sessao in sessoes:
+                sessao.close()
+        decorrido = time.perf_counter() - comeco
+
+        print(f"{gerados} extrato(s) gravado(s) em '{diretorio}' em {decorrido:.2f}s "
+              f"({gerados / decorrido if decorrido else 0:.0f} usuários/s).")
+        print(f"  {'Trabalhador':<14} {'Faixas':>6} {'Usuários':>9} {'Consultas (s)':>14} {'Escrita (s)':>12}")
+        for nome, stats in sorted(estatisticas.items()):
+            print(f"  {nome:<14} {stats['faixas']:>6} {stats['usuarios']:>9} "
+                  f"{stats['consulta']:>14.2f} {stats['escrita']:>12.2f}")
+        return estatisticas
+
+    except Exception as e:
+        print(f"Erro ao gerar extratos: {e}")
+        return None
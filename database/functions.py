@@ -1,10 +1,97 @@
 
 from .connection import session 
-from .models import Usuario, Conta, Categoria, Transacao, Tag
+from . import referencias
+from . import arquivo
+from .duplicatas import impressao_digital
+from .models import Usuario, Conta, Categoria, Transacao, Tag, SaldoConta, Orcamento, ResumoMensalCategoria, TipoInvestimento
 from utils.helpers import hash_senha, verificar_senha 
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func
+from sqlalchemy import func, select, delete, insert, extract, and_, or_, exists, null, literal
+import base64
+import contextlib
 import datetime
+import threading
+
+
+# Unidade de trabalho: dentro de um grupo (comando 'batch' ou criar_usuario),
+# as funções abaixo só fazem flush e o commit acontece uma vez para o grupo.
+_estado = threading.local()
+
+# Devolvido por adicionar_transacao(ignorar_repetida=True) quando a transação
+# já estava gravada: não é None (não é falha), mas nada foi lançado
+TRANSACAO_REPETIDA = "repetida"
+
+
+def _grupo():
+    return getattr(_estado, "grupo", None)
+
+
+def iniciar_grupo():
+    """Abre um grupo: até confirmar_grupo(), nenhuma função faz commit."""
+    _estado.grupo = {"falhou": False, "apos_confirmar": []}
+
+
+def grupo_falhou():
+    grupo = _grupo()
+    return grupo is not None and grupo["falhou"]
+
+
+def confirmar_grupo():
+    """Faz o commit do grupo e executa as ações adiadas (ex.: invalidar caches)."""
+    grupo = _grupo()
+    _estado.grupo = None
+    session.commit()
+    for acao in grupo["apos_confirmar"] if grupo else []:
+        acao()
+
+
+def descartar_grupo():
+    """Desfaz tudo o que foi feito no grupo."""
+    _estado.grupo = None
+    session.rollback()
+
+
+@contextlib.contextmanager
+def unidade_de_trabalho():
+    """Agrupa as operações do bloco num único commit; dentro de outro grupo, não faz nada."""
+    if _grupo() is not None:
+        yield
+        return
+    iniciar_grupo()
+    try:
+        yield
+    except BaseException:
+        descartar_grupo()
+        raise
+    if grupo_falhou():
+        descartar_grupo()
+    else:
+        confirmar_grupo()
+
+
+def _confirmar(flush=False):
+    """Commit fora de um grupo; dentro dele, só o flush (quando se precisa dos IDs)."""
+    if _grupo() is None:
+        session.commit()
+    elif flush:
+        session.flush()
+
+
+def _desfazer():
+    """Rollback; dentro de um grupo, marca o grupo inteiro como falho."""
+    session.rollback()
+    grupo = _grupo()
+    if grupo is not None:
+        grupo["falhou"] = True
+
+
+def _apos_confirmar(acao):
+    """Executa `acao` agora ou, dentro de um grupo, depois do commit do grupo."""
+    grupo = _grupo()
+    if grupo is None:
+        acao()
+    else:
+        grupo["apos_confirmar"].append(acao)
 
 
 
@@ -27,16 +114,19 @@ def criar_usuario(nome, email, senha_plana):
         )
         
         
-        session.add(novo_usuario)
-        session.commit()
-        
-        criar_conta(id_usuario=novo_usuario.id_usuario, nome_conta="contaBase", tipo_conta="corrente")
+        # Usuário e conta base no mesmo commit
+        with unidade_de_trabalho():
+            session.add(novo_usuario)
+            _confirmar(flush=True)
+
+            if criar_conta(id_usuario=novo_usuario.id_usuario, nome_conta="contaBase", tipo_conta="corrente") is None:
+                raise RuntimeError("não foi possível criar a conta base")
         
         print(f"Usuário '{nome}' criado com sucesso (ID: {novo_usuario.id_usuario}).")
         return novo_usuario
         
     except Exception as e:
-        session.rollback() 
+        _desfazer()
         print(f"Erro ao criar usuário: {e}")
         return None
 
@@ -50,11 +140,11 @@ def criar_conta(id_usuario, nome_conta, tipo_conta, saldo_inicial=0.0):
             saldo_inicial=saldo_inicial
         )
         session.add(nova_conta)
-        session.commit()
+        _confirmar(flush=True)
         print(f"Conta '{nome_conta}' criada para o usuário ID {id_usuario}.")
         return nova_conta
     except Exception as e:
-        session.rollback()
+        _desfazer()
         print(f"Erro ao criar conta: {e}")
         return None
 
@@ -63,57 +153,107 @@ def criar_categoria(nome, tipo):
     try:
         nova_categoria = Categoria(nome=nome, tipo=tipo)
         session.add(nova_categoria)
-        session.commit()
+        _confirmar(flush=True)
+        _apos_confirmar(referencias.invalidar)
         print(f"Categoria '{nome}' ({tipo}) criada.")
         return nova_categoria
     except Exception as e:
-        session.rollback()
+        _desfazer()
         print(f"Erro ao criar categoria: {e}")
         return None
 
-def adicionar_transacao(id_conta, id_categoria, valor, descricao, data_str=None):
-    """Adiciona uma nova transação (receita ou despesa)."""
+def criar_tipo_investimento(nome):
+    """Cria um novo tipo de investimento (ex.: Ações, Renda Fixa)."""
+    try:
+        novo_tipo = TipoInvestimento(nome=nome)
+        session.add(novo_tipo)
+        _confirmar(flush=True)
+        _apos_confirmar(referencias.invalidar)
+        print(f"Tipo de investimento '{nome}' criado.")
+        return novo_tipo
+    except Exception as e:
+        _desfazer()
+        print(f"Erro ao criar tipo de investimento: {e}")
+        return None
+
+def transacao_registrada(id_conta, data, valor, descricao):
+    """
+    Transação já gravada com a mesma conta, data, valor e descrição, pelo
+    índice de impressao_digital, em transacoes e no arquivo do ano da data.
+    Devolve o ID dela, ou None.
+    """
+    impressao = impressao_digital(id_conta, data, valor, descricao)
+    T = arquivo.transacoes_no_periodo(data, data, lambda T: [T.c.impressao_digital == impressao])
+    return session.execute(select(T.c.id_transacao).limit(1)).scalar()
+
+
+def adicionar_transacao(id_conta, id_categoria, valor, descricao, data_str=None, ignorar_repetida=False):
+    """
+    Adiciona uma nova transação (receita ou despesa). Transações iguais são
+    lançamentos legítimos (dois cafés no mesmo dia); com
+    ignorar_repetida=True (clientes que repetem o comando ao reenviar), uma
+    transação com a mesma conta, data, valor e descrição já gravada não é
+    lançada de novo: a função avisa e devolve TRANSACAO_REPETIDA.
+    """
     try:
         
         if data_str:
             data = datetime.datetime.strptime(data_str, '%Y-%m-%d').date()
         else:
             data = datetime.date.today()
+
+        # Valida a categoria e ajusta o sinal pelo cache, sem consultar o banco
+        try:
+            valor = referencias.normalizar_valor(id_categoria, valor)
+        except ValueError:
+            # Categoria criada neste grupo (ainda sem commit) ou por outro processo
+            categoria = session.get(Categoria, id_categoria)
+            if categoria is None:
+                print(f"Erro: Categoria ID {id_categoria} não existe.")
+                return None
+            valor = referencias.ajustar_sinal(categoria.tipo, valor)
+
+        if ignorar_repetida:
+            existente = transacao_registrada(id_conta, data, valor, descricao)
+            if existente is not None:
+                print(f"Transação de R${valor:.2f} ('{descricao}') já registrada (ID {existente}); "
+                      f"nada foi lançado.")
+                return TRANSACAO_REPETIDA
             
         nova_transacao = Transacao(
             id_conta=id_conta,
             id_categoria=id_categoria,
             valor=valor,
             descricao=descricao,
-            data=data
+            data=data,
+            impressao_digital=impressao_digital(id_conta, data, valor, descricao)
         )
         session.add(nova_transacao)
-        session.commit()
+        _confirmar()
         print(f"Transação de R${valor:.2f} ('{descricao}') adicionada.")
         return nova_transacao
     except Exception as e:
-        session.rollback()
+        _desfazer()
         print(f"Erro ao adicionar transação: {e}")
         return None
 
+def consulta_balanco_usuario(id_usuario):
+    """SELECT do balanço de um usuário (usado também pelo comando 'explain')."""
+    saldo_conta = Conta.saldo_inicial + func.coalesce(SaldoConta.saldo, 0.0)
+    return select(func.sum(saldo_conta))\
+           .select_from(Conta)\
+           .outerjoin(SaldoConta, SaldoConta.id_conta == Conta.id_conta)\
+           .where(Conta.id_usuario == id_usuario)
+
 def calcular_balanco_usuario(id_usuario):
     """
-    Calcula o balanço total de um usuário somando os saldos 
-    de todas as suas contas e o valor de todas as transações.
+    Calcula o balanço total de um usuário somando o saldo inicial de
+    cada conta com o saldo acumulado em saldos_conta (mantido pelos
+    triggers de transacoes). Lê uma linha por conta.
     """
     try:
         
-        saldo_inicial_total = session.query(func.sum(Conta.saldo_inicial))\
-                                     .filter(Conta.id_usuario == id_usuario)\
-                                     .scalar() or 0.0
-
-       
-        soma_transacoes = session.query(func.sum(Transacao.valor))\
-                                 .join(Conta)\
-                                 .filter(Conta.id_usuario == id_usuario)\
-                                 .scalar() or 0.0
-
-        balanco_total = saldo_inicial_total + soma_transacoes
+        balanco_total = session.execute(consulta_balanco_usuario(id_usuario)).scalar() or 0.0
         
         print(f"Balanço total do Usuário ID {id_usuario}: R${balanco_total:.2f}")
         return balanco_total
@@ -122,6 +262,265 @@ def calcular_balanco_usuario(id_usuario):
         print(f"Erro ao calcular balanço: {e}")
         return None
 
+def recalcular_saldos(apenas_verificar=False, tolerancia=0.005):
+    """
+    Recalcula saldos_conta a partir de transacoes e informa as contas cujo
+    saldo mantido pelos triggers divergiu do valor real. Com
+    apenas_verificar=True só relata a divergência, sem corrigir.
+    """
+    try:
+        # Histórico completo: transacoes e todas as tabelas de arquivo
+        T = arquivo.transacoes_no_periodo()
+        por_conta = select(T.c.id_conta, func.sum(T.c.valor), func.count()).group_by(T.c.id_conta)
+        reais = {id_conta: total for id_conta, total, _ in session.execute(por_conta)}
+        mantidos = dict(session.execute(
+            select(SaldoConta.id_conta, SaldoConta.saldo)
+        ).all())
+
+        divergentes = []
+        for id_conta in sorted(reais.keys() | mantidos.keys()):
+            real = reais.get(id_conta) or 0.0
+            mantido = mantidos.get(id_conta) or 0.0
+            if abs(real - mantido) > tolerancia:
+                divergentes.append((id_conta, mantido, real))
+                print(f"  Conta {id_conta}: saldo mantido R${mantido:.2f}, real R${real:.2f} "
+                      f"(diferença R${mantido - real:.2f})")
+
+        print(f"{len(divergentes)} conta(s) com divergência entre {len(reais)} conta(s) com transações.")
+
+        if not apenas_verificar:
+            # Versões recriadas acima de todas as anteriores: o cache analítico não reaproveita nada
+            versao = (session.execute(select(func.sum(SaldoConta.versao))).scalar() or 0) + 1
+            session.execute(delete(SaldoConta.__table__))
+            session.execute(
+                insert(SaldoConta.__table__).from_select(
+                    ["id_conta", "saldo", "qtd_transacoes", "versao"],
+                    por_conta.add_columns(literal(versao))
+                )
+            )
+            session.commit()
+            print("Saldos recalculados a partir das transações.")
+
+        return divergentes
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao recalcular saldos: {e}")
+        return None
+
+
+def recalcular_resumos(apenas_verificar=False, tolerancia=0.005):
+    """
+    Recalcula resumo_mensal_categoria a partir de transacoes, relatando
+    os meses cujo total mantido pelos triggers divergiu do real.
+    """
+    try:
+        T = arquivo.transacoes_no_periodo()
+        ano = extract('year', T.c.data)
+        mes = extract('month', T.c.data)
+        agregado = select(Conta.id_usuario, T.c.id_categoria, ano, mes,
+                          func.sum(T.c.valor), func.count())\
+                   .join(Conta, T.c.id_conta == Conta.id_conta)\
+                   .group_by(Conta.id_usuario, T.c.id_categoria, ano, mes)
+
+        reais = {tuple(linha[:4]): linha[4] for linha in session.execute(agregado)}
+        mantidos = {
+            tuple(linha[:4]): linha[4]
+            for linha in session.execute(
+                select(ResumoMensalCategoria.id_usuario, ResumoMensalCategoria.id_categoria,
+                       ResumoMensalCategoria.ano, ResumoMensalCategoria.mes,
+                       ResumoMensalCategoria.total)
+            )
+        }
+
+        divergentes = [
+            chave for chave in reais.keys() | mantidos.keys()
+            if abs((reais.get(chave) or 0.0) - (mantidos.get(chave) or 0.0)) > tolerancia
+        ]
+        print(f"{len(divergentes)} resumo(s) mensal(is) com divergência entre {len(reais)} resumo(s).")
+
+        if not apenas_verificar:
+            session.execute(delete(ResumoMensalCategoria.__table__))
+            session.execute(
+                insert(ResumoMensalCategoria.__table__).from_select(
+                    ["id_usuario", "id_categoria", "ano", "mes", "total", "qtd_transacoes"],
+                    agregado
+                )
+            )
+            session.commit()
+            print("Resumos mensais recalculados a partir das transações.")
+
+        return divergentes
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao recalcular resumos mensais: {e}")
+        return None
+
+def consultas_orcamento(id_usuario, ano_inicio, mes_inicio, ano_fim, mes_fim):
+    """
+    SELECTs do relatório de orçamento: categorias com orçamento no período
+    e despesas sem orçamento (usados também pelo comando 'explain').
+    """
+    de = ano_inicio * 100 + mes_inicio
+    ate = ano_fim * 100 + mes_fim
+    R = ResumoMensalCategoria
+
+    planejado = select(Orcamento.id_categoria, Orcamento.ano, Orcamento.mes,
+                       func.sum(Orcamento.valor_planejado).label("planejado"))\
+                .where(Orcamento.id_usuario == id_usuario,
+                       (Orcamento.ano * 100 + Orcamento.mes).between(de, ate))\
+                .group_by(Orcamento.id_categoria, Orcamento.ano, Orcamento.mes)\
+                .subquery()
+
+    com_orcamento = select(Categoria.nome, Categoria.tipo, planejado.c.ano, planejado.c.mes,
+                           planejado.c.planejado, func.coalesce(R.total, 0.0))\
+                    .select_from(planejado)\
+                    .join(Categoria, Categoria.id_categoria == planejado.c.id_categoria)\
+                    .outerjoin(R, and_(R.id_usuario == id_usuario,
+                                       R.id_categoria == planejado.c.id_categoria,
+                                       R.ano == planejado.c.ano,
+                                       R.mes == planejado.c.mes))
+
+    sem_orcamento = select(Categoria.nome, Categoria.tipo, R.ano, R.mes, null(), R.total)\
+                    .join(Categoria, Categoria.id_categoria == R.id_categoria)\
+                    .where(R.id_usuario == id_usuario,
+                           (R.ano * 100 + R.mes).between(de, ate),
+                           Categoria.tipo == 'Despesa',
+                           R.qtd_transacoes > 0,
+                           ~exists().where(Orcamento.id_usuario == R.id_usuario,
+                                           Orcamento.id_categoria == R.id_categoria,
+                                           Orcamento.ano == R.ano,
+                                           Orcamento.mes == R.mes))
+    return com_orcamento, sem_orcamento
+
+def relatorio_orcamento(id_usuario, ano_inicio, mes_inicio, ano_fim, mes_fim):
+    """
+    Compara o orçamento planejado com o realizado por categoria e mês,
+    lendo os totais de resumo_mensal_categoria. O custo depende do número
+    de categorias e meses do período, não do volume de transações.
+    """
+    try:
+        linhas = []
+        for consulta in consultas_orcamento(id_usuario, ano_inicio, mes_inicio, ano_fim, mes_fim):
+            for nome, tipo, ano, mes, valor_planejado, total in session.execute(consulta):
+                realizado = -total if tipo == 'Despesa' else total
+                linhas.append({
+                    "categoria": nome, "ano": ano, "mes": mes,
+                    "planejado": valor_planejado, "realizado": realizado,
+                })
+        linhas.sort(key=lambda l: (l["ano"], l["mes"], l["categoria"]))
+
+        print(f"Orçamento x realizado do Usuário ID {id_usuario} "
+              f"({mes_inicio:02d}/{ano_inicio} a {mes_fim:02d}/{ano_fim}):")
+        if not linhas:
+            print("  Nenhum orçamento ou gasto no período.")
+        for l in linhas:
+            if l["planejado"] is None:
+                print(f"  {l['mes']:02d}/{l['ano']}  {l['categoria']:<25} sem orçamento   "
+                      f"realizado R${l['realizado']:.2f}")
+            else:
+                uso = (l["realizado"] / l["planejado"] * 100) if l["planejado"] else 0.0
+                print(f"  {l['mes']:02d}/{l['ano']}  {l['categoria']:<25} planejado R${l['planejado']:.2f}  "
+                      f"realizado R${l['realizado']:.2f}  ({uso:.0f}%)")
+        return linhas
+
+    except Exception as e:
+        print(f"Erro ao gerar relatório de orçamento: {e}")
+        return None
+
+
+def _codificar_cursor(data, id_transacao):
+    texto = f"{data.isoformat()}|{id_transacao}"
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+def _decodificar_cursor(cursor):
+    try:
+        data_str, id_str = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split("|")
+        return datetime.date.fromisoformat(data_str), int(id_str)
+    except Exception:
+        raise ValueError(f"cursor de paginação inválido: '{cursor}'")
+
+def consulta_listar_transacoes(id_conta, limite, posicao=None, id_categoria=None, tag=None,
+                               data_inicio=None, data_fim=None):
+    """
+    SELECT de uma página do extrato, do mais recente para o mais antigo.
+    A paginação é por chave (data, id_transacao): a página seguinte começa
+    logo depois da última linha vista, então qualquer página custa o mesmo
+    que a primeira (usado também pelo comando 'explain'). Só as tabelas de
+    arquivo dos anos que o período (ou o cursor) toca entram na consulta, e
+    cada uma contribui com no máximo `limite` linhas lidas pelo índice.
+    """
+    ate = data_fim
+    if posicao is not None and (ate is None or posicao[0] < ate):
+        ate = posicao[0]
+
+    ramos = []
+    for T, tags in arquivo.segmentos(data_inicio, ate):
+        ramo = select(T.c.id_transacao, T.c.data, T.c.valor, T.c.descricao, T.c.id_categoria)\
+               .where(T.c.id_conta == id_conta)
+        if posicao is not None:
+            data, id_transacao = posicao
+            ramo = ramo.where(or_(T.c.data < data, and_(T.c.data == data, T.c.id_transacao < id_transacao)))
+        if id_categoria is not None:
+            ramo = ramo.where(T.c.id_categoria == id_categoria)
+        if data_inicio is not None:
+            ramo = ramo.where(T.c.data >= data_inicio)
+        if data_fim is not None:
+            ramo = ramo.where(T.c.data <= data_fim)
+        if tag is not None:
+            ramo = ramo.where(exists().where(
+                tags.c.transacao_id == T.c.id_transacao,
+                tags.c.tag_id == Tag.id_tag,
+                Tag.nome == tag
+            ))
+        ramos.append(ramo.order_by(T.c.data.desc(), T.c.id_transacao.desc()).limit(limite))
+
+    if len(ramos) > 1:
+        # ORDER BY/LIMIT dentro de um UNION precisa de uma subquery no SQLite
+        ramos = [select(ramo.subquery()) for ramo in ramos]
+    pagina = arquivo.unir(ramos)
+    return select(pagina.c.id_transacao, pagina.c.data, pagina.c.valor, pagina.c.descricao, Categoria.nome)\
+           .join(Categoria, Categoria.id_categoria == pagina.c.id_categoria)\
+           .order_by(pagina.c.data.desc(), pagina.c.id_transacao.desc()).limit(limite)
+
+def listar_transacoes(id_conta, cursor=None, limite=50, id_categoria=None, tag=None,
+                      data_inicio=None, data_fim=None):
+    """
+    Lista uma página de transações da conta. Retorna (linhas, proximo_cursor);
+    proximo_cursor é None na última página.
+    """
+    try:
+        posicao = _decodificar_cursor(cursor) if cursor else None
+        if data_inicio:
+            data_inicio = datetime.datetime.strptime(data_inicio, '%Y-%m-%d').date()
+        if data_fim:
+            data_fim = datetime.datetime.strptime(data_fim, '%Y-%m-%d').date()
+
+        # Busca uma linha a mais só para saber se existe próxima página
+        linhas = session.execute(
+            consulta_listar_transacoes(id_conta, limite + 1, posicao, id_categoria, tag,
+                                       data_inicio, data_fim)
+        ).all()
+
+        proximo_cursor = None
+        if len(linhas) > limite:
+            linhas = linhas[:limite]
+            ultima = linhas[-1]
+            proximo_cursor = _codificar_cursor(ultima.data, ultima.id_transacao)
+
+        for id_transacao, data, valor, descricao, categoria in linhas:
+            print(f"  [{id_transacao}] {data}  R${valor:>10.2f}  {categoria:<20} {descricao or ''}")
+        print(f"{len(linhas)} transação(ões) exibida(s).")
+        if proximo_cursor:
+            print(f"Próxima página: --cursor {proximo_cursor}")
+
+        return linhas, proximo_cursor
+
+    except Exception as e:
+        print(f"Erro ao listar transações: {e}")
+        return None
+
 
 def fechar_sessao():
     session.remove()
\ No newline at end of file
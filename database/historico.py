@@ -0,0 +1,242 @@
+# database/historico.py
+
+import datetime
+from sqlalchemy import select, func, insert, delete, extract, and_, or_
+from sqlalchemy.exc import IntegrityError
+from .connection import session
+from .models import Conta, CheckpointSaldo
+from . import arquivo
+from config import settings
+
+
+def _indice_mes(data):
+    return data.year * 12 + data.month - 1
+
+
+def _data_do_indice(indice):
+    return datetime.date(indice // 12, indice % 12 + 1, 1)
+
+
+def inicio_periodo(data):
+    """Primeiro dia do período de checkpoint (CHECKPOINT_MESES meses) que contém `data`."""
+    meses = settings.CHECKPOINT_MESES
+    return _data_do_indice(_indice_mes(data) // meses * meses)
+
+
+def gerar_checkpoints(ids_contas, ate):
+    """
+    Garante os checkpoints das contas até o início do período de `ate`,
+    continuando a partir do último checkpoint válido de cada conta. As somas
+    dos meses que faltam vêm de um único SELECT agrupado por conta e mês.
+    """
+    alvo = inicio_periodo(ate)
+    ultimos = {
+        id_conta: (data, saldo, qtd)
+        for id_conta, data, saldo, qtd in session.execute(
+            select(CheckpointSaldo.id_conta, CheckpointSaldo.data, CheckpointSaldo.saldo,
+                   CheckpointSaldo.qtd_transacoes)
+            .where(CheckpointSaldo.id_conta.in_(ids_contas), CheckpointSaldo.data <= alvo)
+            .order_by(CheckpointSaldo.id_conta, CheckpointSaldo.data)
+        )
+    }
+    pendentes = [id_conta for id_conta in ids_contas
+                 if id_conta not in ultimos or ultimos[id_conta][0] < alvo]
+    if not pendentes:
+        return 0
+
+    # Cada conta só precisa das transações posteriores ao seu último checkpoint
+    def filtros(T):
+        return [or_(*(
+            and_(T.c.id_conta == id_conta, T.c.data >= ultimos[id_conta][0])
+            if id_conta in ultimos else T.c.id_conta == id_conta
+            for id_conta in pendentes
+        ))]
+
+    # Só as tabelas de arquivo posteriores ao checkpoint mais antigo entram na consulta
+    desde = min(ultimos[id_conta][0] for id_conta in pendentes) \
+        if all(id_conta in ultimos for id_conta in pendentes) else None
+    T = arquivo.transacoes_no_periodo(desde, alvo - datetime.timedelta(days=1), filtros)
+    ano = extract('year', T.c.data)
+    mes = extract('month', T.c.data)
+    meses_por_conta = {}
+    for id_conta, ano_t, mes_t, total, qtd in session.execute(
+        select(T.c.id_conta, ano, mes, func.sum(T.c.valor), func.count())
+        .group_by(T.c.id_conta, ano, mes)
+    ):
+        meses_por_conta.setdefault(id_conta, {})[int(ano_t) * 12 + int(mes_t) - 1] = (total, qtd)
+
+    novos = []
+    passo = settings.CHECKPOINT_MESES
+    indice_alvo = _indice_mes(alvo)
+    for id_conta in pendentes:
+        meses = meses_por_conta.get(id_conta, {})
+        if id_conta in ultimos:
+            data, saldo, qtd = ultimos[id_conta]
+            indice = _indice_mes(data)
+        elif meses:
+            # Sem checkpoint: começa no período da transação mais antiga, com saldo zero
+            indice = min(meses) // passo * passo
+            saldo, qtd = 0.0, 0
+        else:
+            continue
+
+        while indice < indice_alvo:
+            for mes_indice in range(indice, indice + passo):
+                total_mes, qtd_mes = meses.get(mes_indice, (0.0, 0))
+                saldo += total_mes
+                qtd += qtd_mes
+            indice += passo
+            novos.append({"id_conta": id_conta, "data": _data_do_indice(indice),
+                          "saldo": saldo, "qtd_transacoes": qtd})
+
+    if novos:
+        try:
+            session.execute(insert(CheckpointSaldo.__table__), novos)
+            session.commit()
+        except IntegrityError:
+            # Outro processo gerou os mesmos checkpoints ao mesmo tempo
+            session.rollback()
+    return len(novos)
+
+
+def saldos_em(ids_contas, data):
+    """
+    Soma das transações de cada conta até `data` (inclusive), sem o saldo
+    inicial: um checkpoint mais a soma do intervalo desde o início do período.
+    """
+    gerar_checkpoints(ids_contas, data)
+    inicio = inicio_periodo(data)
+
+    saldos = dict.fromkeys(ids_contas, 0.0)
+    for id_conta, saldo in session.execute(
+        select(CheckpointSaldo.id_conta, CheckpointSaldo.saldo)
+        .where(CheckpointSaldo.id_conta.in_(ids_contas), CheckpointSaldo.data == inicio)
+    ):
+        saldos[id_conta] = saldo
+    T = arquivo.transacoes_no_periodo(inicio, data, lambda T: [T.c.id_conta.in_(ids_contas)])
+    for id_conta, total in session.execute(
+        select(T.c.id_conta, func.sum(T.c.valor)).group_by(T.c.id_conta)
+    ):
+        saldos[id_conta] += total or 0.0
+    return saldos
+
+
+def _contas(id_conta=None, id_usuario=None):
+    """{id_conta: saldo_inicial} da conta ou de todas as contas do usuário."""
+    consulta = select(Conta.id_conta, Conta.saldo_inicial)
+    if id_conta is not None:
+        consulta = consulta.where(Conta.id_conta == id_conta)
+    else:
+        consulta = consulta.where(Conta.id_usuario == id_usuario)
+    return {id_c: saldo_inicial or 0.0 for id_c, saldo_inicial in session.execute(consulta)}
+
+
+def saldo_na_data(data_str, id_conta=None, id_usuario=None):
+    """Saldo (com o saldo inicial) de uma conta ou de um usuário ao fim do dia informado."""
+    try:
+        data = datetime.datetime.strptime(data_str, '%Y-%m-%d').date()
+        contas = _contas(id_conta, id_usuario)
+        if not contas:
+            print("Erro: Nenhuma conta encontrada.")
+            return None
+
+        saldo = sum(contas.values()) + sum(saldos_em(list(contas), data).values())
+        alvo = f"Conta ID {id_conta}" if id_conta is not None else f"Usuário ID {id_usuario}"
+        print(f"Saldo de {alvo} em {data.isoformat()}: R${saldo:.2f}")
+        return saldo
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao calcular o saldo na data: {e}")
+        return None
+
+
+def historico_saldo(id_conta=None, id_usuario=None, data_inicio=None, data_fim=None, mensal=False):
+    """
+    Série de saldos de uma conta ou de todas as contas de um usuário: um
+    ponto por dia ou, com mensal=True, um por fim de mês (e no último dia
+    pedido). O saldo de abertura vem dos checkpoints e a série, de um único
+    SELECT agrupado por dia sobre o intervalo.
+    """
+    try:
+        data_fim = datetime.datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else datetime.date.today()
+        if data_inicio:
+            data_inicio = datetime.datetime.strptime(data_inicio, '%Y-%m-%d').date()
+        elif mensal:
+            data_inicio = _data_do_indice(_indice_mes(data_fim) - 11)
+        else:
+            data_inicio = data_fim - datetime.timedelta(days=30)
+        if data_inicio > data_fim:
+            print("Erro: A data inicial é posterior à data final.")
+            return None
+
+        contas = _contas(id_conta, id_usuario)
+        if not contas:
+            print("Erro: Nenhuma conta encontrada.")
+            return None
+        ids_contas = list(contas)
+
+        vespera = data_inicio - datetime.timedelta(days=1)
+        saldo = sum(contas.values()) + sum(saldos_em(ids_contas, vespera).values())
+
+        T = arquivo.transacoes_no_periodo(data_inicio, data_fim, lambda T: [T.c.id_conta.in_(ids_contas)])
+        movimentos = dict(session.execute(
+            select(T.c.data, func.sum(T.c.valor)).group_by(T.c.data)
+        ).all())
+
+        serie = []
+        dia = data_inicio
+        um_dia = datetime.timedelta(days=1)
+        while dia <= data_fim:
+            saldo += movimentos.get(dia) or 0.0
+            proximo = dia + um_dia
+            if not mensal or proximo.day == 1 or dia == data_fim:
+                serie.append((dia, saldo))
+            dia = proximo
+
+        alvo = f"Conta ID {id_conta}" if id_conta is not None else f"Usuário ID {id_usuario}"
+        print(f"Histórico de saldo de {alvo} ({'mensal' if mensal else 'diário'}):")
+        for dia, saldo in serie:
+            print(f"  {dia.isoformat()}  R${saldo:>12.2f}")
+        return serie
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao montar o histórico de saldo: {e}")
+        return None
+
+
+def recalcular_checkpoints(apenas_verificar=False, tolerancia=0.005):
+    """
+    Confere cada checkpoint com a soma real das transações anteriores a ele.
+    Sem apenas_verificar, apaga todos: eles são recriados sob demanda.
+    """
+    try:
+        # Uma subquery correlacionada por tabela (transacoes e arquivos), somadas
+        real = sum(
+            select(func.coalesce(func.sum(T.c.valor), 0.0))
+            .where(T.c.id_conta == CheckpointSaldo.id_conta, T.c.data < CheckpointSaldo.data)
+            .scalar_subquery()
+            for T, _ in arquivo.segmentos()
+        )
+        divergentes = [
+            (id_conta, data, mantido, valor_real)
+            for id_conta, data, mantido, valor_real in session.execute(
+                select(CheckpointSaldo.id_conta, CheckpointSaldo.data, CheckpointSaldo.saldo, real)
+            )
+            if abs(mantido - valor_real) > tolerancia
+        ]
+        for id_conta, data, mantido, valor_real in divergentes:
+            print(f"  Checkpoint conta {id_conta} em {data}: R${mantido:.2f}, real R${valor_real:.2f}")
+        print(f"{len(divergentes)} checkpoint(s) de saldo com divergência.")
+
+        if not apenas_verificar:
+            session.execute(delete(CheckpointSaldo.__table__))
+            session.commit()
+            print("Checkpoints de saldo descartados; serão recriados sob demanda.")
+        return divergentes
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao recalcular checkpoints: {e}")
+        return None
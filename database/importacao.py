@@ -0,0 +1,355 @@
+# database/importacao.py
+
+import csv
+import datetime
+import functools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .connection import get_engine
+from .models import Usuario, Conta, Transacao
+from . import referencias
+from .duplicatas import impressao_digital, descartar_duplicadas
+from utils.helpers import hash_senha, agrupar_em_lotes
+from config.settings import IMPORT_TAMANHO_LOTE
+
+
+class LinhaInvalida(ValueError):
+    """Erro de validação de uma linha do arquivo importado."""
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_data(texto):
+    """
+    Converte a data do arquivo em date. Extratos repetem muito as mesmas
+    datas, por isso o resultado fica em cache.
+    """
+    texto = texto.strip()
+    try:
+        if "/" in texto:
+            return datetime.datetime.strptime(texto, '%d/%m/%Y').date()
+        if len(texto) >= 8 and texto[:8].isdigit():
+            # Formato OFX: AAAAMMDD[HHMMSS[.XXX][TZ]]
+            return datetime.date(int(texto[:4]), int(texto[4:6]), int(texto[6:8]))
+        return datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise LinhaInvalida(f"data inválida '{texto}'")
+
+
+def _parse_valor(texto):
+    """Aceita '1234.56', '1234,56' e '1.234,56'."""
+    texto = texto.strip().replace(" ", "")
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        raise LinhaInvalida(f"valor inválido '{texto}'")
+
+
+def _parse_inteiro(texto, campo):
+    try:
+        return int(texto)
+    except (TypeError, ValueError):
+        raise LinhaInvalida(f"{campo} inválido '{texto}'")
+
+
+def ler_csv(arquivo, delimitador=","):
+    """
+    Gera um dicionário por linha do CSV, sem carregar o arquivo inteiro.
+    Colunas esperadas: data, valor, descricao e, opcionalmente,
+    id_categoria e id_conta.
+    """
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    for linha in leitor:
+        yield leitor.line_num, {
+            "data": linha.get("data"),
+            "valor": linha.get("valor"),
+            "descricao": linha.get("descricao"),
+            "id_categoria": linha.get("id_categoria"),
+            "id_conta": linha.get("id_conta"),
+        }
+
+
+def _tokens_ofx(arquivo, tamanho_bloco=65536):
+    """
+    Quebra o OFX (SGML ou XML) em pares (tag, valor), lendo em blocos.
+    Funciona tanto com um elemento por linha quanto com o arquivo numa
+    única linha.
+    """
+    resto = ""
+    while True:
+        bloco = arquivo.read(tamanho_bloco)
+        if not bloco:
+            break
+        partes = (resto + bloco).split("<")
+        resto = partes.pop()
+        for parte in partes:
+            if ">" in parte:
+                tag, _, valor = parte.partition(">")
+                yield tag.strip().upper(), valor.strip()
+    if ">" in resto:
+        tag, _, valor = resto.partition(">")
+        yield tag.strip().upper(), valor.strip()
+
+
+def ler_ofx(arquivo):
+    """Gera um dicionário por bloco <STMTTRN> do extrato OFX."""
+    atual = None
+    numero = 0
+    for tag, valor in _tokens_ofx(arquivo):
+        if tag == "STMTTRN":
+            atual = {}
+            numero += 1
+        elif tag == "/STMTTRN" and atual is not None:
+            yield numero, {
+                "data": atual.get("DTPOSTED"),
+                "valor": atual.get("TRNAMT"),
+                "descricao": atual.get("MEMO") or atual.get("NAME"),
+                "id_categoria": None,
+                "id_conta": None,
+            }
+            atual = None
+        elif atual is not None and not tag.startswith("/"):
+            atual[tag] = valor
+
+
+def _validar(registro, id_conta_padrao, id_categoria_padrao, categorias):
+    """
+    Converte um registro bruto numa linha pronta para o INSERT, já com o
+    sinal do valor ajustado ao tipo da categoria.
+    """
+    if not registro["data"]:
+        raise LinhaInvalida("data ausente")
+    if not registro["valor"]:
+        raise LinhaInvalida("valor ausente")
+
+    id_conta = registro["id_conta"] or id_conta_padrao
+    id_categoria = registro["id_categoria"] or id_categoria_padrao
+    if id_conta is None:
+        raise LinhaInvalida("conta ausente (use --conta)")
+    if id_categoria is None:
+        raise LinhaInvalida("categoria ausente (use --categoria)")
+
+    id_categoria = _parse_inteiro(id_categoria, "id_categoria")
+    if id_categoria not in categorias:
+        # Criada por outro processo depois da leitura do cache? Consulta (e relê) uma vez por ID
+        categorias[id_categoria] = referencias.categoria(id_categoria)
+    if categorias[id_categoria] is None:
+        raise LinhaInvalida(f"categoria {id_categoria} não existe")
+
+    linha = {
+        "data": _parse_data(registro["data"]),
+        "valor": referencias.ajustar_sinal(categorias[id_categoria][1], _parse_valor(registro["valor"])),
+        "descricao": (registro["descricao"] or "").strip()[:255],
+        "id_conta": _parse_inteiro(id_conta, "id_conta"),
+        "id_categoria": id_categoria,
+    }
+    linha["impressao_digital"] = impressao_digital(linha["id_conta"], linha["data"], linha["valor"], linha["descricao"])
+    return linha
+
+
+def _gravar_lote(conexao, lote, contas_conhecidas, ja_gravadas=None):
+    """
+    Descarta as linhas de contas inexistentes (uma consulta por lote para
+    os IDs ainda não vistos) e, se `ja_gravadas` é um Counter, as que já
+    estão no banco (outra consulta, pelo índice de impressao_digital).
+    Grava o restante com um único executemany e devolve (gravadas, sem
+    conta, duplicadas). `contas_conhecidas` mapeia id_conta -> existe e é
+    reaproveitado entre lotes.
+    """
+    novas = {linha["id_conta"] for linha in lote} - contas_conhecidas.keys()
+    if novas:
+        encontradas = set(conexao.execute(
+            select(Conta.id_conta).where(Conta.id_conta.in_(novas))
+        ).scalars())
+        for id_conta in sorted(novas):
+            contas_conhecidas[id_conta] = id_conta in encontradas
+            if id_conta not in encontradas:
+                print(f"  Linhas da conta {id_conta} ignoradas: conta não existe")
+
+    validas = [linha for linha in lote if contas_conhecidas[linha["id_conta"]]]
+    duplicadas = []
+    if ja_gravadas is not None:
+        validas, duplicadas = descartar_duplicadas(conexao, validas, ja_gravadas)
+        ja_gravadas.update(linha["impressao_digital"] for linha in validas)
+    if validas:
+        conexao.execute(insert(Transacao.__table__), validas)
+    return len(validas), len(lote) - len(validas) - len(duplicadas), len(duplicadas)
+
+
+def importar_transacoes(caminho, formato=None, id_conta=None, id_categoria=None,
+                        tamanho_lote=None, delimitador=",", encoding="utf-8", permitir_duplicadas=False):
+    """
+    Importa transações de um CSV ou OFX em lotes. Cada lote é gravado
+    numa transação própria; o arquivo é lido em streaming, então o uso
+    de memória depende só do tamanho do lote. Linhas que já estão no banco
+    (o mesmo extrato importado de novo) são ignoradas, a menos que
+    permitir_duplicadas=True.
+    """
+    tamanho_lote = tamanho_lote or IMPORT_TAMANHO_LOTE
+    if formato is None:
+        formato = "ofx" if caminho.lower().endswith((".ofx", ".qfx")) else "csv"
+
+    lidas = inseridas = rejeitadas = duplicadas = lotes = 0
+    ja_gravadas = None if permitir_duplicadas else Counter()
+    inicio = time.perf_counter()
+
+    try:
+        with get_engine().connect() as conexao, \
+                open(caminho, newline="", encoding=encoding, errors="replace") as arquivo:
+            # Cópia local: _validar acrescenta as categorias consultadas depois (ou None se não existem)
+            categorias = dict(referencias.obter().categorias)
+            contas_conhecidas = {}
+
+            registros = ler_ofx(arquivo) if formato == "ofx" else ler_csv(arquivo, delimitador)
+
+            def linhas_validas():
+                nonlocal lidas, rejeitadas
+                for numero, registro in registros:
+                    lidas += 1
+                    try:
+                        yield _validar(registro, id_conta, id_categoria, categorias)
+                    except LinhaInvalida as e:
+                        rejeitadas += 1
+                        print(f"  Linha {numero} ignorada: {e}")
+
+            for lote in agrupar_em_lotes(linhas_validas(), tamanho_lote):
+                with conexao.begin():
+                    gravadas, sem_conta, repetidas = _gravar_lote(conexao, lote, contas_conhecidas, ja_gravadas)
+                inseridas += gravadas
+                rejeitadas += sem_conta
+                duplicadas += repetidas
+                lotes += 1
+                if lotes % 10 == 0:
+                    decorrido = time.perf_counter() - inicio
+                    print(f"  ... {inseridas} transações gravadas ({inseridas / decorrido:.0f}/s)")
+
+    except Exception as e:
+        print(f"Erro ao importar transações: {e}")
+        print(f"Lotes já gravados permanecem no banco ({inseridas} transações).")
+        return None
+
+    decorrido = time.perf_counter() - inicio
+    print(f"Importação concluída: {lidas} lidas, {inseridas} inseridas, {duplicadas} já existentes, "
+          f"{rejeitadas} rejeitadas em {lotes} lote(s).")
+    print(f"Tempo: {decorrido:.2f}s ({inseridas / decorrido if decorrido else 0:.0f} transações/s)")
+    return inseridas
+
+
+def ler_usuarios_csv(arquivo, delimitador=","):
+    """Gera (linha, nome, email, senha) para cada linha do CSV de usuários."""
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    for linha in leitor:
+        yield leitor.line_num, (linha.get("nome") or "").strip(), \
+              (linha.get("email") or "").strip(), linha.get("senha") or ""
+
+
+def _insert_ignorando_repetidos(conexao, tabela):
+    """INSERT que pula as linhas que violariam uma chave única (ON DUPLICATE KEY / ON CONFLICT DO NOTHING)."""
+    if conexao.dialect.name == "mysql":
+        comando = mysql_insert(tabela)
+        # Atribuir a chave primária a ela mesma não altera a linha existente
+        chave = tabela.primary_key.columns[0]
+        return comando.on_duplicate_key_update({chave.name: chave})
+    return sqlite_insert(tabela).on_conflict_do_nothing()
+
+
+def _gravar_usuarios(conexao, lote, hashes):
+    """
+    Insere os usuários do lote e suas contas 'contaBase'. Um e-mail
+    cadastrado por outra sessão depois da verificação do lote é pulado pelo
+    próprio INSERT, sem desfazer o lote. Os usuários gravados são lidos de
+    volta pelos e-mails e reconhecidos pelo hash da senha (único, por causa
+    do salt do bcrypt). Devolve quantos usuários foram pulados.
+    """
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    conexao.execute(_insert_ignorando_repetidos(conexao, Usuario.__table__), [
+        {"nome": nome, "email": email, "senha_hash": senha_hash, "data_criacao": agora}
+        for (_, nome, email, _), senha_hash in zip(lote, hashes)
+    ])
+    nossos = set(hashes)
+    ids = [id_usuario for id_usuario, senha_hash in conexao.execute(
+        select(Usuario.id_usuario, Usuario.senha_hash).where(Usuario.email.in_([email for _, _, email, _ in lote]))
+    ) if senha_hash in nossos]
+    if ids:
+        conexao.execute(insert(Conta.__table__), [
+            {"id_usuario": id_usuario, "nome_conta": "contaBase", "tipo_conta": "corrente", "saldo_inicial": 0.0}
+            for id_usuario in ids
+        ])
+    return len(lote) - len(ids)
+
+
+def importar_usuarios(caminho, tamanho_lote=None, processos=None, delimitador=",", encoding="utf-8"):
+    """
+    Cadastra usuários em massa a partir de um CSV (colunas nome, email, senha).
+    Os hashes bcrypt são calculados em paralelo num pool de processos, a
+    unicidade dos e-mails é verificada com uma consulta por lote (para não
+    calcular hashes à toa) e garantida no INSERT, e usuários e contas são
+    inseridos em lote, numa transação por lote.
+    """
+    tamanho_lote = tamanho_lote or IMPORT_TAMANHO_LOTE
+    processos = processos or os.cpu_count() or 1
+
+    lidos = inseridos = rejeitados = 0
+    vistos = set()
+    inicio = time.perf_counter()
+
+    def usuarios_validos(registros):
+        nonlocal lidos, rejeitados
+        for numero, nome, email, senha in registros:
+            lidos += 1
+            if not nome or "@" not in email or not senha:
+                rejeitados += 1
+                print(f"  Linha {numero} ignorada: nome, e-mail ou senha inválidos")
+            elif email in vistos:
+                rejeitados += 1
+                print(f"  Linha {numero} ignorada: e-mail '{email}' repetido no arquivo")
+            else:
+                vistos.add(email)
+                yield numero, nome, email, senha
+
+    try:
+        with get_engine().connect() as conexao, \
+                ProcessPoolExecutor(max_workers=processos) as pool, \
+                open(caminho, newline="", encoding=encoding, errors="replace") as arquivo:
+
+            for lote in agrupar_em_lotes(usuarios_validos(ler_usuarios_csv(arquivo, delimitador)), tamanho_lote):
+                with conexao.begin():
+                    existentes = set(conexao.execute(
+                        select(Usuario.email).where(Usuario.email.in_([email for _, _, email, _ in lote]))
+                    ).scalars())
+                if existentes:
+                    rejeitados += len(existentes)
+                    print(f"  {len(existentes)} e-mail(s) já cadastrado(s) ignorado(s) neste lote")
+                    lote = [usuario for usuario in lote if usuario[2] not in existentes]
+                if not lote:
+                    continue
+
+                chunksize = max(1, len(lote) // (processos * 4))
+                hashes = list(pool.map(hash_senha, [senha for _, _, _, senha in lote], chunksize=chunksize))
+
+                with conexao.begin():
+                    pulados = _gravar_usuarios(conexao, lote, hashes)
+                if pulados:
+                    rejeitados += pulados
+                    print(f"  {pulados} e-mail(s) cadastrado(s) por outra sessão durante o lote ignorado(s)")
+                inseridos += len(lote) - pulados
+
+                decorrido = time.perf_counter() - inicio
+                print(f"  ... {inseridos} usuários cadastrados ({inseridos / decorrido:.0f}/s)")
+
+    except Exception as e:
+        print(f"Erro ao importar usuários: {e}")
+        print(f"Lotes já gravados permanecem no banco ({inseridos} usuários).")
+        return None
+
+    decorrido = time.perf_counter() - inicio
+    print(f"Importação concluída: {lidos} lidos, {inseridos} cadastrados, {rejeitados} rejeitados "
+          f"usando {processos} processo(s) para o bcrypt.")
+    print(f"Tempo: {decorrido:.2f}s ({inseridos / decorrido if decorrido else 0:.0f} usuários/s)")
+    return inseridos
@@ -0,0 +1,151 @@
+# database/instrumentacao.py
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from sqlalchemy import event
+from config import settings
+from utils.helpers import percentil
+
+# Amostras de duração guardadas por comando SQL para calcular os percentis
+MAX_AMOSTRAS = 1000
+
+_perfil_ativo = False
+_estatisticas = {}
+_trava = threading.Lock()
+_logger_lento = None
+
+
+def ativar_perfil(ativo=True):
+    """Liga ou desliga a coleta de estatísticas por comando SQL."""
+    global _perfil_ativo
+    _perfil_ativo = ativo
+
+
+def zerar_estatisticas():
+    with _trava:
+        _estatisticas.clear()
+
+
+def instalar(engine):
+    """Registra os eventos de tempo no engine (chamado por get_engine)."""
+    event.listen(engine, "before_cursor_execute", _antes_de_executar)
+    event.listen(engine, "after_cursor_execute", _depois_de_executar)
+
+
+def _antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_sql", []).append(time.perf_counter())
+
+
+def _depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    duracao_ms = (time.perf_counter() - conn.info["inicio_sql"].pop()) * 1000
+    lento = settings.SLOW_QUERY_MS is not None and duracao_ms >= settings.SLOW_QUERY_MS
+    if not (_perfil_ativo or lento):
+        return
+
+    chamador = _chamador(statement)
+    # Em SELECT o rowcount depende do driver (só é conhecido com cursor bufferizado)
+    linhas = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else 0
+
+    if _perfil_ativo:
+        _registrar(statement, duracao_ms, linhas, chamador)
+    if lento:
+        _logger().warning(
+            "%.1f ms | %d linha(s) | %s | %s | parâmetros: %.200s",
+            duracao_ms, linhas, chamador, " ".join(statement.split()), parameters
+        )
+
+
+def _chamador(statement):
+    """
+    Identifica quem disparou o SQL: a procedure, no caso de CALL, ou a
+    primeira função da aplicação na pilha (fora do SQLAlchemy).
+    """
+    texto = statement.lstrip()
+    if texto[:4].upper() == "CALL":
+        return texto[4:].split("(")[0].strip()
+
+    quadro = sys._getframe(2)
+    while quadro is not None:
+        modulo = quadro.f_globals.get("__name__", "")
+        if not modulo.startswith("sqlalchemy") and modulo != __name__:
+            return f"{modulo}.{quadro.f_code.co_name}"
+        quadro = quadro.f_back
+    return "?"
+
+
+def _registrar(statement, duracao_ms, linhas, chamador):
+    with _trava:
+        item = _estatisticas.get(statement)
+        if item is None:
+            item = _estatisticas[statement] = {
+                "quantidade": 0, "total_ms": 0.0, "linhas": 0, "amostras": [], "chamadores": Counter(),
+            }
+        item["quantidade"] += 1
+        item["total_ms"] += duracao_ms
+        item["linhas"] += linhas
+        item["chamadores"][chamador] += 1
+        # Amostragem de reservatório: percentis estáveis com memória limitada
+        if len(item["amostras"]) < MAX_AMOSTRAS:
+            item["amostras"].append(duracao_ms)
+        else:
+            posicao = random.randrange(item["quantidade"])
+            if posicao < MAX_AMOSTRAS:
+                item["amostras"][posicao] = duracao_ms
+
+
+def _logger():
+    """Logger do slow query log, gravado em settings.LOG_FILE."""
+    global _logger_lento
+    if _logger_lento is None:
+        os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
+        _logger_lento = logging.getLogger("julius_finance.sql_lento")
+        _logger_lento.setLevel(logging.WARNING)
+        _logger_lento.propagate = False
+        manipulador = logging.FileHandler(settings.LOG_FILE, encoding="utf-8")
+        manipulador.setFormatter(logging.Formatter("%(asctime)s [SQL LENTO] %(message)s"))
+        _logger_lento.addHandler(manipulador)
+    return _logger_lento
+
+
+def obter_estatisticas():
+    """Estatísticas agregadas por comando SQL, do maior tempo total para o menor."""
+    with _trava:
+        itens = [(sql, dict(item, amostras=sorted(item["amostras"]))) for sql, item in _estatisticas.items()]
+
+    resultado = []
+    for sql, item in itens:
+        resultado.append({
+            "sql": " ".join(sql.split()),
+            "quantidade": item["quantidade"],
+            "total_ms": item["total_ms"],
+            "p50_ms": percentil(item["amostras"], 50),
+            "p95_ms": percentil(item["amostras"], 95),
+            "p99_ms": percentil(item["amostras"], 99),
+            "linhas": item["linhas"],
+            "chamador": item["chamadores"].most_common(1)[0][0],
+        })
+    resultado.sort(key=lambda r: r["total_ms"], reverse=True)
+    return resultado
+
+
+def imprimir_estatisticas(limite=20):
+    """Imprime as estatísticas por comando SQL em stderr."""
+    estatisticas = obter_estatisticas()
+    if not estatisticas:
+        print("Nenhum comando SQL registrado. Use --profile (ou 'serve --profile' com o cliente.py).",
+              file=sys.stderr)
+        return estatisticas
+
+    print(f"\n[profile] {len(estatisticas)} comando(s) SQL distinto(s), "
+          f"{sum(e['quantidade'] for e in estatisticas)} execução(ões):", file=sys.stderr)
+    for e in estatisticas[:limite]:
+        print(f"  {e['quantidade']:>6}x  total {e['total_ms']:9.1f} ms  p50 {e['p50_ms']:7.2f}  "
+              f"p95 {e['p95_ms']:7.2f}  p99 {e['p99_ms']:7.2f} ms  {e['linhas']:>7} linha(s)  {e['chamador']}",
+              file=sys.stderr)
+        print(f"          {e['sql'][:110]}", file=sys.stderr)
+    return estatisticas
@@ -0,0 +1,241 @@
+# database/lote.py
+
+import argparse
+import contextlib
+import io
+import json
+import queue
+import shlex
+import sys
+import threading
+import time
+from . import functions as db_func
+from config.settings import BATCH_TAMANHO_GRUPO, BATCH_INTERVALO_MS
+
+
+def _adduser(args):
+    return db_func.criar_usuario(args.nome, args.email, args.senha)
+
+
+def _addaccount(args):
+    return db_func.criar_conta(args.id_usuario, args.nome_conta, getattr(args, "tipo", None) or "corrente",
+                               getattr(args, "saldo_inicial", None) or 0.0)
+
+
+def _addcategory(args):
+    return db_func.criar_categoria(args.nome, args.tipo)
+
+
+def _addtransaction(args):
+    return db_func.adicionar_transacao(args.id_conta, args.id_categoria, float(args.valor),
+                                       args.descricao, getattr(args, "data", None),
+                                       getattr(args, "ignorar_repetida", False))
+
+
+def _trade(args):
+    from . import carteira
+    return carteira.registrar_operacao(args.id_conta, args.simbolo, args.operacao, float(args.quantidade),
+                                       float(args.preco), getattr(args, "tipo", None), getattr(args, "data", None))
+
+
+# Comandos aceitos no batch: os que escrevem pela sessão e respeitam o grupo
+OPERACOES = {
+    "adduser": _adduser,
+    "addaccount": _addaccount,
+    "addcategory": _addcategory,
+    "addtransaction": _addtransaction,
+    "trade": _trade,
+}
+
+
+class ComandoInvalido(ValueError):
+    """Linha do batch que não pôde ser interpretada."""
+
+
+def _interpretar(linha, parser):
+    """
+    Converte uma linha em Namespace. Aceita a sintaxe da CLI
+    ('addtransaction 1 1 -50 Mercado --data 2025-01-01') ou JSON, tanto
+    {"argv": [...]} quanto {"comando": "...", <argumentos pelo nome>}.
+    """
+    if linha.startswith("{"):
+        try:
+            objeto = json.loads(linha)
+        except ValueError as e:
+            raise ComandoInvalido(f"JSON inválido: {e}")
+        if not isinstance(objeto, dict):
+            raise ComandoInvalido("esperado um objeto JSON")
+        if "argv" in objeto:
+            argv = [str(parte) for parte in objeto["argv"]]
+        else:
+            argumentos = dict(objeto)
+            comando = argumentos.pop("comando", None)
+            if comando not in OPERACOES:
+                raise ComandoInvalido(f"comando '{comando}' não suportado no batch")
+            return argparse.Namespace(command=comando, **argumentos)
+    else:
+        try:
+            argv = shlex.split(linha)
+        except ValueError as e:
+            raise ComandoInvalido(str(e))
+
+    erros = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(erros):
+            args = parser.parse_args(argv)
+    except SystemExit:
+        mensagem = erros.getvalue().strip().splitlines()
+        raise ComandoInvalido(mensagem[-1] if mensagem else "argumentos inválidos")
+    if args.command not in OPERACOES:
+        raise ComandoInvalido(f"comando '{args.command}' não suportado no batch")
+    return args
+
+
+def _ler_linhas(caminho):
+    """Gera (número, linha) do arquivo ou da entrada padrão, ignorando vazias e comentários."""
+    arquivo = sys.stdin if caminho in (None, "-") else open(caminho, encoding="utf-8")
+    try:
+        for numero, linha in enumerate(arquivo, start=1):
+            linha = linha.strip()
+            if linha and not linha.startswith("#"):
+                yield numero, linha
+    finally:
+        if arquivo is not sys.stdin:
+            arquivo.close()
+
+
+_FIM = object()
+
+
+def _ler_em_segundo_plano(linhas, tamanho_fila):
+    """
+    Lê as linhas numa thread e as entrega por uma fila, para que o batch
+    possa esperar a próxima com prazo (e confirmar o grupo aberto quando a
+    entrada padrão fica parada). Um erro de leitura vai pela fila também.
+    """
+    fila = queue.Queue(maxsize=tamanho_fila)
+
+    def ler():
+        try:
+            for item in linhas:
+                fila.put(item)
+        except Exception as e:
+            fila.put(e)
+        fila.put(_FIM)
+
+    threading.Thread(target=ler, name="batch-leitura", daemon=True).start()
+    return fila
+
+
+def _mensagem_de_erro(saida):
+    """Última linha de erro impressa pela função executada."""
+    linhas = [l for l in saida.splitlines() if "Erro" in l] or saida.splitlines()
+    return linhas[-1].strip() if linhas else "falhou sem mensagem"
+
+
+def executar_lote(caminho, parser, tamanho_grupo=None, intervalo_ms=None, detalhado=False):
+    """
+    Executa uma sequência de comandos com commits agrupados: um commit a
+    cada `tamanho_grupo` operações ou `intervalo_ms` milissegundos (o que
+    vier primeiro, mesmo com a entrada parada esperando a próxima linha).
+    Se uma operação falha, o grupo inteiro é desfeito.
+    """
+    tamanho_grupo = tamanho_grupo or BATCH_TAMANHO_GRUPO
+    intervalo_ms = BATCH_INTERVALO_MS if intervalo_ms is None else intervalo_ms
+
+    lidas = confirmadas = repetidas = invalidas = grupos = grupos_falhos = 0
+    falhas = []
+    grupo = []
+    inicio_grupo = 0.0
+    inicio = time.perf_counter()
+
+    def fechar_grupo():
+        nonlocal confirmadas, grupos, grupos_falhos
+        try:
+            db_func.confirmar_grupo()
+            confirmadas += len(grupo)
+            grupos += 1
+        except Exception as e:
+            db_func.descartar_grupo()
+            grupos_falhos += 1
+            falhas.append((grupo[0], f"commit do grupo (linhas {grupo[0]}-{grupo[-1]}) falhou: {e}", len(grupo)))
+        grupo.clear()
+
+    try:
+        fila = _ler_em_segundo_plano(_ler_linhas(caminho), tamanho_grupo)
+        while True:
+            # Com um grupo aberto, espera a próxima linha só até o fim do intervalo
+            prazo = None
+            if grupo:
+                prazo = max(0.0, intervalo_ms / 1000 - (time.perf_counter() - inicio_grupo))
+            try:
+                item = fila.get(timeout=prazo)
+            except queue.Empty:
+                fechar_grupo()
+                continue
+            if item is _FIM:
+                break
+            if isinstance(item, Exception):
+                raise item
+            numero, linha = item
+            lidas += 1
+            try:
+                args = _interpretar(linha, parser)
+            except ComandoInvalido as e:
+                invalidas += 1
+                falhas.append((numero, f"comando inválido: {e}", 0))
+                continue
+
+            if not grupo:
+                db_func.iniciar_grupo()
+                inicio_grupo = time.perf_counter()
+
+            saida = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(saida):
+                    resultado = OPERACOES[args.command](args)
+            except Exception as e:
+                # Argumentos faltando ou de tipo errado num comando JSON
+                print(f"Erro: {e}", file=saida)
+                resultado = None
+            if detalhado:
+                print(saida.getvalue(), end="")
+            grupo.append(numero)
+
+            if resultado is None or db_func.grupo_falhou():
+                db_func.descartar_grupo()
+                grupos_falhos += 1
+                falhas.append((numero, _mensagem_de_erro(saida.getvalue()), len(grupo)))
+                grupo.clear()
+                continue
+
+            if resultado is db_func.TRANSACAO_REPETIDA:
+                # Já gravada antes (reenvio): não é falha, mas também não lançou nada
+                repetidas += 1
+
+            if len(grupo) >= tamanho_grupo or (time.perf_counter() - inicio_grupo) * 1000 >= intervalo_ms:
+                fechar_grupo()
+
+        if grupo:
+            fechar_grupo()
+
+    except Exception as e:
+        db_func.descartar_grupo()
+        print(f"Erro durante o batch (grupos anteriores já foram confirmados): {e}")
+    except KeyboardInterrupt:
+        db_func.descartar_grupo()
+        print("\nBatch interrompido; o grupo em andamento foi desfeito.")
+
+    decorrido = time.perf_counter() - inicio
+    desfeitas = sum(qtd for _, _, qtd in falhas)
+    print(f"Batch concluído em {decorrido:.2f}s: {lidas} comando(s) lido(s), {confirmadas} confirmado(s) "
+          f"em {grupos} grupo(s) ({repetidas} já registrado(s), sem novo lançamento), {desfeitas} desfeito(s) "
+          f"em {grupos_falhos} grupo(s) com falha, {invalidas} inválido(s).")
+    print(f"Vazão: {confirmadas / decorrido if decorrido else 0:.0f} operações confirmadas/s")
+    for numero, mensagem, qtd in falhas[:20]:
+        sufixo = f" ({qtd} operação(ões) do grupo desfeita(s))" if qtd else ""
+        print(f"  Linha {numero}: {mensagem}{sufixo}")
+    if len(falhas) > 20:
+        print(f"  ... e mais {len(falhas) - 20} falha(s).")
+    return {"lidas": lidas, "confirmadas": confirmadas, "repetidas": repetidas, "desfeitas": desfeitas,
+            "invalidas": invalidas, "grupos": grupos, "grupos_falhos": grupos_falhos, "segundos": decorrido}
@@ -0,0 +1,260 @@
+# database/metas.py
+
+import calendar
+import datetime
+import math
+import time
+from sqlalchemy import select, insert, update, func, case, exists, literal
+from .connection import get_engine, session
+from .models import Usuario, Meta, RegraMeta, AporteMeta, ResumoMensalCategoria
+from .functions import _confirmar, _desfazer
+from . import referencias
+from utils.helpers import agrupar_em_lotes
+from config.settings import METAS_TAMANHO_LOTE, METAS_MESES_RITMO
+
+
+def _mes_anterior(hoje=None):
+    anterior = (hoje or datetime.date.today()).replace(day=1) - datetime.timedelta(days=1)
+    return anterior.year, anterior.month
+
+
+def _somar_meses(ano, mes, meses):
+    indice = ano * 12 + mes - 1 + meses
+    return indice // 12, indice % 12 + 1
+
+
+def criar_meta(id_usuario, nome, valor_objetivo, data_limite_str=None):
+    """Cria uma nova meta de economia para o usuário."""
+    try:
+        if valor_objetivo <= 0:
+            print("Erro: o valor objetivo deve ser positivo.")
+            return None
+        if session.get(Usuario, id_usuario) is None:
+            print(f"Erro: Usuário ID {id_usuario} não existe.")
+            return None
+        data_limite = datetime.datetime.strptime(data_limite_str, '%Y-%m-%d').date() if data_limite_str else None
+
+        nova_meta = Meta(id_usuario=id_usuario, nome=nome, valor_objetivo=valor_objetivo, valor_atual=0.0,
+                         data_limite=data_limite)
+        session.add(nova_meta)
+        _confirmar(flush=True)
+        print(f"Meta '{nome}' de R${valor_objetivo:.2f} criada para o usuário ID {id_usuario} "
+              f"(ID: {nova_meta.id_meta}).")
+        return nova_meta
+    except Exception as e:
+        _desfazer()
+        print(f"Erro ao criar meta: {e}")
+        return None
+
+
+def criar_regra(id_meta, tipo, valor, id_categoria=None):
+    """
+    Cria uma regra de aporte mensal: 'fixo' (valor em reais) ou
+    'percentual' (valor em % da receita do mês na categoria informada,
+    que precisa ser de Receita).
+    """
+    try:
+        if session.get(Meta, id_meta) is None:
+            print(f"Erro: Meta ID {id_meta} não existe.")
+            return None
+        if tipo == "fixo":
+            if valor <= 0 or id_categoria is not None:
+                print("Erro: a regra fixa precisa de um valor positivo e não usa categoria.")
+                return None
+        elif tipo == "percentual":
+            categoria = referencias.categoria(id_categoria) if id_categoria is not None else None
+            if categoria is None or categoria[1] != "Receita":
+                print("Erro: a regra percentual precisa de uma categoria de Receita (--categoria).")
+                return None
+            if not 0 < valor <= 100:
+                print("Erro: o percentual deve estar entre 0 e 100.")
+                return None
+        else:
+            print(f"Erro: tipo de regra '{tipo}' inválido (use fixo ou percentual).")
+            return None
+
+        nova_regra = RegraMeta(id_meta=id_meta, tipo=tipo, valor=valor, id_categoria=id_categoria)
+        session.add(nova_regra)
+        _confirmar(flush=True)
+        descricao = f"R${valor:.2f}" if tipo == "fixo" else f"{valor:g}% da categoria {id_categoria}"
+        print(f"Regra de aporte mensal ({descricao}) criada para a meta ID {id_meta} (ID: {nova_regra.id_regra}).")
+        return nova_regra
+    except Exception as e:
+        _desfazer()
+        print(f"Erro ao criar regra da meta: {e}")
+        return None
+
+
+def _aplicar_faixa(conexao, primeiro, ultimo, ano, mes, agora):
+    """
+    Aplica as regras de IDs [primeiro, ultimo] no mês: um INSERT ... SELECT
+    grava os aportes (o valor das regras percentuais vem de
+    resumo_mensal_categoria; somados por meta, não passam do que falta
+    para o objetivo) e um único UPDATE soma-os em metas, limitado ao
+    objetivo. Regras já aplicadas no mês e metas já concluídas ficam de
+    fora. Devolve (aportes, metas atualizadas, total aportado).
+    """
+    M = Meta.__table__
+    Rg = RegraMeta.__table__
+    A = AporteMeta.__table__
+    R = ResumoMensalCategoria.__table__
+
+    receita = select(R.c.total).where(R.c.id_usuario == M.c.id_usuario, R.c.id_categoria == Rg.c.id_categoria,
+                                      R.c.ano == ano, R.c.mes == mes).scalar_subquery()
+    pela_regra = case((Rg.c.tipo == "fixo", Rg.c.valor), else_=func.coalesce(receita, 0.0) * Rg.c.valor / 100)
+    restante = M.c.valor_objetivo - func.coalesce(M.c.valor_atual, 0.0)
+    # Soma acumulada das regras anteriores (menor ID) da mesma meta nesta faixa
+    anteriores = func.sum(pela_regra).over(partition_by=Rg.c.id_meta, order_by=Rg.c.id_regra, rows=(None, -1))
+    propostas = select(Rg.c.id_meta, Rg.c.id_regra, pela_regra.label("pela_regra"), restante.label("restante"),
+                       func.coalesce(anteriores, 0.0).label("anteriores"))\
+                .join(M, M.c.id_meta == Rg.c.id_meta)\
+                .where(Rg.c.id_regra.between(primeiro, ultimo),
+                       restante > 0,
+                       pela_regra > 0,
+                       ~exists().where(A.c.id_regra == Rg.c.id_regra, A.c.ano == ano, A.c.mes == mes))\
+                .subquery()
+    # O total aportado na meta não passa do que falta para o objetivo: as
+    # primeiras regras aportam inteiras, a que cruza o objetivo só o que falta
+    disponivel = propostas.c.restante - propostas.c.anteriores
+    valor = case((propostas.c.pela_regra > disponivel, disponivel), else_=propostas.c.pela_regra)
+    candidatas = select(propostas.c.id_meta, propostas.c.id_regra, literal(ano), literal(mes), valor,
+                        literal(agora)).where(valor > 0)
+
+    # Os aportes desta faixa são os de ID maior que o último antes do INSERT
+    antes = conexao.execute(select(func.coalesce(func.max(A.c.id_aporte), 0))).scalar()
+    conexao.execute(insert(A).from_select(["id_meta", "id_regra", "ano", "mes", "valor", "data_registro"],
+                                          candidatas))
+    desta_faixa = [A.c.id_aporte > antes, A.c.ano == ano, A.c.mes == mes, A.c.id_regra.between(primeiro, ultimo)]
+
+    aportes, total = conexao.execute(select(func.count(), func.coalesce(func.sum(A.c.valor), 0.0))
+                                     .where(*desta_faixa)).one()
+    if not aportes:
+        return 0, 0, 0.0
+    soma = select(func.sum(A.c.valor)).where(A.c.id_meta == M.c.id_meta, *desta_faixa).scalar_subquery()
+    novo_valor = func.coalesce(M.c.valor_atual, 0.0) + soma
+    metas = conexao.execute(update(M).where(M.c.id_meta.in_(select(A.c.id_meta).where(*desta_faixa)))
+                            .values(valor_atual=case((novo_valor > M.c.valor_objetivo, M.c.valor_objetivo),
+                                                     else_=novo_valor))).rowcount
+    return aportes, metas, total
+
+
+def aplicar_aportes(ano=None, mes=None, tamanho_lote=None):
+    """
+    Aplica as regras de aporte de todas as metas no mês (padrão: o mês
+    anterior), em faixas de IDs de regra, uma transação por faixa. Cada
+    faixa custa um INSERT ... SELECT e um UPDATE, em vez de uma chamada de
+    sp_atualizar_saldo_meta por meta. O índice único (regra, ano, mes)
+    torna a aplicação idempotente: repetir o comando só aplica o que faltou.
+    """
+    tamanho_lote = tamanho_lote or METAS_TAMANHO_LOTE
+    if ano is None:
+        ano, mes = _mes_anterior()
+    aportes = metas = 0
+    total = 0.0
+    inicio = time.perf_counter()
+
+    try:
+        with get_engine().connect() as conexao:
+            ids = list(conexao.execute(select(RegraMeta.id_regra).order_by(RegraMeta.id_regra)).scalars())
+            conexao.rollback()
+            agora = datetime.datetime.now(datetime.timezone.utc)
+            for lote in agrupar_em_lotes(ids, tamanho_lote):
+                with conexao.begin():
+                    aportes_lote, metas_lote, total_lote = _aplicar_faixa(conexao, lote[0], lote[-1], ano, mes, agora)
+                aportes += aportes_lote
+                metas += metas_lote
+                total += total_lote
+
+    except Exception as e:
+        print(f"Erro ao aplicar os aportes das metas: {e}")
+        print(f"Faixas já aplicadas permanecem no banco ({aportes} aportes).")
+        return None
+
+    decorrido = time.perf_counter() - inicio
+    print(f"Aportes de {mes:02d}/{ano}: {aportes} aporte(s) em {metas} atualização(ões) de meta, somando "
+          f"R${total:.2f}, de {len(ids)} regra(s) em {decorrido:.2f}s.")
+    return aportes
+
+
+def consulta_progresso(id_usuario=None, ano=None, mes=None, meses=None):
+    """
+    SELECT do progresso de todas as metas (ou as de um usuário) numa única
+    consulta: objetivo, valor atual, prazo e a soma dos aportes dos
+    `meses` meses terminados em ano/mes, que dá o ritmo da projeção.
+    """
+    A = AporteMeta.__table__
+    fim = ano * 12 + mes
+    ritmo = select(A.c.id_meta, func.sum(A.c.valor).label("soma"))\
+            .where(A.c.ano * 12 + A.c.mes > fim - meses, A.c.ano * 12 + A.c.mes <= fim)\
+            .group_by(A.c.id_meta).subquery()
+    consulta = select(Meta.id_meta, Meta.id_usuario, Meta.nome, Meta.valor_objetivo,
+                      func.coalesce(Meta.valor_atual, 0.0), Meta.data_limite, func.coalesce(ritmo.c.soma, 0.0))\
+               .outerjoin(ritmo, ritmo.c.id_meta == Meta.id_meta)\
+               .order_by(Meta.id_usuario, Meta.id_meta)
+    if id_usuario is not None:
+        consulta = consulta.where(Meta.id_usuario == id_usuario)
+    return consulta
+
+
+def _projetar(objetivo, atual, data_limite, soma_recente, meses, ano, mes):
+    """(ritmo mensal, data projetada, aporte mensal necessário, situação) de uma meta."""
+    restante = objetivo - atual
+    ritmo = soma_recente / meses
+    necessario = None
+    if data_limite is not None and restante > 0:
+        meses_ate_limite = max(1, (data_limite.year * 12 + data_limite.month) - (ano * 12 + mes))
+        necessario = restante / meses_ate_limite
+
+    if restante <= 0:
+        return ritmo, None, None, "concluída"
+    if ritmo <= 0:
+        return ritmo, None, necessario, "sem aportes"
+    ano_fim, mes_fim = _somar_meses(ano, mes, math.ceil(restante / ritmo))
+    projetada = datetime.date(ano_fim, mes_fim, calendar.monthrange(ano_fim, mes_fim)[1])
+    if data_limite is None:
+        situacao = "sem prazo"
+    else:
+        situacao = "no prazo" if projetada <= data_limite else "atrasada"
+    return ritmo, projetada, necessario, situacao
+
+
+def progresso_metas(id_usuario=None, meses=None):
+    """
+    Mostra o progresso de cada meta e projeta a conclusão pelo ritmo dos
+    aportes dos últimos `meses` meses fechados, com o aporte mensal
+    necessário para cumprir o prazo.
+    """
+    meses = meses or METAS_MESES_RITMO
+    try:
+        ano, mes = _mes_anterior()
+        linhas = session.execute(consulta_progresso(id_usuario, ano, mes, meses)).all()
+        if not linhas:
+            print("Nenhuma meta encontrada.")
+            return []
+
+        print(f"Progresso das metas (ritmo: média dos aportes de {meses} mês(es) até {mes:02d}/{ano}):")
+        resultado = []
+        usuario_atual = None
+        for id_meta, id_usuario_meta, nome, objetivo, atual, data_limite, soma_recente in linhas:
+            ritmo, projetada, necessario, situacao = _projetar(objetivo, atual, data_limite, soma_recente,
+                                                               meses, ano, mes)
+            if id_usuario_meta != usuario_atual:
+                usuario_atual = id_usuario_meta
+                print(f"Usuário ID {id_usuario_meta}:")
+            percentual = atual / objetivo * 100 if objetivo else 0.0
+            detalhes = [f"ritmo R${ritmo:.2f}/mês"]
+            if projetada:
+                detalhes.append(f"conclusão prevista {projetada:%m/%Y}")
+            if data_limite:
+                detalhes.append(f"prazo {data_limite:%d/%m/%Y}")
+            if necessario:
+                detalhes.append(f"necessário R${necessario:.2f}/mês")
+            print(f"  [{id_meta}] {nome:<25} R${atual:>10.2f} de R${objetivo:>10.2f} ({percentual:5.1f}%)  "
+                  f"{situacao:<11}  {', '.join(detalhes)}")
+            resultado.append((id_meta, nome, objetivo, atual, ritmo, projetada, necessario, situacao))
+        return resultado
+
+    except Exception as e:
+        session.rollback()
+        print(f"Erro ao calcular o progresso das metas: {e}")
+        return None
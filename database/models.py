@@ -1,7 +1,7 @@
 
 
 import datetime
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from .connection import Base  
 
@@ -12,6 +12,21 @@ transacao_tag_association = Table(
     Column('tag_id', Integer, ForeignKey('tags.id_tag'), primary_key=True)
 )
 
+# Tags e vínculos de transferência das transações movidas para transacoes_<ano>
+transacao_tag_arquivo = Table(
+    'transacao_tag_arquivo', Base.metadata,
+    Column('transacao_id', Integer, primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id_tag'), primary_key=True)
+)
+
+transferencias_arquivo = Table(
+    'transferencias_arquivo', Base.metadata,
+    Column('id_transferencia', Integer, primary_key=True),
+    Column('id_transacao_debito', Integer, nullable=False),
+    Column('id_transacao_credito', Integer, nullable=False),
+    Column('chave_lote', String(100))
+)
+
 
 class Usuario(Base):
     __tablename__ = 'usuarios'
@@ -38,7 +53,7 @@ class Conta(Base):
     saldo_inicial = Column(Float, default=0.0)
     
 
-    id_usuario = Column(Integer, ForeignKey('usuarios.id_usuario'), nullable=False)
+    id_usuario = Column(Integer, ForeignKey('usuarios.id_usuario'), nullable=False, index=True)
     
     
     usuario = relationship('Usuario', back_populates='contas')
@@ -49,6 +64,32 @@ class Conta(Base):
         return f"<Conta(id={self.id_conta}, nome='{self.nome_conta}')>"
 
 
+class SaldoConta(Base):
+    __tablename__ = 'saldos_conta'
+    id_conta = Column(Integer, ForeignKey('contas.id_conta', ondelete='CASCADE'), primary_key=True)
+    # FLOAT(53) vira DOUBLE no MySQL: o acumulador não pode perder precisão
+    saldo = Column(Float(53), nullable=False, default=0.0)
+    qtd_transacoes = Column(Integer, nullable=False, default=0)
+    # Contador de escritas nas transações (e tags) da conta, incrementado
+    # pelos triggers: chave do cache do motor analítico
+    versao = Column(Integer, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<SaldoConta(conta_id={self.id_conta}, saldo={self.saldo})>"
+
+
+class CheckpointSaldo(Base):
+    __tablename__ = 'checkpoints_saldo'
+    id_conta = Column(Integer, ForeignKey('contas.id_conta', ondelete='CASCADE'), primary_key=True)
+    # Soma das transações da conta com data ANTERIOR a este dia (início de um período)
+    data = Column(Date, primary_key=True)
+    saldo = Column(Float(53), nullable=False, default=0.0)
+    qtd_transacoes = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CheckpointSaldo(conta_id={self.id_conta}, data={self.data}, saldo={self.saldo})>"
+
+
 class Categoria(Base):
     __tablename__ = 'categorias'
     id_categoria = Column(Integer, primary_key=True, autoincrement=True)
@@ -65,6 +106,20 @@ class Categoria(Base):
 
 class Transacao(Base):
     __tablename__ = 'transacoes'
+    __table_args__ = (
+        # Extrato por conta (ORDER BY data) e gastos por categoria num período
+        Index('ix_transacoes_conta_data', 'id_conta', 'data'),
+        Index('ix_transacoes_categoria_data', 'id_categoria', 'data'),
+        # Detecção de duplicatas na inclusão e no 'dedupe'
+        Index('ix_transacoes_impressao_digital', 'impressao_digital'),
+        # Leitura dos IDs de um INSERT de várias linhas (database/transferencias.py)
+        Index('ix_transacoes_lote_insercao', 'lote_insercao', 'ordem_lote'),
+        # Comando 'search' no MySQL; no SQLite a busca usa a tabela FTS5 transacoes_fts
+        Index('ix_transacoes_descricao_texto', 'descricao', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+        # Sem AUTOINCREMENT, o SQLite reaproveita os maiores IDs depois que o
+        # 'archive' os move para transacoes_<ano> (o InnoDB nunca reaproveita)
+        {'sqlite_autoincrement': True},
+    )
     id_transacao = Column(Integer, primary_key=True, autoincrement=True)
     descricao = Column(String(255))
     valor = Column(Float, nullable=False)
@@ -73,6 +128,12 @@ class Transacao(Base):
 
     id_conta = Column(Integer, ForeignKey('contas.id_conta'), nullable=False)
     id_categoria = Column(Integer, ForeignKey('categorias.id_categoria'), nullable=False)
+    # SHA-256 de conta, data, valor e descrição normalizada (database/duplicatas.py)
+    impressao_digital = Column(String(64))
+    # Lote do INSERT que gravou a linha e a posição dela no lote: os IDs de um
+    # INSERT de várias linhas são lidos de volta por esta chave
+    lote_insercao = Column(String(32))
+    ordem_lote = Column(Integer)
     
 
     conta = relationship('Conta', back_populates='transacoes')
@@ -85,6 +146,69 @@ class Transacao(Base):
         return f"<Transacao(id={self.id_transacao}, valor={self.valor})>"
 
 
+class TransacaoRecorrente(Base):
+    __tablename__ = 'transacoes_recorrentes'
+    __table_args__ = (
+        # 'runschedule' lê só as regras vencidas (proxima_data <= data); NULL = regra encerrada
+        Index('ix_transacoes_recorrentes_proxima_data', 'proxima_data'),
+    )
+    id_recorrente = Column(Integer, primary_key=True, autoincrement=True)
+    descricao = Column(String(255))
+    valor = Column(Float, nullable=False)
+    frequencia = Column(String(20), nullable=False) # "diaria", "semanal", "mensal" ou "anual"
+    intervalo = Column(Integer, nullable=False, default=1) # a cada N dias/semanas/meses/anos
+    # Dia do mês das ocorrências mensais e anuais (31 vira o último dia nos meses mais curtos)
+    dia = Column(Integer, nullable=False)
+    data_inicio = Column(Date, nullable=False)
+    data_fim = Column(Date)
+    proxima_data = Column(Date)
+    data_criacao = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+    id_conta = Column(Integer, ForeignKey('contas.id_conta'), nullable=False)
+    id_categoria = Column(Integer, ForeignKey('categorias.id_categoria'), nullable=False)
+
+    def __repr__(self):
+        return f"<TransacaoRecorrente(id={self.id_recorrente}, {self.frequencia}, valor={self.valor})>"
+
+
+class ArquivoTransacoes(Base):
+    __tablename__ = 'arquivos_transacoes'
+    # Ano cujas transações foram movidas para a tabela transacoes_<ano> (comando 'archive')
+    ano = Column(Integer, primary_key=True)
+    qtd_transacoes = Column(Integer, nullable=False, default=0)
+    total = Column(Float(53), nullable=False, default=0.0)
+    data_arquivamento = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    def __repr__(self):
+        return f"<ArquivoTransacoes(ano={self.ano}, qtd={self.qtd_transacoes})>"
+
+
+class LoteTransferencia(Base):
+    __tablename__ = 'lotes_transferencia'
+    # Chave de idempotência informada pelo cliente: um lote repetido não é lançado de novo
+    chave = Column(String(100), primary_key=True)
+    hash_conteudo = Column(String(64), nullable=False)
+    qtd_transferencias = Column(Integer, nullable=False)
+    data_criacao = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    def __repr__(self):
+        return f"<LoteTransferencia(chave='{self.chave}', qtd={self.qtd_transferencias})>"
+
+
+class Transferencia(Base):
+    __tablename__ = 'transferencias'
+    # Também arquivada (transferencias_arquivo): IDs não podem ser reaproveitados
+    __table_args__ = {'sqlite_autoincrement': True}
+    id_transferencia = Column(Integer, primary_key=True, autoincrement=True)
+    id_transacao_debito = Column(Integer, ForeignKey('transacoes.id_transacao', ondelete='CASCADE'), nullable=False, unique=True)
+    id_transacao_credito = Column(Integer, ForeignKey('transacoes.id_transacao', ondelete='CASCADE'), nullable=False, unique=True)
+    chave_lote = Column(String(100), ForeignKey('lotes_transferencia.chave'), index=True)
+
+    def __repr__(self):
+        return f"<Transferencia(debito={self.id_transacao_debito}, credito={self.id_transacao_credito})>"
+
+
 class Tag(Base):
     __tablename__ = 'tags'
     id_tag = Column(Integer, primary_key=True, autoincrement=True)
@@ -100,6 +224,9 @@ class Tag(Base):
 
 class Orcamento(Base):
     __tablename__ = 'orcamentos'
+    __table_args__ = (
+        Index('ix_orcamentos_usuario_periodo', 'id_usuario', 'ano', 'mes'),
+    )
     id_orcamento = Column(Integer, primary_key=True, autoincrement=True)
     valor_planejado = Column(Float, nullable=False)
     mes = Column(Integer, nullable=False) 
@@ -117,6 +244,31 @@ class Orcamento(Base):
         return f"<Orcamento(cat_id={self.id_categoria}, valor={self.valor_planejado})>"
 
 
+class ResumoMensalCategoria(Base):
+    __tablename__ = 'resumo_mensal_categoria'
+    id_usuario = Column(Integer, ForeignKey('usuarios.id_usuario', ondelete='CASCADE'), primary_key=True)
+    id_categoria = Column(Integer, ForeignKey('categorias.id_categoria'), primary_key=True)
+    ano = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    total = Column(Float(53), nullable=False, default=0.0)
+    qtd_transacoes = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ResumoMensalCategoria(cat_id={self.id_categoria}, {self.mes}/{self.ano}, total={self.total})>"
+
+
+class VersaoEsquema(Base):
+    __tablename__ = 'versoes_esquema'
+    # Impressão digital (SHA-256 do DDL) de cada tabela, índice, procedure e trigger
+    nome = Column(String(100), primary_key=True)
+    tipo = Column(String(20), nullable=False)
+    hash = Column(String(64), nullable=False)
+    data_atualizacao = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    def __repr__(self):
+        return f"<VersaoEsquema({self.tipo} {self.nome}, hash={self.hash[:12]})>"
+
+
 class Meta(Base):
     __tablename__ = 'metas'
     id_meta = Column(Integer, primary_key=True, autoincrement=True)
@@ -130,11 +282,57 @@ class Meta(Base):
     
 
     usuario = relationship('Usuario', back_populates='metas')
+    regras = relationship('RegraMeta', back_populates='meta')
+    aportes = relationship('AporteMeta', back_populates='meta')
 
     def __repr__(self):
         return f"<Meta(id={self.id_meta}, nome='{self.nome}')>"
 
 
+class RegraMeta(Base):
+    __tablename__ = 'regras_meta'
+    # Aporte mensal da meta: valor fixo ou percentual da receita do mês numa categoria
+    id_regra = Column(Integer, primary_key=True, autoincrement=True)
+    tipo = Column(String(20), nullable=False) # "fixo" ou "percentual"
+    valor = Column(Float, nullable=False)
+    data_criacao = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+    id_meta = Column(Integer, ForeignKey('metas.id_meta', ondelete='CASCADE'), nullable=False, index=True)
+    id_categoria = Column(Integer, ForeignKey('categorias.id_categoria'))
+
+
+    meta = relationship('Meta', back_populates='regras')
+
+    def __repr__(self):
+        return f"<RegraMeta(meta_id={self.id_meta}, {self.tipo}={self.valor})>"
+
+
+class AporteMeta(Base):
+    __tablename__ = 'aportes_meta'
+    __table_args__ = (
+        # Uma regra aplicada no máximo uma vez por mês: repetir o 'applygoals' não aporta de novo
+        Index('ix_aportes_meta_regra_periodo', 'id_regra', 'ano', 'mes', unique=True),
+        # Ritmo de aportes recentes de cada meta no 'goals'
+        Index('ix_aportes_meta_meta_periodo', 'id_meta', 'ano', 'mes'),
+    )
+    id_aporte = Column(Integer, primary_key=True, autoincrement=True)
+    ano = Column(Integer, nullable=False)
+    mes = Column(Integer, nullable=False)
+    valor = Column(Float(53), nullable=False)
+    data_registro = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+    id_meta = Column(Integer, ForeignKey('metas.id_meta', ondelete='CASCADE'), nullable=False)
+    id_regra = Column(Integer, ForeignKey('regras_meta.id_regra', ondelete='SET NULL'))
+
+
+    meta = relationship('Meta', back_populates='aportes')
+
+    def __repr__(self):
+        return f"<AporteMeta(meta_id={self.id_meta}, {self.mes}/{self.ano}, valor={self.valor})>"
+
+
 class TipoInvestimento(Base):
     __tablename__ = 'tipos_investimento'
     id_tipo_investimento = Column(Integer, primary_key=True, autoincrement=True)
@@ -149,6 +347,10 @@ class TipoInvestimento(Base):
 
 class Investimento(Base):
     __tablename__ = 'investimentos'
+    __table_args__ = (
+        # Posição de um ativo na conta, procurada a cada operação ('trade')
+        Index('ix_investimentos_conta_simbolo', 'id_conta', 'simbolo'),
+    )
     id_investimento = Column(Integer, primary_key=True, autoincrement=True)
     simbolo = Column(String(20)) # Ex: "PETR4", "MXRF11"
     quantidade = Column(Float)
@@ -161,6 +363,42 @@ class Investimento(Base):
 
     conta = relationship('Conta', back_populates='investimentos')
     tipo_investimento = relationship('TipoInvestimento', back_populates='investimentos')
+    operacoes = relationship('OperacaoInvestimento', back_populates='investimento')
+
+    def __repr__(self):
+        return f"<Investimento(simbolo='{self.simbolo}', qtd={self.quantidade})>"
+
+
+class OperacaoInvestimento(Base):
+    __tablename__ = 'operacoes_investimento'
+    __table_args__ = (
+        Index('ix_operacoes_investimento_investimento_data', 'id_investimento', 'data'),
+    )
+    # Compra ou venda; quantidade e preço médio do investimento são atualizados na mesma transação
+    id_operacao = Column(Integer, primary_key=True, autoincrement=True)
+    tipo = Column(String(10), nullable=False) # "compra" ou "venda"
+    quantidade = Column(Float(53), nullable=False)
+    preco = Column(Float(53), nullable=False)
+    data = Column(Date, nullable=False, default=datetime.date.today)
+    data_registro = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+
+    id_investimento = Column(Integer, ForeignKey('investimentos.id_investimento'), nullable=False)
+
+
+    investimento = relationship('Investimento', back_populates='operacoes')
+
+    def __repr__(self):
+        return f"<OperacaoInvestimento({self.tipo} {self.quantidade} x {self.preco})>"
+
+
+class PrecoAtivo(Base):
+    __tablename__ = 'precos_ativos'
+    # Cotação de fechamento de um ativo num dia, importada de arquivo ('importprices')
+    simbolo = Column(String(20), primary_key=True)
+    data = Column(Date, primary_key=True)
+    preco = Column(Float(53), nullable=False)
+    data_importacao = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
 
     def __repr__(self):
-        return f"<Investimento(simbolo='{self.simbolo}', qtd={self.quantidade})>"
\ No newline at end of file
+        return f"<PrecoAtivo({self.simbolo} {self.data}: R${self.preco})>"
\ No newline at end of file
@@ -0,0 +1,95 @@
+# database/procedures.py
+
+import datetime
+from sqlalchemy import text, bindparam, Date
+from .connection import get_engine
+from .procedures_triggers import SQL_SELECT_GASTOS_CATEGORIA, SQL_SELECT_TRANSACOES_CONTA
+
+# Equivalentes em Python das stored procedures de procedures_triggers.py,
+# usados nos backends sem procedures (SQLite). Cada função devolve a lista
+# de conjuntos de resultados, como o stored_results() do driver MySQL.
+
+
+def sp_atualizar_saldo_meta(meta_id, valor_adicionado):
+    with get_engine().begin() as conexao:
+        conexao.execute(text("UPDATE metas SET valor_atual = valor_atual + :valor WHERE id_meta = :id_meta"),
+                        {"valor": valor_adicionado, "id_meta": meta_id})
+    return []
+
+
+def sp_calcular_gastos_categoria(p_id_usuario, p_id_categoria, p_mes, p_ano):
+    v_inicio = datetime.date(int(p_ano), int(p_mes), 1)
+    v_fim = datetime.date(v_inicio.year + v_inicio.month // 12, v_inicio.month % 12 + 1, 1)
+    consulta = text(SQL_SELECT_GASTOS_CATEGORIA).bindparams(
+        bindparam("v_inicio", type_=Date), bindparam("v_fim", type_=Date))
+    with get_engine().connect() as conexao:
+        linhas = conexao.execute(consulta, {
+            "p_id_usuario": p_id_usuario, "p_id_categoria": p_id_categoria,
+            "v_inicio": v_inicio, "v_fim": v_fim,
+        }).all()
+    return [linhas]
+
+
+def sp_obter_transacoes_conta(p_id_conta):
+    with get_engine().connect() as conexao:
+        linhas = conexao.execute(text(SQL_SELECT_TRANSACOES_CONTA).columns(data=Date),
+                                 {"p_id_conta": p_id_conta}).all()
+    return [linhas]
+
+
+def sp_registrar_transferencia(p_id_conta_origem, p_id_conta_destino, p_valor, p_descricao):
+    with get_engine().begin() as conexao:
+        categorias = dict(conexao.execute(text(
+            "SELECT nome, id_categoria FROM categorias "
+            "WHERE nome IN ('Transferência Saída', 'Transferência Entrada')"
+        )).all())
+        # Mesmas categorias padrão da procedure quando as de transferência não existem
+        v_cat_saida = categorias.get("Transferência Saída", 1)
+        v_cat_entrada = categorias.get("Transferência Entrada", 2)
+
+        inserir = text("INSERT INTO transacoes (descricao, valor, data, id_conta, id_categoria) "
+                       "VALUES (:descricao, :valor, :data, :id_conta, :id_categoria)")\
+                  .bindparams(bindparam("data", type_=Date))
+        hoje = datetime.date.today()
+        v_id_debito = conexao.execute(inserir, {
+            "descricao": f"Transferência para {p_descricao}", "valor": -abs(p_valor), "data": hoje,
+            "id_conta": p_id_conta_origem, "id_categoria": v_cat_saida,
+        }).lastrowid
+        v_id_credito = conexao.execute(inserir, {
+            "descricao": f"Transferência de {p_descricao}", "valor": abs(p_valor), "data": hoje,
+            "id_conta": p_id_conta_destino, "id_categoria": v_cat_entrada,
+        }).lastrowid
+        conexao.execute(text("INSERT INTO transferencias (id_transacao_debito, id_transacao_credito) "
+                             "VALUES (:debito, :credito)"), {"debito": v_id_debito, "credito": v_id_credito})
+    return []
+
+
+PROCEDURES = {
+    "sp_atualizar_saldo_meta": sp_atualizar_saldo_meta,
+    "sp_calcular_gastos_categoria": sp_calcular_gastos_categoria,
+    "sp_obter_transacoes_conta": sp_obter_transacoes_conta,
+    "sp_registrar_transferencia": sp_registrar_transferencia,
+}
+
+
+def chamar_procedure(nome, parametros):
+    """
+    Executa a procedure `nome`: CALL pelo driver no MySQL, a função Python
+    equivalente nos demais backends. Devolve os conjuntos de resultados.
+    """
+    engine = get_engine()
+    if engine.dialect.name != "mysql":
+        if nome not in PROCEDURES:
+            raise ValueError(f"procedure '{nome}' não existe")
+        return PROCEDURES[nome](*parametros)
+
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        cursor.callproc(nome, parametros)
+        resultados = [resultado.fetchall() for resultado in getattr(cursor, "stored_results", lambda: [])()]
+        cursor.close()
+        conexao.commit()
+        return resultados
+    finally:
+        conexao.close()
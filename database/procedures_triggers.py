@@ -1,5 +1,6 @@
+import re
 from sqlalchemy import text
-from .connection import engine
+from .connection import get_engine
 
 
 
@@ -36,32 +37,23 @@ END
 """
 
 
-SQL_SP_GASTOS_CATEGORIA = """
-CREATE PROCEDURE sp_calcular_gastos_categoria(
-    IN p_id_usuario INT, 
-    IN p_id_categoria INT, 
-    IN p_mes INT, 
-    IN p_ano INT
-)
-BEGIN
+# Os SELECTs dos relatórios ficam separados das procedures para que o
+# comando 'explain' analise exatamente a mesma consulta (com :parametros).
+SQL_SELECT_GASTOS_CATEGORIA = """
     SELECT 
         c.nome AS categoria,
         SUM(t.valor) AS total_gasto
     FROM transacoes t
     JOIN contas ct ON t.id_conta = ct.id_conta
     JOIN categorias c ON t.id_categoria = c.id_categoria
-    WHERE ct.id_usuario = p_id_usuario
-      AND t.id_categoria = p_id_categoria
-      AND MONTH(t.data) = p_mes
-      AND YEAR(t.data) = p_ano
+    WHERE ct.id_usuario = :p_id_usuario
+      AND t.id_categoria = :p_id_categoria
+      AND t.data >= :v_inicio
+      AND t.data < :v_fim
       AND c.tipo = 'Despesa'
-    GROUP BY c.nome;
-END
-"""
+    GROUP BY c.nome"""
 
-SQL_SP_OBTER_TRANSACOES_CONTA = """
-CREATE PROCEDURE sp_obter_transacoes_conta(IN p_id_conta INT)
-BEGIN
+SQL_SELECT_TRANSACOES_CONTA = """
     SELECT 
         t.id_transacao, 
         t.descricao, 
@@ -70,8 +62,34 @@ BEGIN
         c.nome AS categoria
     FROM transacoes t
     JOIN categorias c ON t.id_categoria = c.id_categoria
-    WHERE t.id_conta = p_id_conta
-    ORDER BY t.data DESC;
+    WHERE t.id_conta = :p_id_conta
+    ORDER BY t.data DESC, t.id_transacao DESC"""
+
+
+def _corpo_procedure(select_sql):
+    """Troca os :parametros do SELECT pelas variáveis da procedure."""
+    return select_sql.replace(":p_", "p_").replace(":v_", "v_")
+
+
+SQL_SP_GASTOS_CATEGORIA = f"""
+CREATE PROCEDURE sp_calcular_gastos_categoria(
+    IN p_id_usuario INT, 
+    IN p_id_categoria INT, 
+    IN p_mes INT, 
+    IN p_ano INT
+)
+BEGIN
+    -- Intervalo semiaberto [inicio, fim) permite range scan no índice de data
+    DECLARE v_inicio DATE DEFAULT MAKEDATE(p_ano, 1) + INTERVAL (p_mes - 1) MONTH;
+    DECLARE v_fim DATE DEFAULT v_inicio + INTERVAL 1 MONTH;
+{_corpo_procedure(SQL_SELECT_GASTOS_CATEGORIA)};
+END
+"""
+
+SQL_SP_OBTER_TRANSACOES_CONTA = f"""
+CREATE PROCEDURE sp_obter_transacoes_conta(IN p_id_conta INT)
+BEGIN
+{_corpo_procedure(SQL_SELECT_TRANSACOES_CONTA)};
 END
 """
 
@@ -84,31 +102,33 @@ CREATE PROCEDURE sp_registrar_transferencia(
     IN p_descricao VARCHAR(255)
 )
 BEGIN
-    DECLARE id_cat_transferencia INT;
-    
-    -- Assume que existe uma categoria "Transferência" (tipo Despesa)
-    -- Para uma implementação robusta, você criaria uma categoria específica
-    -- Vamos usar a categoria 10 (genérica) para este exemplo.
-    -- O ideal é buscar o ID da categoria "Transferência"
-    SET id_cat_transferencia = (SELECT id_categoria FROM categorias WHERE nome = 'Transferência Saída' LIMIT 1);
-    
-    -- Se não existir, use uma categoria padrão (ex: ID 1, ajuste conforme seu seed)
-    IF id_cat_transferencia IS NULL THEN
-        SET id_cat_transferencia = 1; 
-    END IF;
+    DECLARE v_cat_saida INT;
+    DECLARE v_cat_entrada INT;
+    DECLARE v_id_debito INT;
+
+    -- As duas categorias de transferência numa única leitura
+    SELECT MAX(CASE WHEN nome = 'Transferência Saída' THEN id_categoria END),
+           MAX(CASE WHEN nome = 'Transferência Entrada' THEN id_categoria END)
+    INTO v_cat_saida, v_cat_entrada
+    FROM categorias
+    WHERE nome IN ('Transferência Saída', 'Transferência Entrada');
+
+    -- Se não existirem, use as categorias padrão (ajuste conforme seu seed)
+    SET v_cat_saida = COALESCE(v_cat_saida, 1);
+    SET v_cat_entrada = COALESCE(v_cat_entrada, 2);
 
     -- Inserir transação de débito (saída)
     INSERT INTO transacoes (descricao, valor, data, id_conta, id_categoria)
-    VALUES (CONCAT('Transferência para ', p_descricao), -ABS(p_valor), CURDATE(), p_id_conta_origem, id_cat_transferencia);
-    
+    VALUES (CONCAT('Transferência para ', p_descricao), -ABS(p_valor), CURDATE(), p_id_conta_origem, v_cat_saida);
+    SET v_id_debito = LAST_INSERT_ID();
+
     -- Inserir transação de crédito (entrada)
-    SET id_cat_transferencia = (SELECT id_categoria FROM categorias WHERE nome = 'Transferência Entrada' LIMIT 1);
-    IF id_cat_transferencia IS NULL THEN
-        SET id_cat_transferencia = 2; 
-    END IF;
-    
     INSERT INTO transacoes (descricao, valor, data, id_conta, id_categoria)
-    VALUES (CONCAT('Transferência de ', p_descricao), ABS(p_valor), CURDATE(), p_id_conta_destino, id_cat_transferencia);
+    VALUES (CONCAT('Transferência de ', p_descricao), ABS(p_valor), CURDATE(), p_id_conta_destino, v_cat_entrada);
+
+    -- Liga as duas pernas da transferência
+    INSERT INTO transferencias (id_transacao_debito, id_transacao_credito)
+    VALUES (v_id_debito, LAST_INSERT_ID());
 END
 """
 
@@ -160,12 +180,468 @@ END
 
 
 
+# Mantêm a tabela saldos_conta em dia a cada escrita em transacoes, para que
+# o balanço leia uma linha por conta em vez de somar todo o histórico.
+SQL_TR_SALDO_INSERIR_TRANSACAO = """
+CREATE TRIGGER tr_depois_inserir_transacao_saldo
+AFTER INSERT ON transacoes
+FOR EACH ROW
+BEGIN
+    INSERT INTO saldos_conta (id_conta, saldo, qtd_transacoes, versao)
+    VALUES (NEW.id_conta, NEW.valor, 1, 1)
+    ON DUPLICATE KEY UPDATE
+        saldo = saldo + NEW.valor,
+        qtd_transacoes = qtd_transacoes + 1,
+        versao = versao + 1;
+END
+"""
 
-def criar_procedures_e_triggers():
-    """
-    Executa o SQL puro para criar tabelas de log, procedures e triggers.
-    """
-    comandos_sql = [
+
+SQL_TR_SALDO_ATUALIZAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_atualizar_transacao_saldo
+AFTER UPDATE ON transacoes
+FOR EACH ROW
+BEGIN
+    IF OLD.id_conta <> NEW.id_conta OR OLD.valor <> NEW.valor THEN
+        UPDATE saldos_conta
+        SET saldo = saldo - OLD.valor,
+            qtd_transacoes = qtd_transacoes - 1,
+            versao = versao + 1
+        WHERE id_conta = OLD.id_conta;
+
+        INSERT INTO saldos_conta (id_conta, saldo, qtd_transacoes, versao)
+        VALUES (NEW.id_conta, NEW.valor, 1, 1)
+        ON DUPLICATE KEY UPDATE
+            saldo = saldo + NEW.valor,
+            qtd_transacoes = qtd_transacoes + 1,
+            versao = versao + 1;
+    ELSEIF OLD.id_categoria <> NEW.id_categoria OR OLD.data <> NEW.data THEN
+        UPDATE saldos_conta
+        SET versao = versao + 1
+        WHERE id_conta = NEW.id_conta;
+    END IF;
+END
+"""
+
+
+# Os triggers de DELETE ignoram as linhas movidas pelo 'archive' (que liga
+# @julius_arquivando na própria conexão): o saldo, os resumos e os
+# checkpoints continuam valendo para o histórico completo.
+SQL_TR_SALDO_DELETAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_deletar_transacao_saldo
+AFTER DELETE ON transacoes
+FOR EACH ROW
+BEGIN
+    IF @julius_arquivando IS NULL THEN
+        UPDATE saldos_conta
+        SET saldo = saldo - OLD.valor,
+            qtd_transacoes = qtd_transacoes - 1,
+            versao = versao + 1
+        WHERE id_conta = OLD.id_conta;
+    END IF;
+END
+"""
+
+
+
+# Tags não passam por saldos_conta, mas mudam o que o motor analítico lê:
+# incluir ou remover uma tag também incrementa a versão da conta.
+SQL_TR_VERSAO_INSERIR_TAG = """
+CREATE TRIGGER tr_depois_inserir_transacao_tag
+AFTER INSERT ON transacao_tag
+FOR EACH ROW
+BEGIN
+    UPDATE saldos_conta
+    SET versao = versao + 1
+    WHERE id_conta = (SELECT id_conta FROM transacoes WHERE id_transacao = NEW.transacao_id);
+END
+"""
+
+
+SQL_TR_VERSAO_DELETAR_TAG = """
+CREATE TRIGGER tr_depois_deletar_transacao_tag
+AFTER DELETE ON transacao_tag
+FOR EACH ROW
+BEGIN
+    UPDATE saldos_conta
+    SET versao = versao + 1
+    WHERE id_conta = (SELECT id_conta FROM transacoes WHERE id_transacao = OLD.transacao_id);
+END
+"""
+
+
+# Mantêm resumo_mensal_categoria, o total por (usuário, categoria, ano, mês)
+# usado pelo relatório de orçamento.
+SQL_TR_RESUMO_INSERIR_TRANSACAO = """
+CREATE TRIGGER tr_depois_inserir_transacao_resumo
+AFTER INSERT ON transacoes
+FOR EACH ROW
+BEGIN
+    DECLARE v_id_usuario INT;
+
+    SELECT id_usuario INTO v_id_usuario FROM contas WHERE id_conta = NEW.id_conta;
+
+    INSERT INTO resumo_mensal_categoria (id_usuario, id_categoria, ano, mes, total, qtd_transacoes)
+    VALUES (v_id_usuario, NEW.id_categoria, YEAR(NEW.data), MONTH(NEW.data), NEW.valor, 1)
+    ON DUPLICATE KEY UPDATE
+        total = total + NEW.valor,
+        qtd_transacoes = qtd_transacoes + 1;
+END
+"""
+
+
+SQL_TR_RESUMO_ATUALIZAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_atualizar_transacao_resumo
+AFTER UPDATE ON transacoes
+FOR EACH ROW
+BEGIN
+    DECLARE v_id_usuario INT;
+
+    IF OLD.id_conta <> NEW.id_conta OR OLD.id_categoria <> NEW.id_categoria
+       OR OLD.data <> NEW.data OR OLD.valor <> NEW.valor THEN
+
+        SELECT id_usuario INTO v_id_usuario FROM contas WHERE id_conta = OLD.id_conta;
+
+        UPDATE resumo_mensal_categoria
+        SET total = total - OLD.valor,
+            qtd_transacoes = qtd_transacoes - 1
+        WHERE id_usuario = v_id_usuario
+          AND id_categoria = OLD.id_categoria
+          AND ano = YEAR(OLD.data)
+          AND mes = MONTH(OLD.data);
+
+        SELECT id_usuario INTO v_id_usuario FROM contas WHERE id_conta = NEW.id_conta;
+
+        INSERT INTO resumo_mensal_categoria (id_usuario, id_categoria, ano, mes, total, qtd_transacoes)
+        VALUES (v_id_usuario, NEW.id_categoria, YEAR(NEW.data), MONTH(NEW.data), NEW.valor, 1)
+        ON DUPLICATE KEY UPDATE
+            total = total + NEW.valor,
+            qtd_transacoes = qtd_transacoes + 1;
+    END IF;
+END
+"""
+
+
+SQL_TR_RESUMO_DELETAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_deletar_transacao_resumo
+AFTER DELETE ON transacoes
+FOR EACH ROW
+BEGIN
+    DECLARE v_id_usuario INT;
+
+    IF @julius_arquivando IS NULL THEN
+        SELECT id_usuario INTO v_id_usuario FROM contas WHERE id_conta = OLD.id_conta;
+
+        UPDATE resumo_mensal_categoria
+        SET total = total - OLD.valor,
+            qtd_transacoes = qtd_transacoes - 1
+        WHERE id_usuario = v_id_usuario
+          AND id_categoria = OLD.id_categoria
+          AND ano = YEAR(OLD.data)
+          AND mes = MONTH(OLD.data);
+    END IF;
+END
+"""
+
+
+
+# Um checkpoint guarda a soma das transações anteriores à sua data. Uma
+# transação com data retroativa invalida os checkpoints posteriores a ela,
+# que são recriados sob demanda por database/historico.py.
+SQL_TR_CHECKPOINT_INSERIR_TRANSACAO = """
+CREATE TRIGGER tr_depois_inserir_transacao_checkpoint
+AFTER INSERT ON transacoes
+FOR EACH ROW
+BEGIN
+    DELETE FROM checkpoints_saldo
+    WHERE id_conta = NEW.id_conta AND data > NEW.data;
+END
+"""
+
+
+SQL_TR_CHECKPOINT_ATUALIZAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_atualizar_transacao_checkpoint
+AFTER UPDATE ON transacoes
+FOR EACH ROW
+BEGIN
+    IF OLD.id_conta <> NEW.id_conta OR OLD.data <> NEW.data OR OLD.valor <> NEW.valor THEN
+        DELETE FROM checkpoints_saldo
+        WHERE id_conta = OLD.id_conta AND data > OLD.data;
+
+        DELETE FROM checkpoints_saldo
+        WHERE id_conta = NEW.id_conta AND data > NEW.data;
+    END IF;
+END
+"""
+
+
+SQL_TR_CHECKPOINT_DELETAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_deletar_transacao_checkpoint
+AFTER DELETE ON transacoes
+FOR EACH ROW
+BEGIN
+    IF @julius_arquivando IS NULL THEN
+        DELETE FROM checkpoints_saldo
+        WHERE id_conta = OLD.id_conta AND data > OLD.data;
+    END IF;
+END
+"""
+
+
+
+
+# --- Versões SQLite (settings.DB_BACKEND = "sqlite") ---
+# O SQLite não tem stored procedures (veja database/procedures.py) e um
+# trigger BEFORE não pode alterar NEW. Por isso cada evento de transacoes
+# tem um único trigger AFTER, com ordem garantida entre os passos: o
+# ajuste de sinal de tr_antes_inserir_transacao é um UPDATE no fim do
+# trigger de INSERT, e o trigger de UPDATE corrige saldos e resumos.
+
+SQLITE_CREATE_LOG_USUARIOS = """
+CREATE TABLE IF NOT EXISTS log_atualizacao_usuarios (
+    id_log INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_usuario INTEGER,
+    email_antigo VARCHAR(100),
+    email_novo VARCHAR(100),
+    data_modificacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+SQLITE_CREATE_CONTAS_BACKUP = """
+CREATE TABLE IF NOT EXISTS contas_backup (
+    id_conta INTEGER PRIMARY KEY,
+    nome_conta VARCHAR(100),
+    tipo_conta VARCHAR(50),
+    saldo_inicial FLOAT,
+    id_usuario INTEGER,
+    data_exclusao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+SQLITE_TR_LOG_UPDATE_USUARIO = """
+CREATE TRIGGER tr_antes_atualizar_email_usuario
+BEFORE UPDATE OF email ON usuarios
+FOR EACH ROW
+WHEN OLD.email <> NEW.email
+BEGIN
+    INSERT INTO log_atualizacao_usuarios (id_usuario, email_antigo, email_novo)
+    VALUES (OLD.id_usuario, OLD.email, NEW.email);
+END
+"""
+
+
+SQLITE_TR_BACKUP_DELETE_CONTA = """
+CREATE TRIGGER tr_depois_deletar_conta
+AFTER DELETE ON contas
+FOR EACH ROW
+BEGIN
+    INSERT OR REPLACE INTO contas_backup (id_conta, nome_conta, tipo_conta, saldo_inicial, id_usuario)
+    VALUES (OLD.id_conta, OLD.nome_conta, OLD.tipo_conta, OLD.saldo_inicial, OLD.id_usuario);
+END
+"""
+
+
+SQLITE_TR_INSERIR_TRANSACAO = """
+CREATE TRIGGER tr_depois_inserir_transacao
+AFTER INSERT ON transacoes
+FOR EACH ROW
+BEGIN
+    INSERT INTO saldos_conta (id_conta, saldo, qtd_transacoes, versao)
+    VALUES (NEW.id_conta, NEW.valor, 1, 1)
+    ON CONFLICT (id_conta) DO UPDATE SET
+        saldo = saldo + excluded.saldo,
+        qtd_transacoes = qtd_transacoes + 1,
+        versao = versao + 1;
+
+    INSERT INTO resumo_mensal_categoria (id_usuario, id_categoria, ano, mes, total, qtd_transacoes)
+    VALUES ((SELECT id_usuario FROM contas WHERE id_conta = NEW.id_conta), NEW.id_categoria,
+            CAST(strftime('%Y', NEW.data) AS INTEGER), CAST(strftime('%m', NEW.data) AS INTEGER), NEW.valor, 1)
+    ON CONFLICT (id_usuario, id_categoria, ano, mes) DO UPDATE SET
+        total = total + excluded.total,
+        qtd_transacoes = qtd_transacoes + 1;
+
+    DELETE FROM checkpoints_saldo
+    WHERE id_conta = NEW.id_conta AND data > NEW.data;
+
+    -- Equivalente a tr_antes_inserir_transacao; o UPDATE dispara o trigger
+    -- abaixo, que troca o valor antigo pelo novo em saldos e resumos
+    UPDATE transacoes
+    SET valor = -valor
+    WHERE id_transacao = NEW.id_transacao
+      AND ((NEW.valor > 0 AND (SELECT tipo FROM categorias WHERE id_categoria = NEW.id_categoria) = 'Despesa')
+        OR (NEW.valor < 0 AND (SELECT tipo FROM categorias WHERE id_categoria = NEW.id_categoria) = 'Receita'));
+END
+"""
+
+
+SQLITE_TR_ATUALIZAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_atualizar_transacao
+AFTER UPDATE ON transacoes
+FOR EACH ROW
+WHEN OLD.id_conta <> NEW.id_conta OR OLD.id_categoria <> NEW.id_categoria
+  OR OLD.data <> NEW.data OR OLD.valor <> NEW.valor
+BEGIN
+    UPDATE saldos_conta
+    SET saldo = saldo - OLD.valor,
+        qtd_transacoes = qtd_transacoes - 1,
+        versao = versao + 1
+    WHERE id_conta = OLD.id_conta;
+
+    INSERT INTO saldos_conta (id_conta, saldo, qtd_transacoes, versao)
+    VALUES (NEW.id_conta, NEW.valor, 1, 1)
+    ON CONFLICT (id_conta) DO UPDATE SET
+        saldo = saldo + excluded.saldo,
+        qtd_transacoes = qtd_transacoes + 1,
+        versao = versao + 1;
+
+    UPDATE resumo_mensal_categoria
+    SET total = total - OLD.valor,
+        qtd_transacoes = qtd_transacoes - 1
+    WHERE id_usuario = (SELECT id_usuario FROM contas WHERE id_conta = OLD.id_conta)
+      AND id_categoria = OLD.id_categoria
+      AND ano = CAST(strftime('%Y', OLD.data) AS INTEGER)
+      AND mes = CAST(strftime('%m', OLD.data) AS INTEGER);
+
+    INSERT INTO resumo_mensal_categoria (id_usuario, id_categoria, ano, mes, total, qtd_transacoes)
+    VALUES ((SELECT id_usuario FROM contas WHERE id_conta = NEW.id_conta), NEW.id_categoria,
+            CAST(strftime('%Y', NEW.data) AS INTEGER), CAST(strftime('%m', NEW.data) AS INTEGER), NEW.valor, 1)
+    ON CONFLICT (id_usuario, id_categoria, ano, mes) DO UPDATE SET
+        total = total + excluded.total,
+        qtd_transacoes = qtd_transacoes + 1;
+
+    DELETE FROM checkpoints_saldo
+    WHERE id_conta = OLD.id_conta AND data > OLD.data;
+
+    DELETE FROM checkpoints_saldo
+    WHERE id_conta = NEW.id_conta AND data > NEW.data;
+END
+"""
+
+
+# O SQLite não tem variáveis de sessão: o 'archive' grava uma linha nesta
+# tabela dentro da própria transação (invisível para as demais conexões)
+SQLITE_CREATE_ARQUIVAMENTO = """
+CREATE TABLE IF NOT EXISTS arquivamento_em_andamento (
+    ativo INTEGER NOT NULL
+);
+"""
+
+SQLITE_TR_DELETAR_TRANSACAO = """
+CREATE TRIGGER tr_depois_deletar_transacao
+AFTER DELETE ON transacoes
+FOR EACH ROW
+WHEN NOT EXISTS (SELECT 1 FROM arquivamento_em_andamento)
+BEGIN
+    UPDATE saldos_conta
+    SET saldo = saldo - OLD.valor,
+        qtd_transacoes = qtd_transacoes - 1,
+        versao = versao + 1
+    WHERE id_conta = OLD.id_conta;
+
+    UPDATE resumo_mensal_categoria
+    SET total = total - OLD.valor,
+        qtd_transacoes = qtd_transacoes - 1
+    WHERE id_usuario = (SELECT id_usuario FROM contas WHERE id_conta = OLD.id_conta)
+      AND id_categoria = OLD.id_categoria
+      AND ano = CAST(strftime('%Y', OLD.data) AS INTEGER)
+      AND mes = CAST(strftime('%m', OLD.data) AS INTEGER);
+
+    DELETE FROM checkpoints_saldo
+    WHERE id_conta = OLD.id_conta AND data > OLD.data;
+END
+"""
+
+
+
+
+# Índice de texto das descrições para o comando 'search' (FTS5 com conteúdo
+# externo: guarda só os tokens, o texto continua em transacoes). No MySQL o
+# índice é o FULLTEXT declarado em models.py. Os triggers de FTS não olham
+# arquivamento_em_andamento: as linhas arquivadas saem deste índice e vão
+# para o transacoes_<ano>_fts do arquivo.
+SQLITE_CREATE_TRANSACOES_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transacoes_fts USING fts5(
+    descricao,
+    content='transacoes',
+    content_rowid='id_transacao',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+SQLITE_CREATE_FTS_ARQUIVO = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {tabela}_fts USING fts5(
+    descricao,
+    content='{tabela}',
+    content_rowid='id_transacao',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+SQLITE_TR_FTS_INSERIR_TRANSACAO = """
+CREATE TRIGGER tr_fts_inserir_transacao
+AFTER INSERT ON transacoes
+FOR EACH ROW
+BEGIN
+    INSERT INTO transacoes_fts (rowid, descricao) VALUES (NEW.id_transacao, NEW.descricao);
+END
+"""
+
+SQLITE_TR_FTS_ATUALIZAR_TRANSACAO = """
+CREATE TRIGGER tr_fts_atualizar_transacao
+AFTER UPDATE OF descricao ON transacoes
+FOR EACH ROW
+BEGIN
+    INSERT INTO transacoes_fts (transacoes_fts, rowid, descricao) VALUES ('delete', OLD.id_transacao, OLD.descricao);
+    INSERT INTO transacoes_fts (rowid, descricao) VALUES (NEW.id_transacao, NEW.descricao);
+END
+"""
+
+SQLITE_TR_FTS_DELETAR_TRANSACAO = """
+CREATE TRIGGER tr_fts_deletar_transacao
+AFTER DELETE ON transacoes
+FOR EACH ROW
+BEGIN
+    INSERT INTO transacoes_fts (transacoes_fts, rowid, descricao) VALUES ('delete', OLD.id_transacao, OLD.descricao);
+END
+"""
+
+
+def _comandos_sqlite():
+    return [
+        SQLITE_CREATE_LOG_USUARIOS,
+        SQLITE_CREATE_CONTAS_BACKUP,
+        SQLITE_TR_LOG_UPDATE_USUARIO,
+        SQLITE_TR_BACKUP_DELETE_CONTA,
+        SQLITE_CREATE_ARQUIVAMENTO,
+        SQLITE_TR_INSERIR_TRANSACAO,
+        SQLITE_TR_ATUALIZAR_TRANSACAO,
+        SQLITE_TR_DELETAR_TRANSACAO,
+        SQL_TR_VERSAO_INSERIR_TAG,
+        SQL_TR_VERSAO_DELETAR_TAG,
+        SQLITE_CREATE_TRANSACOES_FTS,
+        SQLITE_TR_FTS_INSERIR_TRANSACAO,
+        SQLITE_TR_FTS_ATUALIZAR_TRANSACAO,
+        SQLITE_TR_FTS_DELETAR_TRANSACAO
+    ]
+
+
+_PADRAO_NOME = re.compile(r"CREATE\s+(PROCEDURE|TRIGGER|(?:VIRTUAL\s+)?TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+(\w+)",
+                          re.IGNORECASE)
+
+
+def nome_objeto(sql):
+    """(tipo, nome) do objeto criado pelo SQL: 'procedure', 'trigger' ou 'tabela'."""
+    tipo, nome = _PADRAO_NOME.search(sql).groups()
+    tipo = tipo.split()[0].lower()
+    return ("tabela" if tipo in ("table", "virtual") else tipo), nome
+
+
+def comandos_do_dialeto(dialeto):
+    """Tabelas de log, procedures e triggers do dialeto, na ordem de criação."""
+    if dialeto == "sqlite":
+        return _comandos_sqlite()
+    return [
         SQL_CREATE_LOG_USUARIOS,
         SQL_CREATE_CONTAS_BACKUP,
         SQL_SP_ATUALIZAR_META,
@@ -174,22 +650,40 @@ def criar_procedures_e_triggers():
         SQL_SP_REGISTRAR_TRANSFERENCIA,
         SQL_TR_LOG_UPDATE_USUARIO,
         SQL_TR_BACKUP_DELETE_CONTA,
-        SQL_TR_VALIDAR_VALOR_TRANSACAO
+        SQL_TR_VALIDAR_VALOR_TRANSACAO,
+        SQL_TR_SALDO_INSERIR_TRANSACAO,
+        SQL_TR_SALDO_ATUALIZAR_TRANSACAO,
+        SQL_TR_SALDO_DELETAR_TRANSACAO,
+        SQL_TR_VERSAO_INSERIR_TAG,
+        SQL_TR_VERSAO_DELETAR_TAG,
+        SQL_TR_RESUMO_INSERIR_TRANSACAO,
+        SQL_TR_RESUMO_ATUALIZAR_TRANSACAO,
+        SQL_TR_RESUMO_DELETAR_TRANSACAO,
+        SQL_TR_CHECKPOINT_INSERIR_TRANSACAO,
+        SQL_TR_CHECKPOINT_ATUALIZAR_TRANSACAO,
+        SQL_TR_CHECKPOINT_DELETAR_TRANSACAO
     ]
+
+
+def criar_procedures_e_triggers(comandos=None):
+    """
+    Executa o SQL puro para criar tabelas de log, procedures e triggers
+    (por padrão, todos os do dialeto; database/esquema.py passa só os que
+    mudaram). No SQLite cria as versões SQLite dos triggers; as procedures
+    ficam em database/procedures.py.
+    """
+    comandos_sql = comandos if comandos is not None else comandos_do_dialeto(get_engine().dialect.name)
     
     try:
-        with engine.connect() as connection:
+        with get_engine().connect() as connection:
             print("Iniciando criação de procedures e triggers...")
             
             for i, sql in enumerate(comandos_sql):
 
                 try:
-                    if "PROCEDURE" in sql:
-                        proc_name = sql.split(" ")[2].split("(")[0]
-                        connection.execute(text(f"DROP PROCEDURE IF EXISTS {proc_name}"))
-                    elif "TRIGGER" in sql:
-                        trigger_name = sql.split(" ")[2]
-                        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name}"))
+                    tipo, nome = nome_objeto(sql)
+                    if tipo in ("procedure", "trigger"):
+                        connection.execute(text(f"DROP {tipo.upper()} IF EXISTS {nome}"))
                 except Exception as e:
 
                     pass 
@@ -198,9 +692,13 @@ def criar_procedures_e_triggers():
                 connection.execute(text(sql))
                 print(f"  -> Comando {i+1}/{len(comandos_sql)} executado com sucesso.")
 
+            # No MySQL o DDL já é confirmado sozinho; no SQLite ele é transacional
+            connection.commit()
             print("Procedures e triggers criados com sucesso!")
+        return True
             
     except Exception as e:
         print(f"\nErro ao executar SQL puro: {e}")
         print("Verifique a sintaxe SQL e as permissões do usuário 'julius_user'.")
-        print("O usuário 'julius_user' precisa de permissão para CREATE ROUTINE e TRIGGER.")
\ No newline at end of file
+        print("O usuário 'julius_user' precisa de permissão para CREATE ROUTINE e TRIGGER.")
+        return False
@@ -0,0 +1,192 @@
+# database/recorrentes.py
+
+import calendar
+import datetime
+import time
+from sqlalchemy import select, insert, update, bindparam
+from .connection import get_engine, session
+from .models import Conta, Categoria, Transacao, TransacaoRecorrente
+from .functions import _confirmar, _desfazer
+from .duplicatas import impressao_digital
+from . import referencias
+from utils.helpers import agrupar_em_lotes
+from config.settings import RECORRENCIA_TAMANHO_LOTE, IMPORT_TAMANHO_LOTE
+
+FREQUENCIAS = ("diaria", "semanal", "mensal", "anual")
+
+
+def _no_dia(ano, mes, dia):
+    """Data no dia `dia` do mês, ou no último dia se o mês é mais curto."""
+    return datetime.date(ano, mes, min(dia, calendar.monthrange(ano, mes)[1]))
+
+
+def proxima_ocorrencia(data, frequencia, intervalo, dia):
+    """Ocorrência seguinte a `data` na regra."""
+    if frequencia == "diaria":
+        return data + datetime.timedelta(days=intervalo)
+    if frequencia == "semanal":
+        return data + datetime.timedelta(weeks=intervalo)
+    if frequencia == "mensal":
+        indice = data.year * 12 + data.month - 1 + intervalo
+        return _no_dia(indice // 12, indice % 12 + 1, dia)
+    if frequencia == "anual":
+        return _no_dia(data.year + intervalo, data.month, dia)
+    raise ValueError(f"frequência '{frequencia}' inválida")
+
+
+def ocorrencias(proxima, frequencia, intervalo, dia, data_fim, ate):
+    """
+    (datas vencidas até `ate`, nova proxima_data) de uma regra. A nova
+    proxima_data é None quando a regra passou de data_fim.
+    """
+    datas = []
+    while proxima is not None and proxima <= ate:
+        datas.append(proxima)
+        proxima = proxima_ocorrencia(proxima, frequencia, intervalo, dia)
+        if data_fim is not None and proxima > data_fim:
+            proxima = None
+    return datas, proxima
+
+
+def criar_recorrente(id_conta, id_categoria, valor, descricao, frequencia, intervalo=1,
+                     data_inicio_str=None, data_fim_str=None):
+    """
+    Cria uma transação recorrente (aluguel, salário, assinaturas). As
+    ocorrências são lançadas pelo 'runschedule', a partir de data_inicio
+    (padrão: hoje). Mensais e anuais repetem o dia de data_inicio.
+    """
+    try:
+        if frequencia not in FREQUENCIAS:
+            print(f"Erro: frequência '{frequencia}' inválida (use {', '.join(FREQUENCIAS)}).")
+            return None
+        if intervalo < 1:
+            print("Erro: o intervalo deve ser de pelo menos 1.")
+            return None
+        data_inicio = datetime.datetime.strptime(data_inicio_str, '%Y-%m-%d').date() if data_inicio_str \
+            else datetime.date.today()
+        data_fim = datetime.datetime.strptime(data_fim_str, '%Y-%m-%d').date() if data_fim_str else None
+        if data_fim is not None and data_fim < data_inicio:
+            print("Erro: a data final é anterior à data inicial.")
+            return None
+        if session.get(Conta, id_conta) is None:
+            print(f"Erro: Conta ID {id_conta} não existe.")
+            return None
+
+        # Mesmo sinal que o trigger daria a cada ocorrência
+        try:
+            valor = referencias.normalizar_valor(id_categoria, valor)
+        except ValueError:
+            categoria = session.get(Categoria, id_categoria)
+            if categoria is None:
+                print(f"Erro: Categoria ID {id_categoria} não existe.")
+                return None
+            valor = referencias.ajustar_sinal(categoria.tipo, valor)
+
+        nova_regra = TransacaoRecorrente(
+            id_conta=id_conta,
+            id_categoria=id_categoria,
+            valor=valor,
+            descricao=descricao,
+            frequencia=frequencia,
+            intervalo=intervalo,
+            dia=data_inicio.day,
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            proxima_data=data_inicio
+        )
+        session.add(nova_regra)
+        _confirmar(flush=True)
+        print(f"Transação recorrente de R${valor:.2f} ('{descricao}'), {frequencia}, a partir de {data_inicio} "
+              f"criada (ID: {nova_regra.id_recorrente}).")
+        return nova_regra
+    except Exception as e:
+        _desfazer()
+        print(f"Erro ao criar transação recorrente: {e}")
+        return None
+
+
+def _gerar_faixa(conexao, primeiro, ultimo, ate):
+    """
+    Lança as ocorrências vencidas das regras de IDs [primeiro, ultimo] e
+    avança proxima_data delas, na mesma transação: uma falha desfaz as
+    duas coisas, então nada é lançado duas vezes. O UPDATE só vale se
+    proxima_data ainda é a lida; outra execução simultânea que já avançou
+    a regra faz a faixa inteira ser desfeita. Devolve (regras, transações).
+    """
+    R = TransacaoRecorrente.__table__
+    regras = conexao.execute(
+        select(R.c.id_recorrente, R.c.id_conta, R.c.id_categoria, R.c.valor, R.c.descricao, R.c.frequencia,
+               R.c.intervalo, R.c.dia, R.c.data_fim, R.c.proxima_data)
+        .where(R.c.id_recorrente.between(primeiro, ultimo), R.c.proxima_data <= ate)
+        .with_for_update()
+    ).all()
+
+    avancos = []
+
+    def linhas():
+        for regra in regras:
+            datas, proxima = ocorrencias(regra.proxima_data, regra.frequencia, regra.intervalo, regra.dia,
+                                         regra.data_fim, ate)
+            avancos.append({"b_id": regra.id_recorrente, "b_anterior": regra.proxima_data, "b_proxima": proxima})
+            for data in datas:
+                yield {"id_conta": regra.id_conta, "id_categoria": regra.id_categoria, "valor": regra.valor,
+                       "descricao": regra.descricao, "data": data,
+                       "impressao_digital": impressao_digital(regra.id_conta, data, regra.valor, regra.descricao)}
+
+    lancadas = 0
+    for lote in agrupar_em_lotes(linhas(), IMPORT_TAMANHO_LOTE):
+        conexao.execute(insert(Transacao.__table__), lote)
+        lancadas += len(lote)
+
+    if avancos:
+        avancadas = conexao.execute(
+            update(R).where(R.c.id_recorrente == bindparam("b_id"), R.c.proxima_data == bindparam("b_anterior"))
+            .values(proxima_data=bindparam("b_proxima")),
+            avancos
+        ).rowcount
+        if conexao.dialect.supports_sane_multi_rowcount and avancadas != len(avancos):
+            raise RuntimeError(f"regras {primeiro}-{ultimo} foram alteradas por outra execução")
+    return len(avancos), lancadas
+
+
+def executar_agenda(data_str=None, tamanho_lote=None):
+    """
+    Lança todas as ocorrências vencidas até a data (padrão: hoje) das
+    transações recorrentes. As regras vencidas são lidas pelo índice de
+    proxima_data, em faixas de IDs, uma transação por faixa, e as
+    ocorrências de cada faixa entram com executemany. Depois de semanas
+    sem rodar, uma única execução põe tudo em dia; repetir o comando não
+    lança nada de novo.
+    """
+    tamanho_lote = tamanho_lote or RECORRENCIA_TAMANHO_LOTE
+    regras = lancadas = faixas = 0
+    inicio = time.perf_counter()
+
+    try:
+        ate = datetime.datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else datetime.date.today()
+        with get_engine().connect() as conexao:
+            R = TransacaoRecorrente.__table__
+            ids = list(conexao.execute(
+                select(R.c.id_recorrente).where(R.c.proxima_data <= ate).order_by(R.c.id_recorrente)).scalars())
+            conexao.rollback()
+
+            for lote in agrupar_em_lotes(ids, tamanho_lote):
+                with conexao.begin():
+                    regras_lote, lancadas_lote = _gerar_faixa(conexao, lote[0], lote[-1], ate)
+                regras += regras_lote
+                lancadas += lancadas_lote
+                faixas += 1
+                if faixas % 10 == 0:
+                    decorrido = time.perf_counter() - inicio
+                    print(f"  ... {regras} regra(s), {lancadas} transação(ões) lançada(s) ({lancadas / decorrido:.0f}/s)")
+
+    except Exception as e:
+        print(f"Erro ao executar a agenda de transações recorrentes: {e}")
+        print(f"Faixas já concluídas permanecem no banco ({lancadas} transações).")
+        return None
+
+    decorrido = time.perf_counter() - inicio
+    print(f"Agenda executada até {ate}: {lancadas} transação(ões) lançada(s) de {regras} regra(s) vencida(s) "
+          f"em {faixas} faixa(s).")
+    print(f"Tempo: {decorrido:.2f}s ({lancadas / decorrido if decorrido else 0:.0f} transações/s)")
+    return lancadas
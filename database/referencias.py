@@ -0,0 +1,118 @@
+# database/referencias.py
+
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import select
+from .connection import get_engine
+from .models import Categoria, TipoInvestimento
+from config import settings
+
+DadosReferencia = namedtuple("DadosReferencia", [
+    "versao",
+    "categorias",                   # {id_categoria: (nome, tipo)}
+    "categorias_por_nome",          # {nome: id_categoria}
+    "tipos_investimento",           # {id_tipo_investimento: nome}
+    "tipos_investimento_por_nome",  # {nome: id_tipo_investimento}
+    "carregado_em",
+])
+
+_dados = None
+_versao = 0
+_trava = threading.Lock()
+
+
+def _carregar(versao):
+    """Lê categorias e tipos de investimento numa conexão própria, fora da sessão."""
+    with get_engine().connect() as conexao:
+        categorias = {
+            id_categoria: (nome, tipo)
+            for id_categoria, nome, tipo in conexao.execute(
+                select(Categoria.id_categoria, Categoria.nome, Categoria.tipo))
+        }
+        tipos = dict(conexao.execute(
+            select(TipoInvestimento.id_tipo_investimento, TipoInvestimento.nome)).all())
+    return DadosReferencia(
+        versao=versao,
+        categorias=categorias,
+        categorias_por_nome={nome: id_categoria for id_categoria, (nome, _) in categorias.items()},
+        tipos_investimento=tipos,
+        tipos_investimento_por_nome={nome: id_tipo for id_tipo, nome in tipos.items()},
+        carregado_em=time.monotonic(),
+    )
+
+
+def obter():
+    """
+    Dados de referência do processo, carregados na primeira chamada. São
+    recarregados depois de invalidar() ou quando passam de
+    REFERENCIA_TTL_SEGUNDOS, para que um 'serve' de longa duração enxergue
+    categorias criadas por outro processo.
+    """
+    global _dados
+    dados = _dados
+    if dados is not None and time.monotonic() - dados.carregado_em < settings.REFERENCIA_TTL_SEGUNDOS:
+        return dados
+    with _trava:
+        if _dados is None or _dados is dados:
+            _dados = _carregar(_versao)
+        return _dados
+
+
+def invalidar():
+    """Descarta o cache; a próxima leitura recarrega com uma nova versão."""
+    global _dados, _versao
+    with _trava:
+        _versao += 1
+        _dados = None
+
+
+def versao():
+    return obter().versao
+
+
+def _buscar(consulta):
+    """
+    consulta(dados) no cache; se não encontra, relê o cache uma vez antes
+    de desistir: a categoria pode ter sido criada por outro processo depois
+    da última leitura (um 'serve' só relê sozinho a cada
+    REFERENCIA_TTL_SEGUNDOS).
+    """
+    resultado = consulta(obter())
+    if resultado is None:
+        invalidar()
+        resultado = consulta(obter())
+    return resultado
+
+
+def categoria(id_categoria):
+    """(nome, tipo) da categoria, ou None se ela não existe."""
+    return _buscar(lambda dados: dados.categorias.get(id_categoria))
+
+
+def id_categoria(nome):
+    return _buscar(lambda dados: dados.categorias_por_nome.get(nome))
+
+
+def id_tipo_investimento(nome):
+    return obter().tipos_investimento_por_nome.get(nome)
+
+
+def ajustar_sinal(tipo, valor):
+    """
+    Sinal do valor pelo tipo da categoria, como faz o trigger
+    tr_antes_inserir_transacao: despesas negativas, receitas positivas.
+    """
+    if tipo == "Despesa":
+        return -abs(valor)
+    if tipo == "Receita":
+        return abs(valor)
+    return valor
+
+
+def normalizar_valor(id_categoria, valor):
+    """Valor com o sinal da categoria; levanta ValueError se ela não existe."""
+    dados = categoria(id_categoria)
+    if dados is None:
+        raise ValueError(f"categoria {id_categoria} não existe")
+    return ajustar_sinal(dados[1], valor)
@@ -1,29 +1,74 @@
 # database/seed.py
 
-from .connection import engine, Base, session
-from .models import Usuario, Conta, Categoria, Transacao 
-from .functions import criar_usuario, criar_conta, criar_categoria, adicionar_transacao
-from .procedures_triggers import criar_procedures_e_triggers
+from .connection import Base, session
+from .models import Usuario, Conta, Categoria, Transacao, Transferencia, SaldoConta, ResumoMensalCategoria
+from .functions import criar_usuario, criar_conta, criar_categoria, criar_tipo_investimento, adicionar_transacao, recalcular_saldos, recalcular_resumos
+from . import esquema
+from . import arquivo
+from . import busca
+from . import referencias
 import datetime
 
-def seed_database():
+def _precisa_preencher(plano, modelo):
+    """
+    A tabela derivada acabou de ser criada (ou é registrada pela primeira
+    vez) num banco que já tinha transações: preenche uma vez. Nos initdb
+    seguintes ela está 'igual' e nenhuma contagem é feita.
+    """
+    estados = {item.nome: item.estado for item in plano if item.tipo == "tabela"}
+    if estados.get(modelo.__tablename__) not in (esquema.NOVO, esquema.EXISTENTE):
+        return False
+    if estados.get(Transacao.__tablename__) == esquema.NOVO:
+        return False
+    return session.query(modelo).count() == 0 and session.query(Transacao).count() > 0
+
+
+def seed_database(dry_run=False, forcar=False):
     """
     Cria tabelas, procedures, triggers e insere dados iniciais no banco.
+    Só os objetos cuja definição mudou desde o último initdb são tocados;
+    com dry_run=True apenas mostra o que mudaria.
     """
     try:
         print("Iniciando o processo de seed do banco de dados...")
 
+        plano, milissegundos = esquema.planejar(forcar)
+        esquema.imprimir_plano(plano, milissegundos)
+        if dry_run:
+            print("Dry-run: nada foi alterado.")
+            return plano
+
+        esquema.aplicar(plano)
+        # Colunas ou índices novos em transacoes valem também para as tabelas de arquivo
+        if any(getattr(item.objeto, "table", item.objeto) is Transacao.__table__
+               and item.estado in (esquema.NOVO, esquema.ALTERADO) for item in plano):
+            arquivo.sincronizar_arquivos()
 
-        Base.metadata.create_all(engine)
-        print("Tabelas criadas com sucesso (ou já existentes).")
+        # Tabelas que ganharam AUTOINCREMENT no SQLite: a sequência continua depois dos IDs arquivados
+        if any(item.nome in (Transacao.__tablename__, Transferencia.__tablename__) and item.tipo == "tabela"
+               and item.estado in (esquema.ALTERADO, esquema.EXISTENTE) for item in plano):
+            arquivo.ajustar_sequencias()
 
+        # Índice de texto do SQLite criado agora: indexa as transações que já existiam
+        if any(item.nome == "transacoes_fts" and item.estado == esquema.NOVO for item in plano):
+            print("Indexando as descrições das transações existentes para o 'search'...")
+            busca.reconstruir_indice()
+            arquivo.sincronizar_arquivos()
 
-        criar_procedures_e_triggers()
+
+        # Banco criado antes dos triggers de saldo: preenche saldos_conta uma vez
+        if _precisa_preencher(plano, SaldoConta):
+            print("Preenchendo saldos das contas a partir das transações existentes...")
+            recalcular_saldos()
+
+        if _precisa_preencher(plano, ResumoMensalCategoria):
+            print("Preenchendo resumos mensais por categoria a partir das transações existentes...")
+            recalcular_resumos()
 
 
         
 
-        if session.query(Categoria).count() == 0:
+        if not referencias.obter().categorias:
             print("Populando categorias básicas...")
 
             criar_categoria("Alimentação", "Despesa")
@@ -43,6 +88,12 @@ def seed_database():
             print("Categorias já existem. Pulando...")
 
 
+        if not referencias.obter().tipos_investimento:
+            print("Populando tipos de investimento básicos...")
+            for nome in ("Ações", "Fundos Imobiliários", "Renda Fixa", "ETFs", "Criptomoedas"):
+                criar_tipo_investimento(nome)
+
+
         if session.query(Usuario).count() == 0:
             print("Criando usuário de teste...")
 
@@ -68,6 +119,7 @@ def seed_database():
             print("Usuários já existem. Pulando...")
 
         print("\nProcesso de Seed concluído com sucesso!")
+        return plano
 
     except Exception as e:
         print(f"\nErro durante o processo de seed: {e}")
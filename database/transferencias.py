@@ -0,0 +1,203 @@
+# database/transferencias.py
+
+import csv
+import datetime
+import hashlib
+import os
+import uuid
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from .connection import get_engine
+from .models import Transacao, Transferencia, LoteTransferencia
+from . import referencias
+from .importacao import LinhaInvalida, _parse_data, _parse_valor, _parse_inteiro
+from utils.helpers import agrupar_em_lotes
+from config.settings import IMPORT_TAMANHO_LOTE
+
+CATEGORIA_SAIDA = "Transferência Saída"
+CATEGORIA_ENTRADA = "Transferência Entrada"
+
+class ChaveJaUtilizada(Exception):
+    """A chave de idempotência já foi usada por um lote com outro conteúdo."""
+
+
+def _categorias_transferencia():
+    """IDs das categorias de saída e entrada, do cache de dados de referência."""
+    id_saida = referencias.id_categoria(CATEGORIA_SAIDA)
+    id_entrada = referencias.id_categoria(CATEGORIA_ENTRADA)
+    if id_saida is None or id_entrada is None:
+        raise RuntimeError(f"Categorias '{CATEGORIA_SAIDA}' e '{CATEGORIA_ENTRADA}' não encontradas. "
+                           "Rode 'initdb'.")
+    return id_saida, id_entrada
+
+
+def _normalizar(transferencia, data_padrao):
+    """Valida (origem, destino, valor, descricao[, data]) e devolve a tupla completa."""
+    id_origem, id_destino, valor, descricao, *resto = transferencia
+    data = resto[0] if resto and resto[0] else data_padrao
+    if isinstance(data, str):
+        data = datetime.datetime.strptime(data, '%Y-%m-%d').date()
+    if valor is None or valor <= 0:
+        raise ValueError(f"valor inválido ({valor}): a transferência deve ser positiva")
+    if id_origem == id_destino:
+        raise ValueError(f"origem e destino iguais (conta {id_origem})")
+    return int(id_origem), int(id_destino), round(float(valor), 2), (descricao or "").strip(), data
+
+
+def _hash_lote(transferencias):
+    """Impressão digital do conteúdo do lote, guardada junto da chave."""
+    resumo = hashlib.sha256()
+    for id_origem, id_destino, valor, descricao, data in transferencias:
+        resumo.update(f"{id_origem}|{id_destino}|{valor:.2f}|{descricao}|{data.isoformat()}\n".encode("utf-8"))
+    return resumo.hexdigest()
+
+
+def _inserir_pernas(conexao, pernas):
+    """
+    Insere as pernas num único INSERT de várias linhas e devolve os IDs na
+    ordem da lista. Os IDs de um INSERT de várias linhas não são
+    garantidamente consecutivos no MySQL (auto_increment_increment > 1,
+    innodb_autoinc_lock_mode = 2), então cada perna leva o lote e a sua
+    posição nele, e os IDs são lidos de volta num único SELECT pelo índice.
+    """
+    T = Transacao.__table__
+    lote = uuid.uuid4().hex
+    conexao.execute(insert(T).values([dict(perna, lote_insercao=lote, ordem_lote=ordem)
+                                      for ordem, perna in enumerate(pernas)]))
+    return list(conexao.execute(select(T.c.id_transacao).where(T.c.lote_insercao == lote)
+                                .order_by(T.c.ordem_lote)).scalars())
+
+
+def _gravar_lote(conexao, transferencias, chave):
+    """
+    Grava um lote numa única transação do banco: a chave de idempotência, as
+    duas pernas de todas as transferências (_inserir_pernas) e os vínculos
+    débito/crédito num único INSERT. Devolve os pares (id_debito, id_credito), ou
+    None se a chave já tinha sido usada por um lote idêntico.
+    """
+    id_saida, id_entrada = _categorias_transferencia()
+    hash_conteudo = _hash_lote(transferencias)
+
+    try:
+        with conexao.begin():
+            if chave is not None:
+                conexao.execute(insert(LoteTransferencia.__table__).values(
+                    chave=chave, hash_conteudo=hash_conteudo, qtd_transferencias=len(transferencias),
+                    data_criacao=datetime.datetime.now(datetime.timezone.utc)))
+
+            pernas = []
+            for id_origem, id_destino, valor, descricao, data in transferencias:
+                pernas.append({"descricao": f"Transferência para {descricao}"[:255], "valor": -valor, "data": data,
+                               "id_conta": id_origem, "id_categoria": id_saida})
+                pernas.append({"descricao": f"Transferência de {descricao}"[:255], "valor": valor, "data": data,
+                               "id_conta": id_destino, "id_categoria": id_entrada})
+
+            ids = _inserir_pernas(conexao, pernas)
+            pares = list(zip(ids[0::2], ids[1::2]))
+
+            conexao.execute(insert(Transferencia.__table__).values([
+                {"id_transacao_debito": id_debito, "id_transacao_credito": id_credito, "chave_lote": chave}
+                for id_debito, id_credito in pares
+            ]))
+
+    except IntegrityError:
+        if chave is None:
+            raise
+        # A transação foi desfeita; se a chave existe, o erro foi ela estar repetida
+        existente = conexao.execute(
+            select(LoteTransferencia.hash_conteudo).where(LoteTransferencia.chave == chave)
+        ).scalar()
+        conexao.rollback()
+        if existente is None:
+            raise
+        if existente != hash_conteudo:
+            raise ChaveJaUtilizada(f"a chave '{chave}' já foi usada por um lote diferente")
+        return None
+
+    return pares
+
+
+def registrar_transferencias(transferencias, chave_idempotencia=None, data=None):
+    """
+    Registra várias transferências (origem, destino, valor, descricao[, data])
+    de uma vez, tudo ou nada. Com chave_idempotencia, repetir o mesmo lote
+    (por exemplo, depois de um timeout) não lança nada duas vezes.
+    """
+    try:
+        data_padrao = data or datetime.date.today()
+        normalizadas = [_normalizar(t, data_padrao) for t in transferencias]
+        if not normalizadas:
+            print("Nenhuma transferência para registrar.")
+            return []
+
+        with get_engine().connect() as conexao:
+            pares = _gravar_lote(conexao, normalizadas, chave_idempotencia)
+
+        if pares is None:
+            print(f"Lote '{chave_idempotencia}' já registrado anteriormente; nada foi lançado.")
+            return []
+        total = sum(t[2] for t in normalizadas)
+        print(f"{len(pares)} transferência(s) registrada(s), total de R${total:.2f}.")
+        return pares
+
+    except Exception as e:
+        print(f"Erro ao registrar transferências: {e}")
+        return None
+
+
+def registrar_transferencia(id_conta_origem, id_conta_destino, valor, descricao, data_str=None,
+                            chave_idempotencia=None):
+    """Registra uma transferência entre duas contas (débito na origem, crédito no destino)."""
+    data = datetime.datetime.strptime(data_str, '%Y-%m-%d').date() if data_str else None
+    pares = registrar_transferencias([(id_conta_origem, id_conta_destino, valor, descricao)],
+                                     chave_idempotencia, data)
+    return pares[0] if pares else pares
+
+
+def importar_transferencias(caminho, chave_idempotencia=None, tamanho_lote=None, delimitador=",", encoding="utf-8"):
+    """
+    Registra as transferências de um CSV (colunas origem, destino, valor,
+    descricao e, opcionalmente, data) em lotes. Cada lote usa a chave
+    '<chave>:<número do lote>', então reenviar o mesmo arquivo depois de uma
+    falha só grava os lotes que ainda faltam.
+    """
+    tamanho_lote = tamanho_lote or IMPORT_TAMANHO_LOTE
+    if not os.path.exists(caminho):
+        print(f"Erro: Arquivo '{caminho}' não encontrado.")
+        return None
+
+    hoje = datetime.date.today()
+    gravadas = ignoradas = 0
+    try:
+        with open(caminho, newline="", encoding=encoding) as arquivo, get_engine().connect() as conexao:
+            leitor = csv.DictReader(arquivo, delimiter=delimitador)
+
+            def linhas():
+                for linha in leitor:
+                    try:
+                        yield _normalizar((
+                            _parse_inteiro(linha.get("origem"), "origem"),
+                            _parse_inteiro(linha.get("destino"), "destino"),
+                            _parse_valor(linha.get("valor") or ""),
+                            linha.get("descricao"),
+                            _parse_data(linha["data"]) if linha.get("data") else None,
+                        ), hoje)
+                    except ValueError as e:
+                        raise LinhaInvalida(f"linha {leitor.line_num}: {e}")
+
+            for numero, lote in enumerate(agrupar_em_lotes(linhas(), tamanho_lote), start=1):
+                chave = f"{chave_idempotencia}:{numero}" if chave_idempotencia else None
+                pares = _gravar_lote(conexao, lote, chave)
+                if pares is None:
+                    ignoradas += len(lote)
+                    print(f"  ... lote {numero} já registrado anteriormente, ignorado")
+                else:
+                    gravadas += len(pares)
+                    print(f"  ... lote {numero}: {len(pares)} transferência(s) registrada(s)")
+
+        print(f"Transferências concluídas: {gravadas} registrada(s), {ignoradas} já existente(s).")
+        return gravadas, ignoradas
+
+    except Exception as e:
+        print(f"Erro ao importar transferências (lotes anteriores já foram gravados): {e}")
+        return None
@@ -0,0 +1,145 @@
+# servidor.py
+
+import contextlib
+import hmac
+import io
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+def _aquecer():
+    """
+    Configura os mappers e abre a primeira conexão do pool antes do primeiro
+    comando, para que nenhum cliente pague esse custo.
+    """
+    from sqlalchemy import text
+    from sqlalchemy.orm import configure_mappers
+    from database import models  # noqa: F401 (registra os mappers)
+    from database.connection import get_engine
+
+    configure_mappers()
+    with get_engine().connect() as conexao:
+        conexao.execute(text("SELECT 1"))
+
+
+def _eh_loopback(host):
+    """True se todos os endereços do host são de loopback (127.0.0.0/8, ::1)."""
+    try:
+        enderecos = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+    return bool(enderecos) and all(ipaddress.ip_address(endereco.split("%")[0]).is_loopback
+                                   for endereco in enderecos)
+
+
+def _autorizado(cabecalho, token):
+    """Confere o 'Authorization: Bearer <token>' da requisição em tempo constante."""
+    esperado = f"Bearer {token}".encode("utf-8")
+    return hmac.compare_digest((cabecalho or "").encode("utf-8"), esperado)
+
+
+def gravar_token(caminho, token):
+    """Grava o token num arquivo legível só pelo dono (0600), que o cliente.py lê."""
+    descritor = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descritor, "w", encoding="utf-8") as arquivo:
+        # O modo do os.open só vale para arquivos novos
+        os.chmod(caminho, 0o600)
+        arquivo.write(token)
+
+
+def _criar_handler(executar_argv, token):
+
+    class ComandoHandler(BaseHTTPRequestHandler):
+        """Recebe {"argv": [...]} por POST e devolve a saída do comando em JSON."""
+
+        def do_POST(self):
+            # Navegadores sempre mandam Origin em POSTs entre sites; o cliente.py nunca manda
+            if self.headers.get("Origin") is not None:
+                self._responder(403, {"codigo": 1, "saida": "Requisições de navegador não são aceitas.\n"})
+                return
+            if self.headers.get_content_type() != "application/json":
+                self._responder(415, {"codigo": 2, "saida": "Requisição inválida: Content-Type deve ser "
+                                                            "application/json.\n"})
+                return
+            if not _autorizado(self.headers.get("Authorization"), token):
+                self._responder(401, {"codigo": 1, "saida": "Não autorizado: token do servidor ausente ou "
+                                                             "inválido (SERVIDOR_TOKEN).\n"})
+                return
+            try:
+                tamanho = int(self.headers.get("Content-Length", 0))
+                argv = json.loads(self.rfile.read(tamanho))["argv"]
+                if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+                    raise ValueError
+            except (ValueError, KeyError, TypeError):
+                self._responder(200, {"codigo": 2, "saida": "Requisição inválida: esperado {\"argv\": [...]}.\n"})
+                return
+
+            inicio = time.perf_counter()
+            saida = io.StringIO()
+            codigo = 0
+            with contextlib.redirect_stdout(saida), contextlib.redirect_stderr(saida):
+                try:
+                    executar_argv(argv)
+                except SystemExit as e:
+                    # argparse encerra com SystemExit em --help e erros de argumento
+                    codigo = e.code if isinstance(e.code, int) else 1
+                except Exception as e:
+                    # O servidor continua atendendo; o cliente recebe o erro como saída do comando
+                    print(f"Erro inesperado ao executar o comando: {e}")
+                    codigo = 1
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+
+            print(f"[{time.strftime('%H:%M:%S')}] {' '.join(argv[:1])} ({duracao_ms:.1f} ms)")
+            self._responder(200, {"codigo": codigo, "saida": saida.getvalue(), "duracao_ms": duracao_ms})
+
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ComandoHandler
+
+
+def servir(host, porta, executar_argv, token=None, arquivo_token=None):
+    """
+    Mantém engine, pool de conexões e mappers carregados e executa os
+    comandos recebidos do cliente.py com a mesma lógica da CLI. Os comandos
+    são atendidos um por vez, na ordem em que chegam. Como qualquer comando
+    pode ser executado, toda requisição precisa do token: sem um token
+    configurado, o servidor sorteia um e o grava em `arquivo_token`, e só
+    aceita escutar em loopback.
+    """
+    if not token and not _eh_loopback(host):
+        print(f"Erro: '{host}' não é um endereço de loopback. Para aceitar conexões de outras máquinas, "
+              f"defina um token (variável de ambiente JULIUS_SERVIDOR_TOKEN).")
+        return None
+
+    if not token:
+        token = secrets.token_urlsafe(32)
+        if arquivo_token:
+            gravar_token(arquivo_token, token)
+            print(f"Token do servidor gravado em {arquivo_token}.")
+
+    print("Carregando modelos e conectando ao banco...")
+    inicio = time.perf_counter()
+    _aquecer()
+    print(f"Pronto em {time.perf_counter() - inicio:.2f}s. Escutando em http://{host}:{porta} (Ctrl+C para sair).")
+
+    servidor_http = HTTPServer((host, porta), _criar_handler(executar_argv, token))
+    try:
+        servidor_http.serve_forever()
+    except KeyboardInterrupt:
+        print("\nEncerrando servidor...")
+    finally:
+        servidor_http.server_close()
@@ -0,0 +1,23 @@
+# tests/conftest.py
+
+import pytest
+from config import settings
+from database import connection, referencias
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """Banco SQLite novo, criado pelo initdb, num diretório temporário."""
+    monkeypatch.setattr(settings, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(settings, "SQLITE_PATH", str(tmp_path / "julius.db"))
+    monkeypatch.setattr(settings, "LOG_FILE", str(tmp_path / "logs" / "app.log"))
+    monkeypatch.setattr(connection, "_engine", None)
+    referencias.invalidar()
+
+    from database.seed import seed_database
+    seed_database()
+    engine = connection.get_engine()
+    yield engine
+    connection.session.remove()
+    engine.dispose()
+    referencias.invalidar()
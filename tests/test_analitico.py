@@ -0,0 +1,34 @@
+# tests/test_analitico.py
+
+import datetime
+from sqlalchemy import insert, update
+from database import analitico, functions
+from database.connection import session
+from database.models import Tag, Transacao, transacao_tag_association
+
+
+def _mudar(comando):
+    session.execute(comando)
+    session.commit()
+
+
+def test_cache_muda_com_categoria_data_e_tags(banco):
+    transacao = functions.adicionar_transacao(1, 1, -30.0, "Mercado", "2025-11-05")
+    id_transacao = transacao.id_transacao
+    primeira = analitico.carregar(1)
+    assert analitico.carregar(1) is primeira
+
+    _mudar(update(Transacao).where(Transacao.id_transacao == id_transacao).values(id_categoria=2))
+    segunda = analitico.carregar(1)
+    assert segunda is not primeira
+    assert 2 in segunda.categorias
+
+    _mudar(update(Transacao).where(Transacao.id_transacao == id_transacao).values(data=datetime.date(2025, 10, 5)))
+    terceira = analitico.carregar(1)
+    assert terceira is not segunda
+
+    tag = Tag(nome="feira")
+    session.add(tag)
+    session.commit()
+    _mudar(insert(transacao_tag_association).values(transacao_id=id_transacao, tag_id=tag.id_tag))
+    assert ("feira", -30.0, 1) in analitico.carregar(1).por_tag()
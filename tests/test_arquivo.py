@@ -0,0 +1,112 @@
+# tests/test_arquivo.py
+
+from sqlalchemy import text
+from database import arquivo, functions
+
+
+def _gatilhos_e_indices(banco):
+    with banco.connect() as conexao:
+        return set(conexao.execute(text("SELECT name FROM sqlite_master WHERE type IN ('trigger', 'index') "
+                                        "AND name NOT LIKE 'sqlite_%'")).scalars())
+
+
+def _sem_autoincremento(banco, tabela):
+    """Recria a tabela como um banco anterior ao AUTOINCREMENT a teria."""
+    bruta = banco.raw_connection()
+    try:
+        sql = bruta.execute("SELECT sql FROM sqlite_master WHERE name = ?", (tabela,)).fetchone()[0]
+        bruta.executescript(f"""
+            PRAGMA foreign_keys = OFF;
+            PRAGMA legacy_alter_table = ON;
+            BEGIN;
+            {sql.replace(' AUTOINCREMENT', '').replace(f'CREATE TABLE {tabela}', 'CREATE TABLE velha', 1)};
+            INSERT INTO velha SELECT * FROM {tabela};
+            DROP TABLE {tabela};
+            ALTER TABLE velha RENAME TO {tabela};
+            DELETE FROM sqlite_sequence WHERE name = '{tabela}';
+            COMMIT;
+            PRAGMA legacy_alter_table = OFF;
+            PRAGMA foreign_keys = ON;
+        """)
+    finally:
+        bruta.close()
+
+
+def test_ids_arquivados_nao_sao_reaproveitados(banco):
+    arquivada = functions.adicionar_transacao(1, 1, 8.0, "Antiga", "2020-03-02").id_transacao
+    arquivo.arquivar(2020)
+
+    nova = functions.adicionar_transacao(1, 1, 8.0, "Nova", "2025-11-07").id_transacao
+    assert nova > arquivada
+
+
+def test_initdb_recria_tabela_antiga_com_autoincremento(banco):
+    from database.seed import seed_database
+
+    arquivada = functions.adicionar_transacao(1, 1, 8.0, "Antiga", "2020-03-02").id_transacao
+    arquivo.arquivar(2020)
+    esperados = _gatilhos_e_indices(banco)
+    _sem_autoincremento(banco, "transacoes")
+
+    seed_database()
+
+    with banco.connect() as conexao:
+        sql = conexao.execute(text("SELECT sql FROM sqlite_master WHERE name = 'transacoes'")).scalar()
+    assert "AUTOINCREMENT" in sql
+    assert _gatilhos_e_indices(banco) == esperados
+    nova = functions.adicionar_transacao(1, 1, 8.0, "Nova", "2025-11-07")
+    assert nova.id_transacao > arquivada
+    assert functions.calcular_balanco_usuario(1) == 50.0 - 15.5 - 8.0 - 8.0
+
+
+def test_analitico_e_exportacao_incluem_os_anos_arquivados(banco, tmp_path):
+    import csv
+    from sqlalchemy import insert
+    from database import analitico, exportacao
+    from database.connection import session
+    from database.models import Tag, transacao_tag_association
+
+    antiga = functions.adicionar_transacao(1, 1, 8.0, "Antiga", "2020-03-02").id_transacao
+    tag = Tag(nome="viagem")
+    session.add(tag)
+    session.commit()
+    session.execute(insert(transacao_tag_association).values(transacao_id=antiga, tag_id=tag.id_tag))
+    session.commit()
+    arquivo.arquivar(2020)
+
+    assert analitico.conferir(1) == []
+    assert ("viagem", -8.0, 1) in analitico.carregar(1).por_tag()
+
+    caminho = tmp_path / "transacoes.csv"
+    assert exportacao.exportar_transacoes(str(caminho)) == 2
+    with open(caminho, encoding="utf-8") as arquivo_csv:
+        linhas = {int(linha["id_transacao"]): linha for linha in csv.DictReader(arquivo_csv)}
+    assert linhas[antiga]["tags"] == "viagem"
+
+
+def test_dedupe_encontra_e_mescla_duplicadas_arquivadas(banco):
+    from sqlalchemy import insert, select
+    from database import duplicatas
+    from database.connection import session
+    from database.models import ArquivoTransacoes, Tag, transacao_tag_association, transacao_tag_arquivo
+
+    primeira = functions.adicionar_transacao(1, 1, 8.0, "Padaria", "2020-03-02").id_transacao
+    functions.adicionar_transacao(1, 1, 8.0, "Padaria", "2020-03-02")
+    arquivo.arquivar(2020)
+    reimportada = functions.adicionar_transacao(1, 1, 8.0, "padaria ", "2020-03-02").id_transacao
+    tag = Tag(nome="viagem")
+    session.add(tag)
+    session.commit()
+    session.execute(insert(transacao_tag_association).values(transacao_id=reimportada, tag_id=tag.id_tag))
+    session.commit()
+
+    grupos = duplicatas.deduplicar(mesclar=True)
+    assert [ids for _, ids in grupos] == [[primeira, primeira + 1, reimportada]]
+
+    assert duplicatas.deduplicar() == []
+    assert functions.calcular_balanco_usuario(1) == 50.0 - 15.5 - 8.0
+    assert functions.recalcular_saldos(apenas_verificar=True) == []
+    assert functions.recalcular_resumos(apenas_verificar=True) == []
+    assert session.execute(select(transacao_tag_arquivo.c.tag_id)
+                           .where(transacao_tag_arquivo.c.transacao_id == primeira)).scalars().all() == [tag.id_tag]
+    assert session.get(ArquivoTransacoes, 2020).qtd_transacoes == 1
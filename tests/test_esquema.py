@@ -0,0 +1,56 @@
+# tests/test_esquema.py
+
+from sqlalchemy import inspect, text
+
+
+def _colunas(engine, tabela):
+    return {coluna["name"] for coluna in inspect(engine).get_columns(tabela)}
+
+
+def test_initdb_atualiza_banco_anterior_ao_controle_de_versoes(banco):
+    from database.seed import seed_database
+    from database import functions
+
+    # Banco criado antes de versoes_esquema e de impressao_digital
+    with banco.begin() as conexao:
+        conexao.execute(text("DROP INDEX ix_transacoes_impressao_digital"))
+        conexao.execute(text("ALTER TABLE transacoes DROP COLUMN impressao_digital"))
+        conexao.execute(text("DROP TABLE versoes_esquema"))
+    assert "impressao_digital" not in _colunas(banco, "transacoes")
+
+    seed_database()
+
+    assert "impressao_digital" in _colunas(banco, "transacoes")
+    assert "ix_transacoes_impressao_digital" in {i["name"] for i in inspect(banco).get_indexes("transacoes")}
+    assert functions.adicionar_transacao(1, 1, 10.0, "Padaria", "2025-11-02") is not None
+
+    # O initdb seguinte não tem mais nada a fazer
+    from database import esquema
+    itens, _ = esquema.planejar()
+    assert [item.nome for item in itens if item.estado != esquema.IGUAL] == []
+
+
+def test_initdb_recria_o_que_falta_no_banco(banco):
+    from database.seed import seed_database
+    from database import esquema
+
+    with banco.begin() as conexao:
+        conexao.execute(text("DROP TRIGGER tr_depois_inserir_transacao"))
+        conexao.execute(text("DROP INDEX ix_transacoes_impressao_digital"))
+        conexao.execute(text("ALTER TABLE transacoes DROP COLUMN impressao_digital"))
+
+    itens, _ = esquema.planejar()
+    estados = {item.nome: item.estado for item in itens}
+    assert estados["tr_depois_inserir_transacao"] == esquema.NOVO
+    assert estados["transacoes"] == esquema.ALTERADO
+    assert estados["ix_transacoes_impressao_digital"] == esquema.NOVO
+
+    seed_database()
+
+    assert "impressao_digital" in _colunas(banco, "transacoes")
+    assert "ix_transacoes_impressao_digital" in {i["name"] for i in inspect(banco).get_indexes("transacoes")}
+    with banco.connect() as conexao:
+        assert conexao.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                                    "AND name = 'tr_depois_inserir_transacao'")).scalar() == 1
+    itens, _ = esquema.planejar()
+    assert [item.nome for item in itens if item.estado != esquema.IGUAL] == []
@@ -0,0 +1,44 @@
+# tests/test_exportacao.py
+
+import json
+from sqlalchemy import event, insert
+from database import arquivo, exportacao, functions
+from database.connection import session
+from database.models import Tag, transacao_tag_association
+
+
+def test_exporta_em_paginas_por_id_com_tags_e_arquivo(banco, tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacao, "EXPORT_TAMANHO_LOTE", 2)
+    antigas = [functions.adicionar_transacao(1, 1, 8.0, f"Antiga {i}", f"2020-03-0{i}").id_transacao
+               for i in range(1, 4)]
+    novas = [functions.adicionar_transacao(1, 1, 8.0, f"Nova {i}", f"2025-11-0{i}").id_transacao
+             for i in range(2, 4)]
+    tags = [Tag(nome="viagem"), Tag(nome="férias")]
+    session.add_all(tags)
+    session.commit()
+    session.execute(insert(transacao_tag_association), [
+        {"transacao_id": id_transacao, "tag_id": tag.id_tag} for id_transacao in (antigas[1], novas[0]) for tag in tags
+    ])
+    session.commit()
+    arquivo.arquivar(2020)
+
+    consultas = []
+
+    def ouvir(conexao, cursor, sql, *args):
+        consultas.append(sql)
+
+    event.listen(banco, "before_cursor_execute", ouvir)
+    try:
+        caminho = tmp_path / "transacoes.jsonl"
+        assert exportacao.exportar_transacoes(str(caminho), formato="jsonl") == 6
+    finally:
+        event.remove(banco, "before_cursor_execute", ouvir)
+
+    with open(caminho, encoding="utf-8") as arquivo_jsonl:
+        transacoes = [json.loads(linha) for linha in arquivo_jsonl]
+    assert [t["id_transacao"] for t in transacoes] == sorted([1] + antigas + novas)
+    por_id = {t["id_transacao"]: t for t in transacoes}
+    assert sorted(por_id[antigas[1]]["tags"]) == sorted(por_id[novas[0]]["tags"]) == ["férias", "viagem"]
+    assert por_id[antigas[0]]["tags"] == []
+    # 6 transações em páginas de 2: três páginas cheias e uma vazia
+    assert sum(" LIMIT " in sql for sql in consultas) == 4
@@ -0,0 +1,34 @@
+# tests/test_functions.py
+
+from sqlalchemy import func, select
+from database import functions
+from database.connection import session
+from database.models import Transacao
+
+
+def _quantas(descricao):
+    return session.execute(select(func.count()).where(Transacao.descricao == descricao)).scalar()
+
+
+def test_transacoes_iguais_sao_lancadas(banco):
+    assert isinstance(functions.adicionar_transacao(1, 1, 8.0, "Café", "2025-11-03"), Transacao)
+    assert isinstance(functions.adicionar_transacao(1, 1, 8.0, "Café", "2025-11-03"), Transacao)
+    assert _quantas("Café") == 2
+
+
+def test_reenvio_com_ignorar_repetida_nao_lanca_de_novo(banco):
+    assert isinstance(functions.adicionar_transacao(1, 1, 8.0, "Café", "2025-11-03", ignorar_repetida=True),
+                      Transacao)
+    resultado = functions.adicionar_transacao(1, 1, 8.0, "Café", "2025-11-03", ignorar_repetida=True)
+    assert resultado is functions.TRANSACAO_REPETIDA
+    assert _quantas("Café") == 1
+
+
+def test_ignorar_repetida_consulta_o_arquivo_do_ano(banco):
+    from database import arquivo
+    functions.adicionar_transacao(1, 1, 8.0, "Café", "2020-03-02")
+    arquivo.arquivar(2020)
+    assert _quantas("Café") == 0
+
+    resultado = functions.adicionar_transacao(1, 1, 8.0, "Café", "2020-03-02", ignorar_repetida=True)
+    assert resultado is functions.TRANSACAO_REPETIDA
@@ -0,0 +1,24 @@
+# tests/test_importacao.py
+
+from sqlalchemy import func, insert, select
+from database import importacao
+from database.models import Conta, Usuario
+
+
+def test_email_cadastrado_durante_o_lote_e_pulado(banco):
+    lote = [(2, "Ana", "ana@exemplo.com", "s1"), (3, "Bia", "bia@exemplo.com", "s2")]
+    with banco.connect() as conexao:
+        # Outra sessão cadastra 'bia' entre a verificação do lote e o INSERT
+        with conexao.begin():
+            conexao.execute(insert(Usuario.__table__).values(nome="Bia", email="bia@exemplo.com", senha_hash="x"))
+        with conexao.begin():
+            assert importacao._gravar_usuarios(conexao, lote, ["hash-ana", "hash-bia"]) == 1
+
+        contas = dict(conexao.execute(
+            select(Usuario.email, func.count(Conta.id_conta))
+            .outerjoin(Conta, Conta.id_usuario == Usuario.id_usuario)
+            .where(Usuario.email.in_(["ana@exemplo.com", "bia@exemplo.com"]))
+            .group_by(Usuario.email)).all())
+        senha_bia = conexao.execute(select(Usuario.senha_hash).where(Usuario.email == "bia@exemplo.com")).scalar()
+    assert contas == {"ana@exemplo.com": 1, "bia@exemplo.com": 0}
+    assert senha_bia == "x"
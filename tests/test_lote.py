@@ -0,0 +1,34 @@
+# tests/test_lote.py
+
+import os
+import sys
+import threading
+import time
+from sqlalchemy import text
+from database import lote
+
+
+def test_grupo_aberto_e_confirmado_com_a_entrada_parada(banco, monkeypatch):
+    from app import criar_parser
+
+    leitura, escrita = os.pipe()
+    monkeypatch.setattr(sys, "stdin", os.fdopen(leitura, encoding="utf-8"))
+    resultado = {}
+    batch = threading.Thread(target=lambda: resultado.update(
+        lote.executar_lote("-", criar_parser(), tamanho_grupo=100, intervalo_ms=50)))
+    batch.start()
+
+    os.write(escrita, "addtransaction 1 1 -12 Pausa --data 2025-11-04\n".encode("utf-8"))
+    # Sem novas linhas, o grupo é confirmado quando o intervalo termina
+    consulta = text("SELECT COUNT(*) FROM transacoes WHERE descricao = 'Pausa'")
+    limite = time.monotonic() + 5
+    confirmadas = 0
+    while time.monotonic() < limite and not confirmadas:
+        time.sleep(0.05)
+        with banco.connect() as conexao:
+            confirmadas = conexao.execute(consulta).scalar()
+    os.close(escrita)
+    batch.join(5)
+
+    assert confirmadas == 1
+    assert resultado["confirmadas"] == 1 and resultado["grupos"] == 1
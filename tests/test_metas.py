@@ -0,0 +1,18 @@
+# tests/test_metas.py
+
+from database import metas
+from database.models import Meta
+
+
+def test_aportes_de_varias_regras_nao_passam_do_objetivo(banco):
+    meta = metas.criar_meta(1, "Reserva", 100.0)
+    metas.criar_regra(meta.id_meta, "fixo", 80.0)
+    metas.criar_regra(meta.id_meta, "fixo", 80.0)
+
+    assert metas.aplicar_aportes(2025, 10) == 2
+
+    from database.connection import session
+    session.expire_all()
+    assert session.get(Meta, meta.id_meta).valor_atual == 100.0
+    # Meta concluída: o mês seguinte não aporta mais nada
+    assert metas.aplicar_aportes(2025, 11) == 0
@@ -0,0 +1,31 @@
+# tests/test_referencias.py
+
+from sqlalchemy import insert
+from database import importacao, metas, referencias
+from database.models import Categoria
+
+
+def _categoria_de_outro_processo(banco, nome, tipo):
+    """Grava a categoria por fora do cache, como outro processo faria."""
+    with banco.begin() as conexao:
+        return conexao.execute(insert(Categoria.__table__).values(nome=nome, tipo=tipo)).inserted_primary_key[0]
+
+
+def test_categoria_nova_e_encontrada_antes_do_ttl(banco):
+    referencias.obter()
+    id_bonus = _categoria_de_outro_processo(banco, "Bônus", "Receita")
+
+    assert referencias.categoria(id_bonus) == ("Bônus", "Receita")
+    meta = metas.criar_meta(1, "Viagem", 500.0)
+    assert metas.criar_regra(meta.id_meta, "percentual", 10, id_bonus) is not None
+
+
+def test_importacao_aceita_categoria_criada_por_outro_processo(banco, tmp_path):
+    referencias.obter()
+    id_feira = _categoria_de_outro_processo(banco, "Feira", "Despesa")
+    caminho = tmp_path / "extrato.csv"
+    caminho.write_text("data,valor,descricao,id_conta,id_categoria\n"
+                       f"2025-11-06,20,Feira livre,1,{id_feira}\n"
+                       "2025-11-06,5,Inexistente,1,999\n", encoding="utf-8")
+
+    assert importacao.importar_transacoes(str(caminho)) == 1
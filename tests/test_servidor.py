@@ -0,0 +1,85 @@
+# tests/test_servidor.py
+
+import contextlib
+import json
+import os
+import stat
+import threading
+import urllib.error
+import urllib.request
+from http.server import HTTPServer
+import cliente
+import servidor
+
+
+@contextlib.contextmanager
+def _servidor(executar_argv, token="segredo"):
+    http = HTTPServer(("127.0.0.1", 0), servidor._criar_handler(executar_argv, token))
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    try:
+        yield http.server_address[1]
+    finally:
+        http.shutdown()
+        http.server_close()
+
+
+def _postar(porta, cabecalhos):
+    requisicao = urllib.request.Request(f"http://127.0.0.1:{porta}/", data=json.dumps({"argv": ["listusers"]}).encode(),
+                                        headers={"Authorization": "Bearer segredo", **cabecalhos})
+    try:
+        with urllib.request.urlopen(requisicao) as resposta:
+            return resposta.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_recusa_endereco_fora_do_loopback_sem_token(capsys):
+    assert servidor._eh_loopback("127.0.0.1") and servidor._eh_loopback("localhost")
+    assert not servidor._eh_loopback("0.0.0.0")
+
+    assert servidor.servir("0.0.0.0", 0, lambda argv: None) is None
+    assert "loopback" in capsys.readouterr().out
+
+
+def test_token_conferido_em_toda_requisicao():
+    executados = []
+    with _servidor(executados.append) as porta:
+        codigo, saida = cliente.enviar_comando(["getbalance", "1"], porta=porta, token="")
+        assert codigo == 1 and "Não autorizado" in saida
+        codigo, _ = cliente.enviar_comando(["getbalance", "1"], porta=porta, token="outro")
+        assert codigo == 1
+        assert executados == []
+
+        codigo, _ = cliente.enviar_comando(["getbalance", "1"], porta=porta, token="segredo")
+        assert codigo == 0 and executados == [["getbalance", "1"]]
+
+
+def test_recusa_requisicoes_de_navegador():
+    executados = []
+    with _servidor(executados.append) as porta:
+        assert _postar(porta, {"Content-Type": "application/json", "Origin": "http://exemplo.com"}) == 403
+        assert _postar(porta, {"Content-Type": "text/plain"}) == 415
+        assert _postar(porta, {}) == 415
+        assert executados == []
+        assert _postar(porta, {"Content-Type": "application/json"}) == 200
+        assert executados == [["listusers"]]
+
+
+def test_erro_no_comando_volta_como_json():
+    def falhar(argv):
+        raise RuntimeError("banco fora do ar")
+
+    with _servidor(falhar) as porta:
+        codigo, saida = cliente.enviar_comando(["getbalance", "1"], porta=porta, token="segredo")
+        assert codigo == 1 and "banco fora do ar" in saida
+        codigo, _ = cliente.enviar_comando(["getbalance", "1"], porta=porta, token="segredo")
+        assert codigo == 1
+
+
+def test_token_gerado_fica_num_arquivo_so_do_dono(tmp_path):
+    caminho = tmp_path / "token"
+    caminho.write_text("antigo")
+    os.chmod(caminho, 0o644)
+    servidor.gravar_token(str(caminho), "gerado")
+    assert stat.S_IMODE(os.stat(caminho).st_mode) == 0o600
+    assert cliente.ler_token(str(caminho)) == "gerado"
@@ -0,0 +1,33 @@
+# tests/test_transferencias.py
+
+from sqlalchemy import event, select
+from database import transferencias
+from database.models import Transacao
+
+
+def _pernas(banco, pares):
+    with banco.connect() as conexao:
+        contas = dict(conexao.execute(select(Transacao.id_transacao, Transacao.id_conta)
+                                      .where(Transacao.id_transacao.in_([i for par in pares for i in par]))).all())
+    return [(contas[debito], contas[credito]) for debito, credito in pares]
+
+
+def test_pernas_pareadas_pelos_ids_gravados(banco):
+    from database.functions import criar_conta
+    segunda = criar_conta(1, "Poupança", "Poupança", 0.0)
+    comandos = []
+
+    def ouvir(conexao, cursor, sql, parametros, contexto, executemany):
+        comandos.append(" ".join(sql.split()))
+
+    event.listen(banco, "before_cursor_execute", ouvir)
+    try:
+        pares = transferencias.registrar_transferencias([(1, segunda.id_conta, 5.0, "A"),
+                                                         (segunda.id_conta, 1, 7.0, "B")])
+    finally:
+        event.remove(banco, "before_cursor_execute", ouvir)
+
+    assert _pernas(banco, pares) == [(1, segunda.id_conta), (segunda.id_conta, 1)]
+    # As quatro pernas num único INSERT, sem RETURNING nem uma linha por vez
+    inserts = [sql for sql in comandos if sql.startswith("INSERT INTO transacoes ")]
+    assert len(inserts) == 1 and "RETURNING" not in inserts[0]
@@ -1,16 +1,16 @@
 
 
-import bcrypt
-
 def hash_senha(senha_plana):
     """
     Gera um hash seguro para uma senha em texto plano.
     """
+    import bcrypt  # importado sob demanda: só os comandos de usuário precisam dele
+    from config.settings import BCRYPT_CUSTO
 
     senha_bytes = senha_plana.encode('utf-8')
     
 
-    sal = bcrypt.gensalt()
+    sal = bcrypt.gensalt(rounds=BCRYPT_CUSTO)
     hash_gerado = bcrypt.hashpw(senha_bytes, sal)
     
 
@@ -20,6 +20,7 @@ def verificar_senha(senha_plana, hash_armazenado):
     """
     Verifica se a senha em texto plano corresponde ao hash salvo no banco.
     """
+    import bcrypt
     try:
         senha_plana_bytes = senha_plana.encode('utf-8')
         hash_armazenado_bytes = hash_armazenado.encode('utf-8')
@@ -28,4 +29,23 @@ def verificar_senha(senha_plana, hash_armazenado):
         return bcrypt.checkpw(senha_plana_bytes, hash_armazenado_bytes)
     except (ValueError, TypeError):
  
-        return False
\ No newline at end of file
+        return False
+
+def agrupar_em_lotes(itens, tamanho_lote):
+    """
+    Agrupa um iterável (normalmente um gerador) em listas de até
+    `tamanho_lote` itens, sem carregar tudo na memória.
+    """
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def percentil(valores_ordenados, p):
+    """Percentil `p` (0 a 100) de uma lista já ordenada, pelo vizinho mais próximo."""
+    indice = int(round(p / 100 * (len(valores_ordenados) - 1)))
+    return valores_ordenados[min(len(valores_ordenados) - 1, indice)]